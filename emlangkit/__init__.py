@@ -1,10 +1,19 @@
 """Root __init__ of the whole package."""
 from emlangkit import metrics
+from emlangkit.evaluate import evaluate_many
+from emlangkit.incremental_language import IncrementalLanguage
 from emlangkit.language import Language
+from emlangkit.language_batch import LanguageBatch
+from emlangkit.sliding_window_language import SlidingWindowLanguage
 
 __all__ = [
     # Core class
     "Language",
+    "LanguageBatch",
+    "IncrementalLanguage",
+    "SlidingWindowLanguage",
+    # Parallel evaluation
+    "evaluate_many",
     # Metrics
     "metrics",
 ]
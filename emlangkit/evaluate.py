@@ -0,0 +1,184 @@
+"""Parallel evaluation of metrics over many languages."""
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from emlangkit.language import Language
+
+DEFAULT_METRICS = (
+    "language_entropy",
+    "observation_entropy",
+    "mutual_information",
+    "posdis",
+    "bosdis",
+    "topsim",
+    "mpn",
+)
+
+# Offsets into the shared block are aligned like numpy's own allocations
+_ALIGNMENT = 64
+
+# The shared block of the current worker process, attached once by the pool initializer
+_shared_block = None
+
+
+def evaluate_many(
+    languages: Sequence[Language],
+    metrics: Optional[Sequence[str]] = None,
+    n_workers: Optional[int] = None,
+) -> Iterator[Tuple[int, dict]]:
+    """
+    Evaluate metrics of many languages in parallel, over a pool of processes.
+
+    The messages and observations of all languages are copied once into a block of shared
+    memory, which the worker processes read without pickling the arrays. Each language is
+    evaluated in a fresh `Language` with the same settings and seed as the given one, so
+    the results do not depend on the number of workers or the order of scheduling, nor
+    on metrics already computed on the given objects.
+
+    Parameters
+    ----------
+    languages : Sequence[Language]
+        The languages to evaluate.
+    metrics : Sequence[str], optional
+        Names of the `Language` methods to call, in order, without arguments.
+        Default is entropy, mutual information, posdis, bosdis, topsim and M_previous^n.
+    n_workers : int, optional
+        Number of worker processes. 1 evaluates all languages in the calling process.
+        Default is the number of available cores.
+
+    Yields
+    ------
+    index, results : int, dict
+        The index of a language in `languages` and a dictionary mapping each metric name
+        to its value, as soon as the language has been evaluated.
+
+    Raises
+    ------
+    ValueError
+        If a metric is not a method of `Language`.
+
+    Examples
+    --------
+    >>> languages = [Language(messages, observations, seed=seed) for seed in range(8)]
+    >>> results = dict(evaluate_many(languages, metrics=["posdis", "topsim"], n_workers=4))
+    """
+    metrics = list(DEFAULT_METRICS if metrics is None else metrics)
+    for metric in metrics:
+        if metric.startswith("_") or not callable(getattr(Language, metric, None)):
+            raise ValueError(f"{metric} is not a Language metric!")
+    languages = list(languages)
+    if n_workers is None:
+        n_workers = os.cpu_count() or 1
+
+    if n_workers == 1:
+        for index, language in enumerate(languages):
+            yield index, _evaluate(
+                language.messages,
+                language.observations,
+                _settings(language),
+                metrics,
+            )
+        return
+
+    block, specs = _pack(languages)
+    executor = ProcessPoolExecutor(
+        max_workers=n_workers, initializer=_attach, initargs=(block.name,)
+    )
+    try:
+        futures = {
+            executor.submit(_evaluate_shared, spec, metrics): index
+            for index, spec in enumerate(specs)
+        }
+        for future in as_completed(futures):
+            yield futures[future], future.result()
+    finally:
+        # Also reached if the caller stops consuming the results early
+        executor.shutdown(wait=True, cancel_futures=True)
+        block.close()
+        block.unlink()
+
+
+def _settings(language: Language) -> dict:
+    """Collect the constructor arguments of a language, other than its arrays."""
+    return {
+        "prev_horizon": language.prev_horizon,
+        "seed": language.seed,
+        "has_threshold": language.has_threshold,
+        "random_replicates": language.random_replicates,
+    }
+
+
+def _evaluate(
+    messages: np.ndarray,
+    observations: Optional[np.ndarray],
+    settings: dict,
+    metrics: List[str],
+) -> dict:
+    """Evaluate the metrics of a fresh language."""
+    language = Language(messages, observations, **settings)
+    return {metric: getattr(language, metric)() for metric in metrics}
+
+
+def _pack(languages: List[Language]) -> Tuple[shared_memory.SharedMemory, list]:
+    """
+    Copy the arrays of all languages into one block of shared memory.
+
+    Returns the block and, for each language, the specification of its arrays and settings.
+    An array is specified by its offset, shape and dtype in the block. Arrays of Python
+    objects cannot be shared and are passed as they are.
+    """
+    specs = []
+    size = 0
+    for language in languages:
+        spec = {"settings": _settings(language)}
+        for name in ("messages", "observations"):
+            array = getattr(language, name)
+            if array is None or array.dtype == object:
+                spec[name] = array
+            else:
+                spec[name] = (size, array.shape, array.dtype.str)
+                size += -(-array.nbytes // _ALIGNMENT) * _ALIGNMENT
+        specs.append(spec)
+
+    # A block cannot be empty, even if there is nothing to share
+    block = shared_memory.SharedMemory(create=True, size=max(size, 1))
+    for language, spec in zip(languages, specs):
+        for name in ("messages", "observations"):
+            if isinstance(spec[name], tuple):
+                _view(block, spec[name])[...] = getattr(language, name)
+    return block, specs
+
+
+def _view(block: shared_memory.SharedMemory, spec: tuple) -> np.ndarray:
+    """View an array of a shared block."""
+    offset, shape, dtype = spec
+    return np.ndarray(shape, dtype, buffer=block.buf, offset=offset)
+
+
+def _attach(name: str):
+    """Attach a worker process to the shared block."""
+    global _shared_block
+    _shared_block = shared_memory.SharedMemory(name=name)
+
+
+def _unpack(spec) -> Optional[np.ndarray]:
+    """Get an array of a language from its specification, as a read-only view if it is shared."""
+    if not isinstance(spec, tuple):
+        return spec
+    array = _view(_shared_block, spec)
+    array.flags.writeable = False
+    return array
+
+
+def _evaluate_shared(spec: dict, metrics: List[str]) -> dict:
+    """Evaluate the metrics of a language stored in the shared block."""
+    return _evaluate(
+        _unpack(spec["messages"]),
+        _unpack(spec["observations"]),
+        spec["settings"],
+        metrics,
+    )
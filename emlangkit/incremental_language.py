@@ -0,0 +1,552 @@
+"""Incremental Language, updated with batches of messages during training."""
+from typing import Optional, Tuple
+
+import numpy as np
+
+from emlangkit import metrics
+from emlangkit.language import Language
+from emlangkit.metrics.has import BranchingEntropy
+from emlangkit.metrics.mpn import MPNStats
+from emlangkit.streaming_language import StreamingLanguage
+from emlangkit.utils.encoding import encode_rows
+from emlangkit.utils.kernels import (
+    bag_of_words,
+    count_repeats,
+    disentanglement_from_entropies,
+)
+from emlangkit.utils.ngram_index import NGramIndex
+from emlangkit.utils.running_counts import RunningCounts, grow, xlogx
+
+
+class IncrementalLanguage(StreamingLanguage):
+    """
+    An emergent language that grows with every batch of messages, e.g. during training.
+
+    Every `update` adds the counts of a batch to running statistics: the counts of the unique
+    messages and observations and of their pairs, the contingency tables of the message and
+    observation columns, the n-gram frequencies used by HAS, and the repeat counts of
+    M_previous^n. Each statistic also keeps a running sum of `c * log2(c)` over its counts,
+    so that entropies are updated with the changed counts only. An update therefore costs
+    time in the size of the batch, not of all the messages so far, and the metrics can be
+    queried at any time.
+
+    Parameters
+    ----------
+    prev_horizon : int, optional
+        The horizon up to which M_previous^n is calculated. Default is 8.
+    seed : int, optional
+        Seed value for random number generation. Default is 42.
+    has_threshold : float, optional
+        The branching entropy threshold for HAS boundaries. Default is 0.8.
+    random_replicates : int, optional
+        Number of random boundary replicates the random HAS statistics are averaged over.
+        Default is 1.
+
+    Examples
+    --------
+    Update the language with every batch of messages and observations:
+    >>> lang = IncrementalLanguage()
+    >>> for messages, observations in batches:
+    ...     lang.update(messages, observations)
+    ...     print(lang.posdis())
+    """
+
+    def __init__(
+        self,
+        prev_horizon: int = 8,
+        seed: int = 42,
+        has_threshold: float = 0.8,
+        random_replicates: int = 1,
+    ):
+        super().__init__()
+        self.prev_horizon = prev_horizon
+        self.seed = seed
+        self.has_threshold = has_threshold
+        self.random_replicates = random_replicates
+
+        self.__message_batches = []
+        self.__observation_batches = []
+
+        # Running statistics
+        self.__message_columns = None
+        self.__observation_columns = None
+        self.__position_tables = None
+        self.__symbol_columns = {}
+        self.__bag_of_words_columns = []
+        self.__bag_of_words_tables = []
+        self.__ngrams = _RunningNGrams()
+        self.__same_as_previous_obj = np.zeros((0, prev_horizon + 1), dtype=np.int32)
+        self.__recent_observations = np.zeros(0, dtype=np.int64)
+
+        # Placeholders, reset by every update
+        self.__messages = None
+        self.__observations = None
+        self.__language = None
+        self.__has_stats = None
+
+    def __len__(self) -> int:
+        """Return the number of messages added so far."""
+        return self._message_counts.total
+
+    @property
+    def messages(self) -> Optional[np.ndarray]:
+        """All messages added so far, in order."""
+        if self.__messages is None and self.__message_batches:
+            self.__messages = np.concatenate(self.__message_batches)
+        return self.__messages
+
+    @property
+    def observations(self) -> Optional[np.ndarray]:
+        """All observations added so far, in order."""
+        if self.__observations is None and self.__observation_batches:
+            self.__observations = np.concatenate(self.__observation_batches)
+        return self.__observations
+
+    def update(self, messages: np.ndarray, observations: Optional[np.ndarray] = None):
+        """
+        Add a batch of messages, and the observations they were sent for.
+
+        Parameters
+        ----------
+        messages : numpy.ndarray
+            Numpy array of shape (n, ...) containing the messages of the batch.
+        observations : numpy.ndarray, optional
+            Numpy array of shape (n, ...) containing the observations of the batch.
+            Required if, and only if, the first batch had observations.
+
+        Raises
+        ------
+        ValueError
+            If the batch is empty, or its shapes do not match the previous batches.
+        """
+        self._check_batch(messages, observations)
+
+        # Copy the batch, as training loops often reuse their buffers
+        messages = messages.copy()
+        self.__message_batches.append(messages)
+        self.__messages = None
+        self.__language = None
+        self.__has_stats = None
+        flat_messages = messages.reshape(len(messages), -1)
+
+        if observations is not None:
+            observations = observations.copy()
+            self.__observation_batches.append(observations)
+            self.__observations = None
+            self.__update_columns(flat_messages, observations)
+
+        message_ids = self._message_counts.update(messages)
+        self.__ngrams.update(flat_messages)
+
+        if observations is not None:
+            observation_ids = self._observation_counts.update(observations)
+            self._joint_counts.update(np.stack((message_ids, observation_ids), axis=1))
+            self.__update_repeats(message_ids, observation_ids)
+
+    def __update_columns(self, messages: np.ndarray, observations: np.ndarray):
+        """Update the contingency tables of the message and observation columns."""
+        n_previous = self._observation_counts.total
+        observations = observations.reshape(len(observations), -1)
+        if self.__observation_columns is None:
+            self.__message_columns = [RunningCounts() for _ in messages.T]
+            self.__observation_columns = [RunningCounts() for _ in observations.T]
+            self.__position_tables = [
+                [RunningCounts() for _ in observations.T] for _ in messages.T
+            ]
+
+        # A new symbol occurred 0 times in all previous messages
+        symbols, symbol_codes = np.unique(messages, return_inverse=True)
+        for symbol in symbols.tolist():
+            if symbol in self.__symbol_columns:
+                continue
+            self.__symbol_columns[symbol] = len(self.__bag_of_words_columns)
+            column = RunningCounts()
+            tables = [RunningCounts() for _ in self.__observation_columns]
+            if n_previous > 0:
+                column.add(np.zeros((1, 1), dtype=np.int64), np.array([n_previous]))
+                for table, observation_column in zip(
+                    tables, self.__observation_columns
+                ):
+                    values = np.arange(len(observation_column))
+                    table.add(
+                        np.stack((np.zeros_like(values), values), axis=1),
+                        observation_column.counts,
+                    )
+            self.__bag_of_words_columns.append(column)
+            self.__bag_of_words_tables.append(tables)
+
+        observation_ids = [
+            column.update(values)
+            for column, values in zip(self.__observation_columns, observations.T)
+        ]
+        for column, tables, values in zip(
+            self.__message_columns, self.__position_tables, messages.T
+        ):
+            self.__update_tables(column, tables, values, observation_ids)
+
+        # Count the symbols of all columns, including those absent from the batch
+        columns = np.array([self.__symbol_columns[s] for s in symbols.tolist()])
+        bow_message = bag_of_words(
+            columns[symbol_codes.reshape(messages.shape)],
+            len(self.__bag_of_words_columns),
+        )
+        for column, tables, values in zip(
+            self.__bag_of_words_columns, self.__bag_of_words_tables, bow_message.T
+        ):
+            self.__update_tables(column, tables, values, observation_ids)
+
+    @staticmethod
+    def __update_tables(column, tables, values, observation_ids):
+        """Update the counts of a message column and its tables with every observation column."""
+        ids = column.update(values)
+        for table, other in zip(tables, observation_ids):
+            table.update(np.stack((ids, other), axis=1))
+
+    def __update_repeats(self, message_ids: np.ndarray, observation_ids: np.ndarray):
+        """Update the M_previous^n repeat counts, with the last observations as context."""
+        context = self.__recent_observations
+        # Count per message of the batch, with an extra row for the context to be ignored
+        message_codes, _ = encode_rows(message_ids)
+        unique_ids = np.empty(message_codes.max() + 1, dtype=np.int64)
+        unique_ids[message_codes] = message_ids
+        same = count_repeats(
+            np.concatenate((context, observation_ids)),
+            np.concatenate((np.full(len(context), len(unique_ids)), message_codes)),
+            len(unique_ids) + 1,
+            self.prev_horizon,
+        )[:-1]
+
+        self.__same_as_previous_obj = grow(
+            self.__same_as_previous_obj, len(self._message_counts)
+        )
+        self.__same_as_previous_obj[unique_ids] += same
+        recent = np.concatenate((context, observation_ids))
+        self.__recent_observations = recent[max(len(recent) - self.prev_horizon, 0) :]
+
+    def posdis(self) -> float:
+        """
+        Calculate the positional disentanglement of the messages added so far.
+
+        Returns
+        -------
+            float: The positional disentanglement.
+
+        Raises
+        ------
+            ValueError: If observations are not set.
+        """
+        self._require_observations("positional disentanglement")
+        return self.__disentanglement(self.__message_columns, self.__position_tables)
+
+    def bosdis(self) -> float:
+        """
+        Calculate the bag-of-words disentanglement of the messages added so far.
+
+        Returns
+        -------
+            float: The bag-of-words disentanglement.
+
+        Raises
+        ------
+            ValueError: If observations are not set.
+        """
+        self._require_observations("bag-of-words disentanglement")
+        return self.__disentanglement(
+            self.__bag_of_words_columns, self.__bag_of_words_tables
+        )
+
+    def __disentanglement(self, columns, tables) -> float:
+        """Compute a disentanglement score from the running column and table counts."""
+        return float(
+            disentanglement_from_entropies(
+                np.array([[column.entropy() for column in columns]]),
+                np.array([[column.entropy() for column in self.__observation_columns]]),
+                np.array([[[table.entropy() for table in row] for row in tables]]),
+            )[0]
+        )
+
+    def mpn(self, return_stats: bool = False):
+        """
+        Calculate the M_previous^n score of the messages added so far.
+
+        The observations of consecutive batches are treated as one sequence, so repeats
+        across the boundary between two batches are counted.
+
+        Parameters
+        ----------
+        return_stats : bool, optional
+            If True, also return the `MPNStats` of every unique message. Default is False.
+
+        Returns
+        -------
+            np.ndarray: The highest M_previous^n value for each horizon, indexed by horizon.
+
+        Raises
+        ------
+            ValueError: If observations are not set.
+        """
+        self._require_observations("M_previous^n")
+        order = self._message_counts.order()
+        stats = MPNStats.from_counts(
+            self._message_counts.unique()[order],
+            self._message_counts.counts[order],
+            self.__same_as_previous_obj[order],
+        )
+        if return_stats:
+            return stats.mpn(), stats
+        return stats.mpn()
+
+    def branching_entropy(self) -> BranchingEntropy:
+        """
+        Calculate the branching entropy of every context in the messages added so far.
+
+        Returns
+        -------
+            BranchingEntropy: A read-only mapping from each context to its branching entropy,
+            like `Language.branching_entropy`.
+        """
+        self._require_messages()
+        return BranchingEntropy(*self.__ngrams.index())
+
+    def conditional_entropy(self) -> dict:
+        """
+        Calculate the conditional entropy of the messages added so far, for each context length.
+
+        Returns
+        -------
+            dict: Dictionary mapping context lengths to their conditional entropy.
+        """
+        self._require_messages()
+        return self.__ngrams.conditional_entropy()
+
+    def to_language(self) -> Language:
+        """
+        Create a `Language` of all messages and observations added so far, with the same settings.
+
+        Returns
+        -------
+            Language: The language, cached until the next update.
+        """
+        self._require_messages()
+        if self.__language is None:
+            self.__language = Language(
+                self.messages,
+                self.observations,
+                prev_horizon=self.prev_horizon,
+                seed=self.seed,
+                has_threshold=self.has_threshold,
+                random_replicates=self.random_replicates,
+            )
+        return self.__language
+
+    def has_stats(self, compute_topsim: bool = False) -> dict:
+        """
+        Calculate the HAS statistics of the messages added so far.
+
+        The boundaries of every message depend on the branching entropy of all messages,
+        so they are computed again for all messages, from the running n-gram counts.
+        The random boundaries are drawn with a generator seeded with `seed`, like those
+        of a `Language` of the same messages.
+
+        Parameters
+        ----------
+        compute_topsim : bool, optional
+            Flag indicating whether to compute topographic similarity. Default is False.
+
+        Returns
+        -------
+            dict: The statistics returned by `Language.has_stats`, cached until the next update.
+        """
+        self._require_messages()
+        if self.__has_stats is None:
+            messages = self.messages.reshape(len(self), -1)
+            mask = (
+                metrics.compute_boundary_scores(self.branching_entropy(), messages)
+                > self.has_threshold
+            )
+            random_masks = metrics.compute_random_boundaries(
+                messages,
+                mask,
+                np.random.default_rng(seed=self.seed),
+                n_replicates=self.random_replicates,
+                return_mask=True,
+            )
+            self.__has_stats = metrics.compute_has_stats(
+                messages,
+                metrics.compute_segmentation(messages, mask),
+                random_masks,
+                observations=self.observations,
+                compute_topsim=compute_topsim,
+            )
+        return self.__has_stats
+
+
+class _RunningNGrams:
+    """
+    The frequencies of all n-grams seen so far, with running sums for their branching entropy.
+
+    The n-grams are the nodes of a trie, with integer IDs in order of first occurrence.
+    A node is found by the key `parent << 32 | symbol`, combining the ID of its parent
+    node and the code of its last symbol, so no n-gram is stored as a tuple. The suffix
+    nodes of every message are kept, so that `index` lays the trie out as an `NGramIndex`
+    of all messages without counting them again.
+
+    The branching entropy of a context with frequency `c` is `(T * log2(c) - S) / c`, where `T`
+    is the total and `S` the sum of `s * log2(s)` over the frequencies `s` of its successors.
+    Both are kept for every context, and `c * BE = T * log2(c) - S` is summed by length.
+    Every prefix of an n-gram of a batch is also an n-gram of the batch, so the contexts
+    whose sums change are exactly the n-grams of the batch.
+    """
+
+    def __init__(self):
+        self.ids = {}
+        self.codes = {}
+        self.alphabet = None
+        self.n_nodes = 1
+        # The root is the empty n-gram
+        self.__parent = np.full(1, -1, dtype=np.int64)
+        self.__symbol = np.full(1, -1, dtype=np.int64)
+        self.__depth = np.zeros(1, dtype=np.int64)
+        self.__suffix_nodes = []
+        self.__count = np.zeros(1, dtype=np.int64)
+        self.__successor_total = np.zeros(1, dtype=np.int64)
+        self.__successor_clogc = np.zeros(1, dtype=np.float64)
+        self.__length_total = np.zeros(0, dtype=np.int64)
+        self.__length_weighted = np.zeros(0, dtype=np.float64)
+        self.__index = None
+
+    def update(self, messages: np.ndarray):
+        """Count the n-grams of a batch of messages."""
+        index = NGramIndex.from_messages(messages)
+        self.__index = None
+        n_codes = len(self.codes)
+        codes = np.array(
+            [
+                self.codes.setdefault(a, len(self.codes))
+                for a in index.alphabet.tolist()
+            ],
+            dtype=np.int64,
+        )
+        new_symbols = index.alphabet[codes >= n_codes]
+        if self.alphabet is None:
+            self.alphabet = index.alphabet
+        else:
+            self.alphabet = np.concatenate((self.alphabet, new_symbols))
+
+        # The nodes of the batch are ordered by length, so the parents of a level are known
+        ids = np.zeros(index.n_nodes, dtype=np.int64)
+        bounds = np.searchsorted(index.depth, np.arange(index.depth.max() + 2))
+        for start, stop in zip(bounds[1:-1], bounds[2:]):
+            keys = (ids[index.parent[start:stop]] << 32) | codes[
+                index.symbol[start:stop]
+            ]
+            level = np.array(
+                [self.ids.get(k, -1) for k in keys.tolist()], dtype=np.int64
+            )
+            new = level < 0
+            level[new] = np.arange(self.n_nodes, self.n_nodes + np.count_nonzero(new))
+            self.ids.update(zip(keys[new].tolist(), level[new].tolist()))
+            self.n_nodes += np.count_nonzero(new)
+            ids[start:stop] = level
+
+        self.__parent = grow(self.__parent, self.n_nodes)
+        self.__symbol = grow(self.__symbol, self.n_nodes)
+        self.__depth = grow(self.__depth, self.n_nodes)
+        self.__parent[ids[1:]] = ids[index.parent[1:]]
+        self.__symbol[ids[1:]] = codes[index.symbol[1:]]
+        self.__depth[ids] = index.depth
+        self.__suffix_nodes.append(ids[index.suffix_nodes])
+        self.__count = grow(self.__count, self.n_nodes)
+        self.__successor_total = grow(self.__successor_total, self.n_nodes)
+        self.__successor_clogc = grow(self.__successor_clogc, self.n_nodes)
+        self.__length_total = grow(self.__length_total, index.depth.max() + 1)
+        self.__length_weighted = grow(self.__length_weighted, index.depth.max() + 1)
+
+        before = self.__weighted(ids)
+        previous = self.__count[ids]
+        self.__count[ids] += index.count
+        parents = ids[index.parent[1:]]
+        np.add.at(self.__successor_total, parents, index.count[1:])
+        np.add.at(
+            self.__successor_clogc,
+            parents,
+            xlogx(self.__count[ids[1:]]) - xlogx(previous[1:]),
+        )
+        after = self.__weighted(ids)
+
+        n_lengths = len(self.__length_total)
+        self.__length_total += np.bincount(
+            index.depth, weights=index.count, minlength=n_lengths
+        ).astype(np.int64)
+        self.__length_weighted += np.bincount(
+            index.depth, weights=after - before, minlength=n_lengths
+        )
+
+    def __weighted(self, ids: np.ndarray) -> np.ndarray:
+        """Compute `c * BE` of the given contexts."""
+        count = self.__count[ids]
+        return (
+            self.__successor_total[ids] * np.log2(np.maximum(count, 1))
+            - self.__successor_clogc[ids]
+        )
+
+    def index(self) -> Tuple[NGramIndex, np.ndarray]:
+        """
+        Lay the trie out as an `NGramIndex` of all messages, with the branching entropy of its nodes.
+
+        The nodes are relabelled in the order of `NGramIndex`, by length, then by parent, then
+        by symbol, one length at a time. The result is cached until the next update.
+
+        Returns
+        -------
+        index : NGramIndex
+            The index of all n-grams seen so far.
+        branching_entropy : np.ndarray
+            The branching entropy of each node of the index.
+        """
+        if self.__index is None:
+            n = self.n_nodes
+            alphabet_order = np.argsort(self.alphabet, kind="stable")
+            rank = np.empty(len(alphabet_order), dtype=np.int64)
+            rank[alphabet_order] = np.arange(len(alphabet_order))
+
+            # The nodes of each length take the next IDs, sorted by new parent then symbol
+            depth = self.__depth[:n]
+            by_depth = np.argsort(depth, kind="stable")
+            bounds = np.searchsorted(depth[by_depth], np.arange(depth.max() + 2))
+            new_ids = np.zeros(n, dtype=np.int64)
+            for start, stop in zip(bounds[1:-1], bounds[2:]):
+                level = by_depth[start:stop]
+                order = np.lexsort(
+                    (rank[self.__symbol[level]], new_ids[self.__parent[level]])
+                )
+                new_ids[level[order]] = np.arange(start, stop)
+            old_ids = np.empty(n, dtype=np.int64)
+            old_ids[new_ids] = np.arange(n)
+
+            parent = np.full(n, -1, dtype=np.int32)
+            parent[1:] = new_ids[self.__parent[old_ids[1:]]]
+            symbol = np.full(n, -1, dtype=np.int32)
+            symbol[1:] = rank[self.__symbol[old_ids[1:]]]
+            count = self.__count[old_ids]
+            index = NGramIndex(
+                alphabet=self.alphabet[alphabet_order],
+                parent=parent,
+                symbol=symbol,
+                depth=depth[old_ids].astype(np.int32),
+                count=count,
+                suffix_nodes=new_ids[np.concatenate(self.__suffix_nodes)].astype(
+                    np.int32
+                ),
+            )
+            self.__index = (index, self.__weighted(old_ids) / count)
+        return self.__index
+
+    def conditional_entropy(self) -> dict:
+        """Compute the conditional entropy of each context length."""
+        return {
+            length: weighted / total
+            for length, (weighted, total) in enumerate(
+                zip(self.__length_weighted.tolist(), self.__length_total.tolist())
+            )
+        }
@@ -1,5 +1,6 @@
 """The Language class implementation."""
-from typing import Optional
+import os
+from typing import Optional, Union
 
 import numpy as np
 
@@ -16,12 +17,17 @@ class Language:
 
     Parameters
     ----------
-    messages : numpy.ndarray
-        Numpy array containing the messages.
-    observations : numpy.ndarray, optional
-        Numpy array containing the observations. Default is None.
+    messages : numpy.ndarray, str or os.PathLike
+        Numpy array containing the messages, or the path of a `.npy` file with the messages.
+        Files are opened as read-only memory maps, and only read where the metrics need them.
+    observations : numpy.ndarray, str or os.PathLike, optional
+        Numpy array containing the observations, or the path of a `.npy` file with the observations.
+        Default is None.
     seed : int, optional
         Seed value for random number generation. Default is 42.
+    random_replicates : int, optional
+        Number of random boundary replicates the random HAS statistics are averaged over.
+        Default is 1.
 
     Examples
     --------
@@ -33,16 +39,23 @@ class Language:
     Create a Language object with only messages and default seed:
     >>> messages = np.array([1, 2, 3, 4, 5])
     >>> lang = Language(messages)
+
+    Create a Language object from message and observation dumps, without loading them into memory:
+    >>> lang = Language("messages.npy", "observations.npy")
     """
 
     def __init__(
         self,
-        messages: np.ndarray,
-        observations: Optional[np.ndarray] = None,
+        messages: Union[np.ndarray, str, os.PathLike],
+        observations: Optional[Union[np.ndarray, str, os.PathLike]] = None,
         prev_horizon: int = 8,
         seed: int = 42,
         has_threshold: float = 0.8,
+        random_replicates: int = 1,
     ):
+        messages = utils.load_array(messages)
+        observations = utils.load_array(observations)
+
         if not isinstance(messages, np.ndarray):
             raise ValueError("Language only accepts numpy arrays!")
 
@@ -58,8 +71,13 @@ class Language:
         self.messages = messages
         self.observations = observations
 
+        self.seed = seed
         self.__rng = np.random.default_rng(seed=seed)
 
+        # Shared encodings of the messages and observations
+        self.__message_encoding = None
+        self.__observation_encoding = None
+
         # Placeholders
         self.__topsim_value = None
         self.__posdis_value = None
@@ -74,6 +92,7 @@ class Language:
 
         # NPMI placeholders
         self.__nc_npmi_dict = None
+        self.__nc_npmi_matrix = None
 
         # HAS placeholders
         self.has_threshold = has_threshold
@@ -82,21 +101,68 @@ class Language:
         self.__branching_entropy = None
         self.__conditional_entropy = None
         self.__boundaries = None
+        self.__boundary_mask = None
+        self.__boundary_scores = None
+        self.__segmentation = None
         self.__segments = None
         self.__segment_ids = None
         self.__hashed_segments = None
+        self.random_replicates = random_replicates
         self.__random_boundaries = None
+        self.__random_boundary_masks = None
+        self.__random_segmentation = None
         self.__random_segments = None
         self.__random_segment_ids = None
         self.__random_hashed_segments = None
         self.__has_stats = None
 
-    def topsim(self) -> tuple[float, float]:
+    def message_encoding(self) -> utils.RowEncoding:
+        """
+        Get the integer encodings of the messages, shared by all metrics.
+
+        Returns
+        -------
+            RowEncoding: The lazily computed unique rows, codes, counts and column codes
+            of the messages.
+        """
+        if self.__message_encoding is None:
+            self.__message_encoding = utils.RowEncoding(self.messages)
+
+        return self.__message_encoding
+
+    def observation_encoding(self) -> utils.RowEncoding:
+        """
+        Get the integer encodings of the observations, shared by all metrics.
+
+        Returns
+        -------
+            RowEncoding: The lazily computed unique rows, codes, counts and column codes
+            of the observations.
+
+        Raises
+        ------
+            ValueError: If observations are not set.
+        """
+        if self.observations is None:
+            raise ValueError("Observations are needed to encode the observations.")
+
+        if self.__observation_encoding is None:
+            self.__observation_encoding = utils.RowEncoding(self.observations)
+
+        return self.__observation_encoding
+
+    def topsim(self, n_jobs: int = 1) -> tuple[float, float]:
         """
         Calculate the topographic similarity score for the language.
 
         This method requires observations to be set in the class.
 
+        Parameters
+        ----------
+        n_jobs : int, optional
+            Number of threads used to compute the pairwise distances.
+            -1 uses all available cores. Default is 1.
+
         Returns
         -------
             tuple of floats: The topographic similarity value, and the p-value.
@@ -117,11 +183,55 @@ class Language:
 
         if self.__topsim_value is None:
             self.__topsim_value = metrics.compute_topographic_similarity(
-                self.messages, self.observations
+                self.messages, self.observations, n_jobs=n_jobs
             )
 
         return self.__topsim_value
 
+    def topsim_estimate(
+        self, n_pairs: int = 100000, n_bootstrap: int = 1000, confidence: float = 0.95
+    ) -> tuple[float, tuple[float, float]]:
+        """
+        Estimate the topographic similarity score from a random sample of message pairs.
+
+        This method requires observations to be set in the class.
+        The pairs are sampled with the random number generator of the language.
+
+        Parameters
+        ----------
+        n_pairs : int, optional
+            Number of pairs to sample. Default is 100000.
+        n_bootstrap : int, optional
+            Number of bootstrap replicates for the confidence interval. Default is 1000.
+        confidence : float, optional
+            Confidence level of the interval. Default is 0.95.
+
+        Returns
+        -------
+            tuple: The estimated topographic similarity value, and its confidence interval.
+
+        Raises
+        ------
+            ValueError: If observations are not set.
+
+        Notes
+        -----
+            The result is not cached, as every call draws a new sample.
+        """
+        if self.observations is None:
+            raise ValueError(
+                "Observations are needed to calculate topographic similarity."
+            )
+
+        return metrics.compute_topographic_similarity_sampled(
+            self.messages,
+            self.observations,
+            n_pairs=n_pairs,
+            rng=self.__rng,
+            n_bootstrap=n_bootstrap,
+            confidence=confidence,
+        )
+
     def posdis(self):
         """
         Calculate the positional disentanglement score for the language.
@@ -147,7 +257,7 @@ class Language:
             )
         if self.__posdis_value is None:
             self.__posdis_value = metrics.compute_posdis(
-                self.messages, self.observations
+                self.message_encoding(), self.observation_encoding()
             )
 
         return self.__posdis_value
@@ -177,7 +287,7 @@ class Language:
             )
         if self.__bosdis_value is None:
             self.__bosdis_value = metrics.compute_bosdis(
-                self.messages, self.observations
+                self.message_encoding(), self.observation_encoding()
             )
 
         return self.__bosdis_value
@@ -203,7 +313,9 @@ class Language:
         """
         # This may have been calculated previously
         if self.__langauge_entropy_value is None:
-            self.__langauge_entropy_value = metrics.compute_entropy(self.messages)
+            self.__langauge_entropy_value = metrics.compute_entropy(
+                self.message_encoding()
+            )
 
         return self.__langauge_entropy_value
 
@@ -233,7 +345,7 @@ class Language:
         # This may have been calculated previously
         if self.__observation_entropy_value is None:
             self.__observation_entropy_value = metrics.compute_entropy(
-                self.observations
+                self.observation_encoding()
             )
 
         return self.__observation_entropy_value
@@ -266,8 +378,8 @@ class Language:
             if self.__langauge_entropy_value is None:
                 self.language_entropy()
             self.__mutual_information_value = metrics.compute_mutual_information(
-                self.messages,
-                self.observations,
+                self.message_encoding(),
+                self.observation_encoding(),
                 (self.__langauge_entropy_value, self.__observation_entropy_value),
             )
 
@@ -299,7 +411,7 @@ class Language:
 
         if self.__mpn_value is None:
             self.__mpn_value = metrics.compute_mpn(
-                self.messages, self.observations, self.prev_horizon
+                self.message_encoding(), self.observation_encoding(), self.prev_horizon
             )
 
         return self.__mpn_value
@@ -327,12 +439,41 @@ class Language:
             raise ValueError("Observations are needed to calculate M_previous^n.")
 
         if self.__nc_npmi_dict is None:
-            self.__nc_npmi_dict = metrics.compute_nc_npmi(
-                self.messages, self.observations
-            )
+            self.__nc_npmi_dict = self.nc_npmi_matrix().to_dict()
 
         return self.__nc_npmi_dict
 
+    def nc_npmi_matrix(self):
+        """
+        Calculate the non-compositional NPMI correlations for the language, as a sparse matrix.
+
+        This method requires observations to be set in the class. The returned `NPMIMatrix`
+        can be queried for the top observations of a message, the top messages of an
+        observation, or all pairs above an NPMI threshold.
+
+        Returns
+        -------
+            NPMIMatrix: The NPMI of all message and observation pairs that occur together.
+
+        Raises
+        ------
+            ValueError: If observations are not set.
+
+        Notes
+        -----
+            The result is cached and will only be computed once.
+            Subsequent calls to this method will return the cached value.
+        """
+        if self.observations is None:
+            raise ValueError("Observations are needed to calculate the NPMI.")
+
+        if self.__nc_npmi_matrix is None:
+            self.__nc_npmi_matrix = metrics.compute_nc_npmi(
+                self.message_encoding(), self.observation_encoding(), return_sparse=True
+            )
+
+        return self.__nc_npmi_matrix
+
     # Harris' Articulation Scheme metrics
     def branching_entropy(self):
         """
@@ -340,7 +481,8 @@ class Language:
 
         Returns
         -------
-            float: The calculated branching entropy value.
+            BranchingEntropy: A read-only mapping from each context to its branching entropy.
+            The values are also available as an array indexed by node ID, in its `entropy` attribute.
 
         Notes
         -----
@@ -349,7 +491,9 @@ class Language:
         """
         if self.__branching_entropy is None:
             if self.__freq is None:
-                self.__alpha, self.__freq = metrics.has_init(self.messages)
+                self.__alpha, self.__freq = metrics.has_init(
+                    self.messages, use_index=True
+                )
             self.__branching_entropy = metrics.compute_branching_entropy(
                 self.__alpha, self.__freq
             )
@@ -412,11 +556,7 @@ class Language:
             Subsequent calls to this method will return the cached value.
         """
         if self.__boundaries is None:
-            if self.__branching_entropy is None:
-                self.branching_entropy()
-            self.__boundaries = metrics.compute_boundaries(
-                self.messages, self.__branching_entropy, threshold=self.has_threshold
-            )
+            self.__boundaries = metrics.boundaries_from_mask(self.boundary_mask())
 
         if return_count:
             nb = [len(b) for b in self.__boundaries]
@@ -429,6 +569,60 @@ class Language:
 
         return self.__boundaries
 
+    def boundary_mask(self) -> np.ndarray:
+        """
+        Calculate the HAS boundaries for a given language, as a boolean mask.
+
+        Returns
+        -------
+        np.ndarray
+            Boolean array of shape (N, L + 2), where element `[n, i]` is True if
+            message `n` has a boundary at position `i`.
+
+        Notes
+        -----
+            The result is cached and will only be computed once.
+            Subsequent calls to this method will return the cached value.
+        """
+        if self.__boundary_mask is None:
+            self.__boundary_mask = self.__scores() > self.has_threshold
+
+        return self.__boundary_mask
+
+    def __scores(self) -> np.ndarray:
+        """Compute and cache the branching entropy increase at every boundary position."""
+        if self.__boundary_scores is None:
+            if self.__branching_entropy is None:
+                self.branching_entropy()
+            self.__boundary_scores = metrics.compute_boundary_scores(
+                self.__branching_entropy
+            )
+        return self.__boundary_scores
+
+    def has_sweep(self, thresholds) -> list:
+        """
+        Calculate the HAS segmentation for several thresholds at once.
+
+        The frequencies, branching entropy and boundary scores are computed once and shared
+        with the other HAS methods, so each threshold only needs a comparison and a segmentation.
+
+        Parameters
+        ----------
+        thresholds : array_like
+            The threshold values to evaluate. `has_threshold` is not changed.
+
+        Returns
+        -------
+        list of dict
+            For each threshold, a dictionary with the keys "threshold", "boundaries" (the
+            boundary mask), "mean_boundaries" (per message), "segmentation" (the `Segmentation`
+            of the messages), "vocab_size", and "zla" and "zipf" (the ZLA and Zipf statistics).
+        """
+        scores = self.__scores()
+        return metrics.compute_threshold_sweep(
+            self.messages, self.__branching_entropy, thresholds, scores=scores
+        )
+
     def random_boundaries(
         self,
         return_count: bool = False,
@@ -471,8 +665,15 @@ class Language:
         if self.__random_boundaries is None and not recompute:
             if self.__boundaries is None:
                 self.boundaries()
-            self.__random_boundaries = metrics.compute_random_boundaries(
-                self.messages, self.__boundaries, self.__rng
+            self.__random_boundary_masks = metrics.compute_random_boundaries(
+                self.messages,
+                self.boundary_mask(),
+                self.__rng,
+                n_replicates=self.random_replicates,
+                return_mask=True,
+            )
+            self.__random_boundaries = metrics.boundaries_from_mask(
+                self.__random_boundary_masks[0]
             )
 
         if return_count:
@@ -486,6 +687,51 @@ class Language:
 
         return self.__random_boundaries
 
+    def segmentation(self) -> utils.Segmentation:
+        """
+        Calculate the HAS segments for a given language, as an array-backed `Segmentation`.
+
+        Returns
+        -------
+        Segmentation
+            The segments of all messages, with their segment ids.
+
+        Notes
+        -----
+            The result is cached and will only be computed once.
+            Subsequent calls to this method will return the cached value.
+            `segments` converts this representation into tuples on demand.
+        """
+        if self.__segmentation is None:
+            self.__segmentation = metrics.compute_segmentation(
+                self.messages, self.boundary_mask()
+            )
+
+        return self.__segmentation
+
+    def random_segmentation(self) -> utils.Segmentation:
+        """
+        Calculate the random HAS segments for a given language, as an array-backed `Segmentation`.
+
+        Returns
+        -------
+        Segmentation
+            The segments of all messages, with their segment ids.
+
+        Notes
+        -----
+            The result is cached and will only be computed once.
+            Subsequent calls to this method will return the cached value.
+        """
+        if self.__random_segmentation is None:
+            if self.__random_boundaries is None:
+                self.random_boundaries()
+            self.__random_segmentation = metrics.compute_segmentation(
+                self.messages, self.__random_boundaries
+            )
+
+        return self.__random_segmentation
+
     def segments(self, return_ids: bool = False, return_hashed_segments: bool = False):
         """
         Calculate the HAS segments for a given language.
@@ -516,13 +762,11 @@ class Language:
 
         """
         if self.__segments is None:
-            if self.__boundaries is None:
-                self.boundaries()
             (
                 self.__segments,
                 self.__segment_ids,
                 self.__hashed_segments,
-            ) = metrics.compute_segments(self.messages, self.__boundaries)
+            ) = self.segmentation().to_tuples()
 
         if return_ids:
             return self.__segments, self.__segment_ids
@@ -568,13 +812,11 @@ class Language:
             Subsequent calls to this method will return the cached value.
         """
         if self.__random_segments is None and not recompute:
-            if self.__random_boundaries is None and not recompute:
-                self.random_boundaries()
             (
                 self.__random_segments,
                 self.__random_segment_ids,
                 self.__random_hashed_segments,
-            ) = metrics.compute_segments(self.messages, self.__random_boundaries)
+            ) = self.random_segmentation().to_tuples()
 
         if return_ids:
             return self.__random_segments, self.__random_segment_ids
@@ -604,6 +846,8 @@ class Language:
         -------
         dict
             A dictionary containing various statistics related to the language.
+            The random vocabulary size, ZLA and Zipf statistics are averaged over
+            `random_replicates` replicates, with their standard deviations in the `*_std` keys.
 
         Raises
         ------
@@ -617,46 +861,14 @@ class Language:
 
         """
         if self.__has_stats is None:
-            if self.observations is None and compute_topsim:
-                raise ValueError(
-                    "Observations are needed to calculate topographic similarity."
-                )
-
-            zla, freq = metrics.zla(self.segments())
-            random_zla, random_freq = metrics.zla(self.random_segments())
-
-            # Pad the segments for topsim computation
-            # We use 0 as it is not used in the has table
-            # and has no effect on the distance measurement
-            if compute_topsim:
-                padded_hashed_segments = utils.pad_jagged(self.__hashed_segments)
-                padded_random_hashed_segments = utils.pad_jagged(
-                    self.__random_hashed_segments
-                )
-
-            self.__has_stats = {
-                "vocab_size": len(self.__segment_ids),
-                "zla": zla,
-                "zipf": freq,
-                # We use hamming here, as the segments could contain multiple characters
-                # So editdistance would give us a worse estimate
-                "topographic_similarity": metrics.compute_topographic_similarity(
-                    padded_hashed_segments,
-                    self.observations,
-                    message_dist_metric="hamming",
-                )
-                if compute_topsim
-                else None,
-                "random_vocab_size": len(self.__random_segment_ids),
-                "random_zla": random_zla,
-                "random_zipf": random_freq,
-                "random_topographic_similarity": metrics.compute_topographic_similarity(
-                    padded_random_hashed_segments,
-                    self.observations,
-                    message_dist_metric="hamming",
-                )
-                if compute_topsim
-                else None,
-            }
+            if self.__random_boundary_masks is None:
+                self.random_boundaries()
+            self.__has_stats = metrics.compute_has_stats(
+                self.messages,
+                self.segmentation(),
+                self.__random_boundary_masks,
+                observations=self.observations,
+                compute_topsim=compute_topsim,
+            )
 
         return self.__has_stats
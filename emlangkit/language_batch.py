@@ -0,0 +1,345 @@
+"""Batch of languages of the same size, evaluated together."""
+import os
+from typing import Optional, Tuple, Union
+
+import numpy as np
+
+import emlangkit.metrics as metrics
+import emlangkit.utils as utils
+from emlangkit.utils.encoding import encode_columns, encode_rows
+from emlangkit.utils.kernels import (
+    bag_of_words,
+    batched_disentanglement,
+    count_repeats,
+    prev_use_percentage,
+)
+
+
+class LanguageBatch:
+    """
+    A batch of emergent languages with the same number of messages, e.g. several seeds or checkpoints.
+
+    The metrics are computed for all languages at once. The rows of all languages are encoded
+    together, tagged with the index of their language, so that the counts of every language
+    come out of a single pass over the whole batch.
+
+    Parameters
+    ----------
+    messages : numpy.ndarray, str or os.PathLike
+        Numpy array of shape (B, N, L) containing the messages of each language,
+        or the path of a `.npy` file with them, opened as a read-only memory map.
+    observations : numpy.ndarray, str or os.PathLike, optional
+        Numpy array of shape (B, N, ...) containing the observations of each language,
+        or the path of a `.npy` file with them. Default is None.
+    prev_horizon : int, optional
+        The horizon up to which M_previous^n is calculated. Default is 8.
+
+    Examples
+    --------
+    Evaluate three languages of four messages each:
+    >>> messages = np.random.default_rng().integers(0, 4, size=(3, 4, 5))
+    >>> observations = np.random.default_rng().integers(0, 4, size=(3, 4, 2))
+    >>> results = LanguageBatch(messages, observations).results()
+    """
+
+    def __init__(
+        self,
+        messages: Union[np.ndarray, str, os.PathLike],
+        observations: Optional[Union[np.ndarray, str, os.PathLike]] = None,
+        prev_horizon: int = 8,
+    ):
+        messages = utils.load_array(messages)
+        observations = utils.load_array(observations)
+
+        if not isinstance(messages, np.ndarray):
+            raise ValueError("LanguageBatch only accepts numpy arrays!")
+        if messages.ndim < 3 or np.size(messages) == 0:
+            raise ValueError("LanguageBatch needs messages of shape (B, N, L)!")
+
+        if observations is not None:
+            if not isinstance(observations, np.ndarray):
+                raise ValueError("LanguageBatch only accepts numpy arrays!")
+            if observations.shape[:2] != messages.shape[:2]:
+                raise ValueError(
+                    "Observations must have the same batch and sample dimensions as the messages!"
+                )
+
+        self.messages = messages
+        self.observations = observations
+        self.prev_horizon = prev_horizon
+
+        # Placeholders
+        self.__message_codes = None
+        self.__observation_codes = None
+        self.__language_entropy_value = None
+        self.__observation_entropy_value = None
+        self.__mutual_information_value = None
+        self.__posdis_value = None
+        self.__bosdis_value = None
+        self.__topsim_value = None
+        self.__mpn_value = None
+
+    def __len__(self) -> int:
+        """Return the number of languages in the batch."""
+        return len(self.messages)
+
+    def __require_observations(self, metric: str):
+        """Raise a ValueError if the observations are not set."""
+        if self.observations is None:
+            raise ValueError(f"Observations are needed to calculate {metric}.")
+
+    def __codes(self, observations: bool = False) -> Tuple[np.ndarray, np.ndarray]:
+        """Encode the rows of all languages, returning the codes of shape (B, N) and the counts."""
+        if observations:
+            if self.__observation_codes is None:
+                self.__observation_codes = _batch_encode(self.observations)
+            return self.__observation_codes
+        if self.__message_codes is None:
+            self.__message_codes = _batch_encode(self.messages)
+        return self.__message_codes
+
+    def __entropy(self, codes: np.ndarray, counts: np.ndarray) -> np.ndarray:
+        """Compute the entropy in bits of each language, from batch-wide codes."""
+        n_batches, n = codes.shape
+        p = counts / n
+        return -np.bincount(
+            _batch_of_codes(codes, len(counts)),
+            weights=p * np.log2(p),
+            minlength=n_batches,
+        )
+
+    def language_entropy(self) -> np.ndarray:
+        """
+        Calculate the entropy of the messages of each language.
+
+        Returns
+        -------
+            np.ndarray: Array of shape (B,) with the entropy of each language.
+        """
+        if self.__language_entropy_value is None:
+            self.__language_entropy_value = self.__entropy(*self.__codes())
+
+        return self.__language_entropy_value
+
+    def observation_entropy(self) -> np.ndarray:
+        """
+        Calculate the entropy of the observations of each language.
+
+        Returns
+        -------
+            np.ndarray: Array of shape (B,) with the entropy of each language.
+
+        Raises
+        ------
+            ValueError: If observations are not set.
+        """
+        self.__require_observations("observation entropy")
+        if self.__observation_entropy_value is None:
+            self.__observation_entropy_value = self.__entropy(
+                *self.__codes(observations=True)
+            )
+
+        return self.__observation_entropy_value
+
+    def mutual_information(self) -> np.ndarray:
+        """
+        Calculate the mutual information between the messages and observations of each language.
+
+        Returns
+        -------
+            np.ndarray: Array of shape (B,) with the mutual information of each language.
+
+        Raises
+        ------
+            ValueError: If observations are not set.
+        """
+        self.__require_observations("mutual information")
+        if self.__mutual_information_value is None:
+            message_codes, _ = self.__codes()
+            observation_codes, _ = self.__codes(observations=True)
+            # Message codes already differ between languages, so the pairs do too
+            joint_codes, joint_counts = encode_rows(
+                np.stack((observation_codes.ravel(), message_codes.ravel()), axis=1)
+            )
+            joint_entropy = self.__entropy(
+                joint_codes.reshape(message_codes.shape), joint_counts
+            )
+            self.__mutual_information_value = (
+                self.observation_entropy() + self.language_entropy() - joint_entropy
+            )
+
+        return self.__mutual_information_value
+
+    def posdis(self) -> np.ndarray:
+        """
+        Calculate the positional disentanglement of each language.
+
+        Returns
+        -------
+            np.ndarray: Array of shape (B,) with the positional disentanglement of each language.
+
+        Raises
+        ------
+            ValueError: If observations are not set.
+        """
+        self.__require_observations("positional disentanglement")
+        if self.__posdis_value is None:
+            self.__posdis_value = batched_disentanglement(
+                *_batch_encode_columns(self.messages),
+                *_batch_encode_columns(self.observations),
+            )
+
+        return self.__posdis_value
+
+    def bosdis(self) -> np.ndarray:
+        """
+        Calculate the bag-of-words disentanglement of each language.
+
+        Returns
+        -------
+            np.ndarray: Array of shape (B,) with the bag-of-words disentanglement of each language.
+
+        Raises
+        ------
+            ValueError: If observations are not set.
+        """
+        self.__require_observations("bag-of-words disentanglement")
+        if self.__bosdis_value is None:
+            n_batches, n = self.messages.shape[:2]
+            # Count the symbols of the joint vocabulary, so the columns match across languages
+            messages = utils.RowEncoding(self.messages.reshape(n_batches * n, -1))
+            bow_message = bag_of_words(
+                messages.symbol_codes, len(messages.symbols)
+            ).reshape(n_batches, n, -1)
+
+            self.__bosdis_value = batched_disentanglement(
+                *_batch_encode_columns(bow_message),
+                *_batch_encode_columns(self.observations),
+            )
+
+        return self.__bosdis_value
+
+    def topsim(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Calculate the topographic similarity of each language.
+
+        Returns
+        -------
+            tuple of np.ndarray: The topographic similarity of each language, and the p-values.
+
+        Raises
+        ------
+            ValueError: If observations are not set.
+        """
+        self.__require_observations("topographic similarity")
+        if self.__topsim_value is None:
+            self.__topsim_value = metrics.compute_topographic_similarity_batch(
+                self.messages, self.observations
+            )
+
+        return self.__topsim_value
+
+    def mpn(self) -> np.ndarray:
+        """
+        Calculate the M_previous^n metric of each language.
+
+        Returns
+        -------
+            np.ndarray: Array of shape (B, prev_horizon + 1) with the highest M_previous^n
+            value of each language for each horizon.
+
+        Raises
+        ------
+            ValueError: If observations are not set.
+        """
+        self.__require_observations("M_previous^n")
+        if self.__mpn_value is None:
+            message_codes, message_counts = self.__codes()
+            observation_codes, _ = self.__codes(observations=True)
+            # Codes differ between languages, so no repeat is found across two languages
+            same_as_previous_obj = count_repeats(
+                observation_codes.ravel(),
+                message_codes.ravel(),
+                len(message_counts),
+                self.prev_horizon,
+            )
+            percentages = prev_use_percentage(same_as_previous_obj, message_counts)
+            mpn = np.zeros((len(self), self.prev_horizon + 1), dtype=np.float32)
+            np.maximum.at(
+                mpn,
+                _batch_of_codes(message_codes, len(message_counts)),
+                percentages,
+            )
+            self.__mpn_value = mpn
+
+        return self.__mpn_value
+
+    def results(self, compute_topsim: bool = True) -> np.ndarray:
+        """
+        Calculate all metrics of all languages.
+
+        Parameters
+        ----------
+        compute_topsim : bool, optional
+            Flag indicating whether to compute topographic similarity. Default is True.
+
+        Returns
+        -------
+        np.ndarray
+            Structured array of shape (B,), with the fields "language_entropy",
+            "observation_entropy", "mutual_information", "posdis", "bosdis",
+            "topsim", "topsim_pvalue" and "mpn". Topographic similarity is nan if not computed.
+
+        Raises
+        ------
+        ValueError
+            If observations are not set.
+        """
+        self.__require_observations("the metrics")
+        results = np.zeros(
+            len(self),
+            dtype=[
+                ("language_entropy", np.float64),
+                ("observation_entropy", np.float64),
+                ("mutual_information", np.float64),
+                ("posdis", np.float64),
+                ("bosdis", np.float64),
+                ("topsim", np.float64),
+                ("topsim_pvalue", np.float64),
+                ("mpn", np.float32, (self.prev_horizon + 1,)),
+            ],
+        )
+        results["language_entropy"] = self.language_entropy()
+        results["observation_entropy"] = self.observation_entropy()
+        results["mutual_information"] = self.mutual_information()
+        results["posdis"] = self.posdis()
+        results["bosdis"] = self.bosdis()
+        if compute_topsim:
+            results["topsim"], results["topsim_pvalue"] = self.topsim()
+        else:
+            results["topsim"] = results["topsim_pvalue"] = np.nan
+        results["mpn"] = self.mpn()
+        return results
+
+
+def _batch_encode(x: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Encode the rows of every language of a (B, N, ...) array, with codes that differ between languages."""
+    n_batches, n = x.shape[:2]
+    rows = x.reshape(n_batches * n, -1)
+    batch = np.repeat(np.arange(n_batches), n)
+    codes, counts = encode_rows(np.concatenate((batch[:, None], rows), axis=1))
+    return codes.reshape(n_batches, n), counts
+
+
+def _batch_of_codes(codes: np.ndarray, n_codes: int) -> np.ndarray:
+    """Find the language of every code returned by `_batch_encode`."""
+    batch_of_codes = np.empty(n_codes, dtype=np.int64)
+    batch_of_codes[codes] = np.arange(len(codes))[:, None]
+    return batch_of_codes
+
+
+def _batch_encode_columns(x: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Encode the columns of a (B, N, ...) array, with codes shared by all languages."""
+    n_batches, n = x.shape[:2]
+    codes, cardinalities = encode_columns(x.reshape(n_batches * n, -1))
+    return codes.reshape(n_batches, n, -1), cardinalities
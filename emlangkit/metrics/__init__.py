@@ -2,18 +2,30 @@
 from emlangkit.metrics.bosdis import compute_bosdis
 from emlangkit.metrics.entropy import compute_entropy
 from emlangkit.metrics.has import (
+    boundaries_from_mask,
+    boundaries_to_mask,
     compute_boundaries,
+    compute_boundary_scores,
     compute_branching_entropy,
     compute_conditional_entropy,
+    compute_has_stats,
     compute_random_boundaries,
+    compute_replicate_stats,
+    compute_segmentation,
     compute_segments,
+    compute_threshold_sweep,
     has_init,
+    merge_segment_ids,
 )
 from emlangkit.metrics.mpn import compute_mpn
 from emlangkit.metrics.mutual_information import compute_mutual_information
 from emlangkit.metrics.nc_npmi import compute_nc_npmi
 from emlangkit.metrics.posdis import compute_posdis
-from emlangkit.metrics.topsim import compute_topographic_similarity
+from emlangkit.metrics.topsim import (
+    compute_topographic_similarity,
+    compute_topographic_similarity_batch,
+    compute_topographic_similarity_sampled,
+)
 from emlangkit.metrics.zla import zla
 
 __all__ = [
@@ -23,13 +35,23 @@ __all__ = [
     "compute_mutual_information",
     "compute_posdis",
     "compute_topographic_similarity",
+    "compute_topographic_similarity_sampled",
+    "compute_topographic_similarity_batch",
     "compute_mpn",
     "has_init",
     "compute_segments",
+    "compute_segmentation",
+    "merge_segment_ids",
     "compute_boundaries",
+    "compute_boundary_scores",
+    "boundaries_from_mask",
+    "boundaries_to_mask",
     "compute_random_boundaries",
+    "compute_replicate_stats",
     "compute_branching_entropy",
     "compute_conditional_entropy",
+    "compute_has_stats",
+    "compute_threshold_sweep",
     "zla",
     "compute_nc_npmi",
 ]
@@ -6,7 +6,8 @@ Adapted from https://proceedings.neurips.cc/paper/2021/hash/c2839bed26321da8b466
 
 import numpy as np
 
-from emlangkit.metrics.posdis import compute_posdis
+from emlangkit.utils.encoding import as_encoding, encode_columns
+from emlangkit.utils.kernels import bag_of_words, disentanglement
 
 
 def compute_bosdis(messages: np.ndarray, observations: np.ndarray) -> float:
@@ -15,9 +16,9 @@ def compute_bosdis(messages: np.ndarray, observations: np.ndarray) -> float:
 
     Parameters
     ----------
-    messages : np.ndarray
+    messages : np.ndarray or RowEncoding
         Messages to calculate bag-of-words disentanglement for.
-    observations : np.ndarray
+    observations : np.ndarray or RowEncoding
         Observations to calculate bag-of-words disentanglement for.
 
     Returns
@@ -25,18 +26,17 @@ def compute_bosdis(messages: np.ndarray, observations: np.ndarray) -> float:
     bosdis : float
         Bag-of-words disentanglement score.
     """
-    character_set = list(c for message in messages for c in message)
-    vocab = {char: idx for idx, char in enumerate(character_set)}
-    num_symbols = len(vocab)
-    bow_message = []
-    bow_observation = []
-    for observation, message in zip(observations, messages):
-        message_bow = [0 for _ in range(num_symbols)]
-        for symbol in message:
-            message_bow[list(vocab.keys()).index(symbol)] += 1
-        message_bow = [str(symbol) for symbol in message_bow]
-        bow_message.append(message_bow)
-        bow_observation.append(observation)
-    return compute_posdis(
-        messages=np.array(bow_message), observations=np.array(bow_observation)
+    messages = as_encoding(messages)
+    observations = as_encoding(observations)
+    bow_message = bag_of_words(
+        messages.symbol_codes.reshape(len(messages), -1), len(messages.symbols)
+    )
+    message_codes, message_cardinalities = encode_columns(bow_message)
+    observation_codes = observations.column_codes
+    observation_cardinalities = observations.column_cardinalities
+    return disentanglement(
+        message_codes,
+        message_cardinalities,
+        observation_codes,
+        observation_cardinalities,
     )
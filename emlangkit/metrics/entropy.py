@@ -3,6 +3,8 @@
 import numpy as np
 from scipy.stats import entropy
 
+from emlangkit.utils.encoding import as_encoding
+
 
 def compute_entropy(x: np.ndarray, base: int = 2):
     """
@@ -13,7 +15,7 @@ def compute_entropy(x: np.ndarray, base: int = 2):
 
     Parameters
     ----------
-    x : np.ndarray
+    x : np.ndarray or RowEncoding
         Input to calculate the entropy for.
     base : int, default=2
         Base to use for the entropy. The default is 2, for entropy measured in bits.
@@ -23,6 +25,5 @@ def compute_entropy(x: np.ndarray, base: int = 2):
     entropy : float
         Entropy measure.
     """
-    x_s = [str(y) for y in x]
-    _, count = np.unique(x_s, return_counts=True)
+    count = as_encoding(x).counts
     return entropy(count, base=base)
@@ -6,12 +6,20 @@ Adapted from https://openreview.net/forum?id=b4t9_XASt6G
 
 import itertools
 from collections import Counter
-from typing import List, Tuple
+from collections.abc import Mapping
+from typing import Iterator, List, Optional, Tuple, Union
 
 import numpy as np
 
+from emlangkit.metrics.topsim import compute_topographic_similarity
+from emlangkit.utils.array_ops import CHUNK_SIZE, row_chunks
+from emlangkit.utils.ngram_index import NGramIndex
+from emlangkit.utils.segmentation import Segmentation, merge_vocabularies
 
-def has_init(messages: np.ndarray) -> Tuple[set, Counter]:
+
+def has_init(
+    messages: np.ndarray, use_index: bool = False
+) -> Tuple[set, Union[Counter, NGramIndex]]:
     """
     Compute initial values used by the other HAS functions.
 
@@ -19,17 +27,22 @@ def has_init(messages: np.ndarray) -> Tuple[set, Counter]:
     ----------
     messages : numpy.ndarray
         The array of messages.
+    use_index : bool, default=False
+        If True, the frequencies are stored in an array-backed `NGramIndex` instead of a Counter.
+        This requires fixed-length messages, and uses far less memory and time.
 
     Returns
     -------
     alpha : set
         The set of unique characters present in the messages.
-    freq : Counter
+    freq : Counter or NGramIndex
         A Counter containing all sequences and their corresponding frequencies.
 
     """
     # Create the alphabet
     alpha = set(np.unique(messages))
+    if use_index:
+        return alpha, NGramIndex.from_messages(messages)
     # Count all subsequences
     freq = Counter(
         tuple(s[i:j])
@@ -44,6 +57,42 @@ def has_init(messages: np.ndarray) -> Tuple[set, Counter]:
     return alpha, freq
 
 
+class BranchingEntropy(Mapping):
+    """
+    The branching entropy of every context of an n-gram index.
+
+    The values are stored in an array indexed by the node IDs of the index. The class is a
+    read-only mapping from context tuples to their branching entropy, so that it can be used
+    in place of the dictionary computed from a Counter.
+
+    Parameters
+    ----------
+    index : NGramIndex
+        The index the contexts are taken from.
+    entropy : np.ndarray
+        Array of shape (index.n_nodes,) with the branching entropy of each node.
+    """
+
+    def __init__(self, index: NGramIndex, entropy: np.ndarray):
+        self.index = index
+        self.entropy = entropy
+
+    def __getitem__(self, context) -> float:
+        """Return the branching entropy of a context, raising a KeyError if it does not occur."""
+        node = self.index.lookup(context)
+        if node < 0:
+            raise KeyError(context)
+        return self.entropy[node]
+
+    def __iter__(self) -> Iterator[Tuple]:
+        """Iterate over all contexts, in node order."""
+        return iter(self.index)
+
+    def __len__(self) -> int:
+        """Return the number of contexts, including the empty one."""
+        return len(self.index)
+
+
 def compute_branching_entropy(alpha, freq):
     """
     Calculate the branching entropy for a given alphabet, with given frequencies of each item.
@@ -52,14 +101,18 @@ def compute_branching_entropy(alpha, freq):
     ----------
     alpha : set
         The set of unique characters present in the messages.
-    freq : Counter
+    freq : Counter or NGramIndex
         A dictionary containing sequences as keys and their corresponding frequencies as values.
 
     Returns
     -------
-    branching_entropy : dict
+    branching_entropy : dict or BranchingEntropy
         Dictionary mapping contexts to their corresponding branching entropy.
+        For an `NGramIndex`, a mapping backed by an array indexed by node ID.
     """
+    if isinstance(freq, NGramIndex):
+        return BranchingEntropy(freq, _branching_entropy_array(freq))
+
     branching_entropy = dict()
     for context, context_freq in freq.items():
         succ_freq_list = [freq[context + (a,)] for a in alpha]
@@ -75,15 +128,30 @@ def compute_branching_entropy(alpha, freq):
     return branching_entropy
 
 
+def _branching_entropy_array(index: NGramIndex) -> np.ndarray:
+    """Calculate the branching entropy of every node of an n-gram index, from its successor counts."""
+    succ = index.successor_counts()
+    # Row of each non-zero entry, i.e. the context it is a successor of
+    contexts = np.repeat(np.arange(index.n_nodes), np.diff(succ.indptr))
+    succ_freq = succ.data.astype(np.float64)
+    context_freq = index.count[contexts].astype(np.float64)
+    branching_entropy = np.bincount(
+        contexts,
+        weights=succ_freq * (np.log2(succ_freq) - np.log2(context_freq)),
+        minlength=index.n_nodes,
+    )
+    return -1 * branching_entropy / index.count
+
+
 def compute_conditional_entropy(branching_entropy, freq) -> dict:
     """
     Compute conditional entropy of a given alphabet, given the branching entropy and the character frequencies.
 
     Parameters
     ----------
-    branching_entropy : dict
+    branching_entropy : dict or BranchingEntropy
         A dictionary containing sequences as keys and their corresponding branching entropy values as values.
-    freq : dict
+    freq : dict or NGramIndex
         A dictionary containing sequences as keys and their corresponding frequencies as values.
 
 
@@ -93,6 +161,19 @@ def compute_conditional_entropy(branching_entropy, freq) -> dict:
         A dictionary containing the conditional entropy for each sequence length.
         The keys are sequence lengths and the values are the corresponding conditional entropy values.
     """
+    if isinstance(freq, NGramIndex):
+        # Sum over all nodes of each length at once
+        if isinstance(branching_entropy, BranchingEntropy):
+            entropy = branching_entropy.entropy
+        else:
+            entropy = np.array([branching_entropy[seq] for seq in freq.sequences()])
+        weighted = np.bincount(freq.depth, weights=freq.count * entropy)
+        total_freq = np.bincount(freq.depth, weights=freq.count)
+        return {
+            length: weighted[length] / total_freq[length]
+            for length in range(len(total_freq))
+        }
+
     conditional_entropy = dict()
     length_to_total_freq = dict()
     for seq, ent in branching_entropy.items():
@@ -109,8 +190,11 @@ def compute_conditional_entropy(branching_entropy, freq) -> dict:
 
 
 def compute_boundaries(
-    messages: np.ndarray, branching_entropy: dict, threshold: float
-) -> List[set]:
+    messages: np.ndarray,
+    branching_entropy: dict,
+    threshold: float,
+    return_mask: bool = False,
+) -> Union[List[set], np.ndarray]:
     """
     Compute the boundaries of a language, given its pre-computed branching entropy and a threshold value.
 
@@ -118,15 +202,19 @@ def compute_boundaries(
     ----------
     messages : numpy.ndarray
         A numpy array containing the input messages.
-    branching_entropy : dict
+    branching_entropy : dict or BranchingEntropy
         The branching entropy for each context in the messages.
     threshold : float
         The threshold value used for determining the boundaries.
+    return_mask : bool, default=False
+        If True, return the boundaries as a boolean mask instead of a list of sets.
 
     Returns
     -------
-    boundaries : List[set]
+    boundaries : List[set] or np.ndarray
         A list of sets, where each set represents the boundary positions in each message.
+        If `return_mask` is True, a boolean array of shape (N, L + 2) instead, where
+        `boundaries[n, i]` is True if there is a boundary at position `i` of message `n`.
 
     Notes
     -----
@@ -135,7 +223,15 @@ def compute_boundaries(
     If the difference is greater than the threshold, a boundary is added at the position.
     The algorithm starts with a width of 2, assuming that the branching entropy has already been computed.
 
+    With a `BranchingEntropy`, all windows of all messages are compared at once, see
+    `compute_boundary_scores`. As windows are truncated at the end of the messages,
+    boundaries can be found at positions L and L + 1, hence the two extra mask columns.
+
     """
+    if isinstance(branching_entropy, BranchingEntropy):
+        mask = compute_boundary_scores(branching_entropy, messages) > threshold
+        return mask if return_mask else boundaries_from_mask(mask)
+
     boundaries = []
     for d in messages:
         boundaries.append(set())
@@ -154,9 +250,182 @@ def compute_boundaries(
             else:
                 start += 1
                 width = 2
+    if return_mask:
+        return boundaries_to_mask(boundaries, max(map(len, messages)) + 2)
     return boundaries
 
 
+def compute_boundary_scores(
+    branching_entropy: BranchingEntropy,
+    messages: Optional[np.ndarray] = None,
+    block_size: int = CHUNK_SIZE,
+) -> np.ndarray:
+    """
+    Compute the largest increase of branching entropy at every position of every message.
+
+    For every window `messages[n, start : start + width]` that `compute_boundaries`
+    considers, the branching entropy of the window and of its prefix are looked up
+    by node ID, from the position x width table of window nodes, which is built for one
+    block of messages at a time. The table of the indexed messages is built from their
+    suffix nodes, other messages are looked up in the index.
+    A boundary is found at a position if the largest increase over all windows ending
+    there is above the threshold, so the scores can be compared to any threshold.
+
+    Parameters
+    ----------
+    branching_entropy : BranchingEntropy
+        The branching entropy of the messages the boundaries are computed for.
+    messages : np.ndarray, optional
+        Array of shape (N, L) containing the messages to score, whose contexts must all occur
+        in the index of the branching entropy. Default is the indexed messages.
+    block_size : int, default=2**22
+        Maximum number of window nodes looked up at once, i.e. L x (L + 1) per message.
+        Bounds the memory use, whatever the length of the messages.
+
+    Returns
+    -------
+    scores : np.ndarray
+        Array of shape (N, L + 2) with the largest increase of branching entropy of the
+        windows ending at each position, or -inf if no window ends there.
+
+    Raises
+    ------
+    ValueError
+        If the messages contain a context that does not occur in the index.
+    """
+    entropy = branching_entropy.entropy
+    index = branching_entropy.index
+    if messages is None:
+        n, length = index.suffix_nodes.shape
+    else:
+        messages = np.asarray(messages)
+        if messages.ndim != 2:
+            raise ValueError("Boundary scores require a 2D array of messages!")
+        n, length = messages.shape
+
+    starts, context_widths, positions = _boundary_windows(length)
+    # Group the windows by the position they end at
+    order = np.argsort(positions, kind="stable")
+    starts, context_widths = starts[order], context_widths[order]
+    ends, group_starts = np.unique(positions[order], return_index=True)
+
+    scores = np.full((n, length + 2), -np.inf)
+    for start, stop in row_chunks(n, length * (length + 1), block_size):
+        nodes = _window_nodes(index, messages, start, stop)
+        if (nodes[:, starts, context_widths] < 0).any():
+            raise ValueError(
+                "The messages contain contexts that do not occur in the branching entropy!"
+            )
+        deltas = (
+            entropy[nodes[:, starts, context_widths]]
+            - entropy[nodes[:, starts, context_widths - 1]]
+        )
+        if deltas.shape[1] > 0:
+            scores[start:stop, ends] = np.maximum.reduceat(deltas, group_starts, axis=1)
+    return scores
+
+
+def _window_nodes(
+    index: NGramIndex, messages: Optional[np.ndarray], start: int, stop: int
+) -> np.ndarray:
+    """Find the window nodes of a block of messages, from the suffix nodes if they were indexed."""
+    if messages is None:
+        return index.window_nodes(start, stop)
+    block = messages[start:stop]
+    if messages.shape == index.suffix_nodes.shape and messages.size > 0:
+        # The windows of width 1 hold every symbol, so they tell if the block was indexed
+        nodes = index.window_nodes(start, stop)
+        if np.array_equal(index.alphabet[index.symbol[nodes[:, :, 1]]], block):
+            return nodes
+    return index.find_window_nodes(block)
+
+
+def _boundary_windows(length: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """List the start, context width and boundary position of the windows of `compute_boundaries`."""
+    starts, context_widths, positions = [], [], []
+    for start in range(length):
+        for width in range(2, max(2, length - start - 1) + 1):
+            starts.append(start)
+            # The context is truncated at the end of the message
+            context_widths.append(min(width, length - start))
+            positions.append(start + width)
+    return (
+        np.array(starts, dtype=np.int64),
+        np.array(context_widths, dtype=np.int64),
+        np.array(positions, dtype=np.int64),
+    )
+
+
+def boundaries_from_mask(mask: np.ndarray) -> List[set]:
+    """
+    Convert a boolean boundary mask into a list of sets of boundary positions.
+
+    Parameters
+    ----------
+    mask : np.ndarray
+        Boolean array of shape (N, P), as returned by `compute_boundaries`.
+
+    Returns
+    -------
+    boundaries : List[set]
+        A list of sets, where each set represents the boundary positions in each message.
+    """
+    return [set(np.flatnonzero(row).tolist()) for row in mask]
+
+
+def boundaries_to_mask(boundaries: List[set], width: int) -> np.ndarray:
+    """
+    Convert a list of sets of boundary positions into a boolean boundary mask.
+
+    Parameters
+    ----------
+    boundaries : List[set]
+        A list of sets, where each set represents the boundary positions in each message.
+    width : int
+        Number of positions in the mask. Must be larger than all boundary positions.
+
+    Returns
+    -------
+    mask : np.ndarray
+        Boolean array of shape (N, width).
+    """
+    rows = np.repeat(np.arange(len(boundaries)), [len(b) for b in boundaries])
+    positions = np.fromiter(
+        itertools.chain.from_iterable(boundaries), dtype=np.int64, count=len(rows)
+    )
+    mask = np.zeros((len(boundaries), width), dtype=bool)
+    mask[rows, positions] = True
+    return mask
+
+
+def compute_segmentation(
+    messages: np.ndarray, boundaries: Union[List[set], np.ndarray]
+) -> Segmentation:
+    """
+    Compute the segments of a language as an array-backed `Segmentation`.
+
+    This holds the same segments as `compute_segments`, without creating a tuple per segment.
+
+    Parameters
+    ----------
+    messages : numpy.ndarray
+        An array of shape (N, L) containing the messages to be segmented.
+    boundaries : List[set] or np.ndarray
+        The boundary positions of each message, or a boolean boundary mask as
+        returned by `compute_boundaries`.
+
+    Returns
+    -------
+    segmentation : Segmentation
+        The segments of the messages.
+    """
+    if not isinstance(boundaries, np.ndarray):
+        boundaries = boundaries_to_mask(
+            boundaries, max(max(b, default=0) for b in boundaries) + 1
+        )
+    return Segmentation.from_mask(messages, boundaries)
+
+
 def compute_segments(
     messages: np.ndarray, boundaries: List[set]
 ) -> Tuple[list, dict, list]:
@@ -179,8 +448,9 @@ def compute_segments(
         a segment of the message.
 
     segment_ids : dict
-        A dictionary mapping each unique segment to its corresponding ID. The ID
-        is calculated based on the order of occurrence in the segments list.
+        A dictionary mapping each unique segment to its corresponding ID. IDs start at 1
+        and follow the sorted order of the segments, so they are the same in every run,
+        and match the IDs of `compute_segmentation`.
 
     hashed_segments : list
         A list of tuples containing the hashed versions of the segmented messages.
@@ -199,37 +469,298 @@ def compute_segments(
     segment_ids = {
         s: i + 1
         for i, s in enumerate(
-            {tuple(x) for x in itertools.chain.from_iterable(segments)}
+            sorted({tuple(x) for x in itertools.chain.from_iterable(segments)})
         )
     }
     hashed_segments = [tuple(segment_ids[x] for x in s) for s in segments]
     return segments, segment_ids, hashed_segments
 
 
+def merge_segment_ids(segment_ids: List[dict]) -> Tuple[dict, List[np.ndarray]]:
+    """
+    Merge the segment IDs computed on several shards of a language into global IDs.
+
+    The global IDs are the IDs `compute_segments` assigns when run on all shards at once,
+    so the hashed segments of each shard can be combined without segmenting them again.
+
+    Parameters
+    ----------
+    segment_ids : List[dict]
+        The segment ids returned by `compute_segments` for each shard.
+
+    Returns
+    -------
+    merged_ids : dict
+        A dictionary mapping each unique segment of all shards to its global ID.
+    remaps : List[np.ndarray]
+        For each shard, an array mapping its segment IDs to the global IDs, e.g.
+        `remaps[k][padded_hashed_segments]` for padded hashed segments of shard `k`.
+    """
+    vocabularies = [sorted(ids, key=ids.get) for ids in segment_ids]
+    vocabulary, remaps = merge_vocabularies(vocabularies)
+    return {s: i + 1 for i, s in enumerate(vocabulary)}, remaps
+
+
 def compute_random_boundaries(
-    messages: np.ndarray, boundaries, rng: np.random.Generator
-) -> List[set]:
+    messages: np.ndarray,
+    boundaries,
+    rng: np.random.Generator,
+    n_replicates: Optional[int] = None,
+    return_mask: bool = False,
+) -> Union[List[set], list, np.ndarray]:
     """
     Compute random boundaries for a language, given pre-computed boundaries and a random number generator instance.
 
+    Each message gets as many distinct random boundaries, between positions 1 and L - 1,
+    as it has HAS boundaries, or L - 1 if it has more. The positions of all messages are
+    drawn at once, by ranking uniform random keys within each message.
+
     Parameters
     ----------
     messages : np.ndarray
-        The input array of messages.
+        The input array of messages, of shape (N, L).
 
-    boundaries : list
-        The input list of boundaries.
+    boundaries : list or np.ndarray
+        The input list of boundaries, or a boolean boundary mask.
 
     rng : np.random.Generator
         The random number generator object.
 
+    n_replicates : int, optional
+        Number of independent random replicates to draw. If not given, a single one is drawn.
+
+    return_mask : bool, default=False
+        If True, return the boundaries as a boolean mask instead of a list of sets.
+
     Returns
     -------
-    random_boundaries : List[set]
-        The list of randomly computed boundaries.
-    """
-    random_boundaries = [
-        set(rng.choice(np.arange(1, len(data), dtype=np.int32), size=len(boundaries)))
-        for data, boundaries in zip(messages, boundaries)
-    ]
-    return random_boundaries
+    random_boundaries : List[set] or np.ndarray
+        The list of randomly computed boundaries, or a boolean array of shape (N, L + 2)
+        if `return_mask` is True. With `n_replicates`, a list of such lists, or a boolean
+        array of shape (n_replicates, N, L + 2).
+    """
+    n, length = np.shape(messages)[:2]
+    if isinstance(boundaries, np.ndarray):
+        counts = boundaries.sum(axis=1)
+    else:
+        counts = np.array([len(b) for b in boundaries])
+    counts = np.minimum(counts, max(length - 1, 0))
+
+    masks = np.zeros((n_replicates or 1, n, length + 2), dtype=bool)
+    for mask in masks:
+        # Keeping the positions with the lowest keys samples without replacement
+        ranks = rng.random((n, length - 1)).argsort(axis=1).argsort(axis=1)
+        mask[:, 1:length] = ranks < counts[:, None]
+
+    if not return_mask:
+        masks = [boundaries_from_mask(mask) for mask in masks]
+    return masks if n_replicates is not None else masks[0]
+
+
+def compute_replicate_stats(messages: np.ndarray, masks: np.ndarray) -> dict:
+    """
+    Compute the mean and spread of segmentation statistics over several boundary replicates.
+
+    Parameters
+    ----------
+    messages : np.ndarray
+        The input array of messages, of shape (N, L).
+    masks : np.ndarray
+        Boolean array of shape (R, N, P) with the boundary mask of each replicate.
+
+    Returns
+    -------
+    stats : dict
+        The mean and standard deviation over replicates of the vocabulary size, and of the
+        ZLA and Zipf statistics at each frequency rank, as "vocab_size", "vocab_size_std",
+        "zla", "zla_std", "zipf" and "zipf_std". A single replicate is returned unaveraged,
+        with zero spread.
+    """
+    vocab_sizes = []
+    zla_stats = []
+    frequencies = []
+    for mask in masks:
+        segmentation = compute_segmentation(messages, mask)
+        vocab_sizes.append(segmentation.vocab_size)
+        replicate_zla, replicate_frequencies = segmentation.zla()
+        zla_stats.append(replicate_zla)
+        frequencies.append(replicate_frequencies)
+
+    if len(masks) == 1:
+        # A single replicate is returned as is, keeping its integer counts
+        return {
+            "vocab_size": vocab_sizes[0],
+            "vocab_size_std": 0.0,
+            "zla": zla_stats[0],
+            "zla_std": [0.0] * len(zla_stats[0]),
+            "zipf": frequencies[0],
+            "zipf_std": [0.0] * len(frequencies[0]),
+        }
+
+    # Replicates have different vocabulary sizes, so align them by frequency rank
+    zla_stats = _pad_ranks(zla_stats)
+    frequencies = _pad_ranks(frequencies)
+    return {
+        "vocab_size": np.mean(vocab_sizes),
+        "vocab_size_std": np.std(vocab_sizes),
+        "zla": np.nanmean(zla_stats, axis=0).tolist(),
+        "zla_std": np.nanstd(zla_stats, axis=0).tolist(),
+        "zipf": np.nanmean(frequencies, axis=0).tolist(),
+        "zipf_std": np.nanstd(frequencies, axis=0).tolist(),
+    }
+
+
+def compute_has_stats(
+    messages: np.ndarray,
+    segmentation: Segmentation,
+    random_masks: np.ndarray,
+    observations: Optional[np.ndarray] = None,
+    compute_topsim: bool = False,
+) -> dict:
+    """
+    Compute the HAS statistics of a language, given its segmentation and random boundaries.
+
+    Parameters
+    ----------
+    messages : np.ndarray
+        The input array of messages, of shape (N, L).
+    segmentation : Segmentation
+        The HAS segmentation of the messages.
+    random_masks : np.ndarray
+        Boolean array of shape (R, N, P) with the random boundary mask of each replicate.
+    observations : np.ndarray, optional
+        The observations of the messages, needed for the topographic similarity.
+    compute_topsim : bool, default=False
+        Flag indicating whether to compute topographic similarity.
+
+    Returns
+    -------
+    stats : dict
+        The vocabulary size, ZLA and Zipf statistics and topographic similarity of the
+        segmentation, and of the random segmentations under the "random_" keys.
+        The random statistics are averaged over the replicates, with their standard
+        deviations in the `*_std` keys.
+
+    Raises
+    ------
+    ValueError
+        If observations are None and compute_topsim is True.
+    """
+    if observations is None and compute_topsim:
+        raise ValueError("Observations are needed to calculate topographic similarity.")
+
+    zla, freq = segmentation.zla()
+    random_stats = compute_replicate_stats(messages, random_masks)
+
+    # Pad the segments for topsim computation
+    # We use 0 as it is not used in the has table
+    # and has no effect on the distance measurement
+    if compute_topsim:
+        padded_hashed_segments = segmentation.padded_ids()
+        padded_random_hashed_segments = compute_segmentation(
+            messages, random_masks[0]
+        ).padded_ids()
+
+    return {
+        "vocab_size": segmentation.vocab_size,
+        "zla": zla,
+        "zipf": freq,
+        # We use hamming here, as the segments could contain multiple characters
+        # So editdistance would give us a worse estimate
+        "topographic_similarity": compute_topographic_similarity(
+            padded_hashed_segments,
+            observations,
+            message_dist_metric="hamming",
+        )
+        if compute_topsim
+        else None,
+        "random_vocab_size": random_stats["vocab_size"],
+        "random_vocab_size_std": random_stats["vocab_size_std"],
+        "random_zla": random_stats["zla"],
+        "random_zla_std": random_stats["zla_std"],
+        "random_zipf": random_stats["zipf"],
+        "random_zipf_std": random_stats["zipf_std"],
+        "random_topographic_similarity": compute_topographic_similarity(
+            padded_random_hashed_segments,
+            observations,
+            message_dist_metric="hamming",
+        )
+        if compute_topsim
+        else None,
+    }
+
+
+def _pad_ranks(rows: List[list]) -> np.ndarray:
+    """Stack lists of different lengths into a float array, padded with nan."""
+    padded = np.full((len(rows), max(map(len, rows), default=0)), np.nan)
+    for row, values in zip(padded, rows):
+        row[: len(values)] = values
+    return padded
+
+
+def compute_threshold_sweep(
+    messages: np.ndarray,
+    branching_entropy: dict,
+    thresholds,
+    scores: Optional[np.ndarray] = None,
+) -> List[dict]:
+    """
+    Compute the HAS segmentation of a language for several thresholds at once.
+
+    The branching entropy increases of all windows only depend on the messages, so with a
+    `BranchingEntropy` they are computed once, and each threshold is a single comparison.
+
+    Parameters
+    ----------
+    messages : numpy.ndarray
+        A numpy array containing the input messages.
+    branching_entropy : dict or BranchingEntropy
+        The branching entropy for each context in the messages.
+    thresholds : array_like
+        The threshold values used for determining the boundaries.
+    scores : np.ndarray, optional
+        Pre-computed result of `compute_boundary_scores` for the branching entropy and
+        the same messages.
+
+    Returns
+    -------
+    results : List[dict]
+        For each threshold, in the given order, a dictionary containing the threshold,
+        the boundary mask, the `Segmentation` of the messages, the vocabulary size,
+        the mean number of boundaries per message, and the ZLA and Zipf statistics.
+
+    Raises
+    ------
+    ValueError
+        If the scores do not have one row of L + 2 positions per message.
+    """
+    if scores is None and isinstance(branching_entropy, BranchingEntropy):
+        scores = compute_boundary_scores(branching_entropy, messages)
+    if scores is not None and np.shape(scores) != (
+        len(messages),
+        np.shape(messages)[1] + 2,
+    ):
+        raise ValueError("The boundary scores must have one row per message!")
+
+    results = []
+    for threshold in np.atleast_1d(thresholds).tolist():
+        if scores is not None:
+            mask = scores > threshold
+        else:
+            mask = compute_boundaries(
+                messages, branching_entropy, threshold, return_mask=True
+            )
+        segmentation = compute_segmentation(messages, mask)
+        zla_stats, frequencies = segmentation.zla()
+        results.append(
+            {
+                "threshold": threshold,
+                "boundaries": mask,
+                "mean_boundaries": mask.sum(axis=1).mean(),
+                "segmentation": segmentation,
+                "vocab_size": segmentation.vocab_size,
+                "zla": zla_stats,
+                "zipf": frequencies,
+            }
+        )
+    return results
@@ -3,15 +3,169 @@ The M_previous^n metric.
 
 Adapted from https://arxiv.org/abs/2310.06555
 """
+from typing import List
 
 import numpy as np
 
+from emlangkit.utils.encoding import as_encoding
+from emlangkit.utils.kernels import count_repeats, prev_use_percentage
+
+
+class MPNStats:
+    """
+    The per-message statistics of the M_previous^n metric, stored as arrays.
+
+    Row `u` of every array belongs to the unique message `messages[u]`, and the columns
+    of the matrices are indexed by horizon, with column 0 always 0.
+
+    Parameters
+    ----------
+    messages : np.ndarray or RowEncoding
+        Array of shape (U, ...) with the unique messages, in sorted order.
+    counts : np.ndarray
+        Array of shape (U,) with the number of times each message was sent.
+    same_as_previous_obj : np.ndarray
+        Integer array of shape (U, prev_horizon + 1), with the number of times each message
+        was sent for an observation that was last seen that many steps before.
+    prev_use_percentage : np.ndarray
+        Float array of shape (U, prev_horizon + 1), with the percentage of uses of each
+        message that refer to the observation that many steps before.
+    """
+
+    def __init__(
+        self,
+        messages: np.ndarray,
+        counts: np.ndarray,
+        same_as_previous_obj: np.ndarray,
+        prev_use_percentage: np.ndarray,
+    ):
+        self.messages = messages
+        self.counts = counts
+        self.same_as_previous_obj = same_as_previous_obj
+        self.prev_use_percentage = prev_use_percentage
+
+    @classmethod
+    def from_counts(
+        cls, messages: np.ndarray, counts: np.ndarray, same_as_previous_obj: np.ndarray
+    ) -> "MPNStats":
+        """Create the statistics from the message counts, computing the percentages."""
+        return cls(
+            messages,
+            counts,
+            same_as_previous_obj,
+            prev_use_percentage(same_as_previous_obj, counts),
+        )
+
+    @classmethod
+    def merge(cls, stats: List["MPNStats"]) -> "MPNStats":
+        """
+        Merge the statistics of several runs, e.g. several checkpoints or shards of a dataset.
+
+        The counts of messages that appear in several runs are added, and their
+        percentages are computed again from the summed counts.
+
+        Parameters
+        ----------
+        stats : List[MPNStats]
+            The statistics to merge. They must share the same horizon and message shape.
+
+        Returns
+        -------
+        merged : MPNStats
+            The statistics of all unique messages of all runs.
+        """
+        if len({s.same_as_previous_obj.shape[1] for s in stats}) > 1:
+            raise ValueError("Only statistics with the same horizon can be merged!")
+        messages, inverse = np.unique(
+            np.concatenate([s.messages for s in stats]), return_inverse=True, axis=0
+        )
+        inverse = inverse.reshape(-1)
+        counts = np.bincount(
+            inverse,
+            weights=np.concatenate([s.counts for s in stats]),
+            minlength=len(messages),
+        ).astype(np.int64)
+        same = np.zeros(
+            (len(messages), stats[0].same_as_previous_obj.shape[1]), dtype=np.int32
+        )
+        np.add.at(
+            same, inverse, np.concatenate([s.same_as_previous_obj for s in stats])
+        )
+        return cls.from_counts(messages, counts, same)
+
+    @property
+    def prev_horizon(self) -> int:
+        """The largest horizon of the statistics."""
+        return self.same_as_previous_obj.shape[1] - 1
+
+    def mpn(self) -> np.ndarray:
+        """Return the highest M_previous^n value for each horizon, indexed by horizon."""
+        return self.prev_use_percentage.max(axis=0, initial=0)
+
+    def filter(self, mask) -> "MPNStats":
+        """
+        Select a subset of the messages.
+
+        Parameters
+        ----------
+        mask : array_like
+            Boolean mask of shape (U,), or integer indices of the messages to keep,
+            e.g. `stats.counts >= 10`.
+
+        Returns
+        -------
+        stats : MPNStats
+            The statistics of the selected messages.
+        """
+        return MPNStats(
+            self.messages[mask],
+            self.counts[mask],
+            self.same_as_previous_obj[mask],
+            self.prev_use_percentage[mask],
+        )
+
+    def top_k(self, k: int, horizon: int) -> "MPNStats":
+        """
+        Select the messages used most often for the observation at a given horizon.
+
+        Parameters
+        ----------
+        k : int
+            Number of messages to keep.
+        horizon : int
+            The horizon to rank the messages by.
+
+        Returns
+        -------
+        stats : MPNStats
+            The statistics of the `k` messages with the highest percentage at the horizon,
+            in decreasing order. Ties are broken by the highest count.
+        """
+        order = np.lexsort((-self.counts, -self.prev_use_percentage[:, horizon]))
+        return self.filter(order[:k])
+
+    def to_dict(self) -> dict:
+        """Convert the statistics into the dictionary keyed by message returned by `compute_mpn`."""
+        return {
+            f"{msg}": {
+                "count": self.counts[idx],
+                "same_as_previous_obj": self.same_as_previous_obj[idx],
+                "prev_use_percentage": self.prev_use_percentage[idx],
+            }
+            for idx, msg in enumerate(self.messages)
+        }
+
+    def __len__(self) -> int:
+        """Return the number of unique messages."""
+        return len(self.counts)
+
 
 def compute_mpn(
     messages: np.ndarray,
     observations: np.ndarray,
     prev_horizon: int,
     return_stats: bool = False,
+    stats_format: str = "dict",
 ):
     """
     Calculate the M_previous^n metric.
@@ -23,77 +177,41 @@ def compute_mpn(
 
     Parameters
     ----------
-    messages : np.ndarray
+    messages : np.ndarray or RowEncoding
         The temporally ordered messages.
-    observations : np.ndarray
+    observations : np.ndarray or RowEncoding
         The temporally ordered observations.
     prev_horizon : int
         The horizon up to which to calculate the metric.
+    return_stats : bool, default=False
+        If True, also return the stats for each unique message.
+    stats_format : str, default="dict"
+        Either "dict", for a dictionary keyed by message, or "array", for an `MPNStats`.
 
     Returns
     -------
         mpn : np.ndarray
-            The highest M_previous^n value for each horizon.
-        msg_stats : dict
+            The highest M_previous^n value for each horizon, indexed by horizon.
+            Element 0 is always 0.
+        msg_stats : dict or MPNStats
             The stats for each unique message. Only returned if `return_stats` is True.
     """
-    msgs, inverse, msg_counts = np.unique(
-        messages, return_counts=True, return_inverse=True, axis=0
-    )
+    if stats_format not in ("dict", "array"):
+        raise ValueError(f"Unknown stats format {stats_format}!")
 
-    msg_stats = {
-        f"{msg}": {
-            "count": msg_counts[idx],
-            "same_as_previous_obj": np.zeros(shape=prev_horizon + 1, dtype=np.int32),
-            "prev_use_percentage": np.zeros(shape=prev_horizon + 1, dtype=np.float32),
-        }
-        for idx, msg in enumerate(msgs)
-    }
-
-    # Times that the object was the same as the previous object
-    # first we go from first to last observation
-    for i in range(len(observations)):
-        # Then starting at a given observation we look to the future to see if it repeats
-        for horizon in range(1, prev_horizon + 1):
-            # We cannot look beyond the end of the array
-            if horizon + i >= len(observations):
-                break
-            # If it repeats, then we count it as a possible temporal reference for a given message
-            if np.array_equal(observations[i], observations[horizon + i]):
-                # We get the message index from the inverse of the messages
-                # This looks complicated, but it's not too bad
-                msg_stats[f"{msgs[inverse[horizon + i]]}"]["same_as_previous_obj"][
-                    horizon
-                ] += 1
-                # Break, otherwise if there are multiple repeats in a horizon
-                # They could get labelled twice, and incorrectly
-                break
-
-    mpn = np.zeros(shape=prev_horizon, dtype=np.float32)
-
-    for msg in msg_stats:
-        if msg_stats[f"{msg}"]["count"] > 0:
-            for horizon in range(1, prev_horizon + 1):
-                if msg_stats[f"{msg}"]["same_as_previous_obj"][horizon] != 0:
-                    msg_stats[f"{msg}"]["prev_use_percentage"][horizon] = (
-                        round(
-                            msg_stats[f"{msg}"]["same_as_previous_obj"][horizon]
-                            / msg_stats[f"{msg}"]["count"],
-                            3,
-                        )
-                        * 100
-                    )
-                    if (
-                        msg_stats[f"{msg}"]["prev_use_percentage"][horizon]
-                        > mpn[horizon]
-                    ):
-                        mpn[horizon] = msg_stats[f"{msg}"]["prev_use_percentage"][
-                            horizon
-                        ]
-                else:
-                    msg_stats[f"{msg}"]["prev_use_percentage"][horizon] = 0
+    messages = as_encoding(messages)
+    observations = as_encoding(observations)
+
+    stats = MPNStats.from_counts(
+        messages.unique,
+        messages.counts,
+        count_repeats(
+            observations.codes, messages.codes, len(messages.counts), prev_horizon
+        ),
+    )
+    mpn = stats.mpn()
 
     if return_stats:
-        return mpn, msg_stats
+        return mpn, (stats if stats_format == "array" else stats.to_dict())
     else:
         return mpn
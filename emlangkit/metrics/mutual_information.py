@@ -6,8 +6,9 @@ Adapted from https://proceedings.neurips.cc/paper/2021/hash/c2839bed26321da8b466
 from typing import Optional, Tuple
 
 import numpy as np
+from scipy.stats import entropy
 
-from emlangkit.metrics.entropy import compute_entropy
+from emlangkit.utils.encoding import as_encoding, encode_rows
 
 
 def compute_mutual_information(
@@ -20,9 +21,9 @@ def compute_mutual_information(
 
     Parameters
     ----------
-    messages : np.ndarray
+    messages : np.ndarray or RowEncoding
         Messages to calculate the mutual information for.
-    observations : np.ndarray
+    observations : np.ndarray or RowEncoding
         Observations to calculate the mutual information for.
     entropies : Tuple[np.ndarray, np.ndarray], optional
         Pre-calculated entropies for messages and observations.
@@ -32,16 +33,19 @@ def compute_mutual_information(
     mi : np.ndarray
         Mutual information score.
     """
+    messages = as_encoding(messages)
+    observations = as_encoding(observations)
+    message_codes, message_counts = messages.codes, messages.counts
+    observation_codes, observation_counts = observations.codes, observations.counts
     if not entropies:
-        message_entropy = compute_entropy(messages)
-        observations_entropy = compute_entropy(observations)
+        message_entropy = entropy(message_counts, base=2)
+        observations_entropy = entropy(observation_counts, base=2)
     else:
         message_entropy = entropies[0]
         observations_entropy = entropies[1]
-    messages_and_observations = np.concatenate(
-        (np.array(observations), np.array(messages)), axis=1
-    )
-    messages_and_observations_joint_entropy = compute_entropy(messages_and_observations)
+    # The joint entropy only needs the pair of codes of every row
+    _, joint_counts = encode_rows(np.stack((observation_codes, message_codes), axis=1))
+    messages_and_observations_joint_entropy = entropy(joint_counts, base=2)
     return (
         observations_entropy + message_entropy - messages_and_observations_joint_entropy
     )
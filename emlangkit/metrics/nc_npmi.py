@@ -1,10 +1,288 @@
 """Function for calculating the non-compositional NPMI."""
 from collections import defaultdict
+from typing import Tuple
 
 import numpy as np
+from scipy import sparse
 
+from emlangkit.utils.encoding import as_encoding
 
-def compute_nc_npmi(messages: np.ndarray, observations: np.ndarray) -> dict:
+
+class NPMIMatrix:
+    """
+    The NPMI of all message and observation pairs that occur together, stored sparsely.
+
+    The rows of the matrix are the unique messages and the columns the unique observations,
+    both in sorted order. Only pairs that occur at least once are stored, in CSR order.
+
+    Parameters
+    ----------
+    messages : np.ndarray
+        Array of shape (U_m, ...) with the unique messages.
+    observations : np.ndarray
+        Array of shape (U_o, ...) with the unique observations.
+    message_counts : np.ndarray
+        Array of shape (U_m,) with the number of occurrences of each message.
+    observation_counts : np.ndarray
+        Array of shape (U_o,) with the number of occurrences of each observation.
+    joint_counts : scipy.sparse.csr_matrix
+        Matrix of shape (U_m, U_o) with the number of co-occurrences of each pair.
+    npmi : np.ndarray
+        The NPMI of each stored pair, aligned with `joint_counts.data`.
+    """
+
+    def __init__(
+        self,
+        messages: np.ndarray,
+        observations: np.ndarray,
+        message_counts: np.ndarray,
+        observation_counts: np.ndarray,
+        joint_counts: sparse.csr_matrix,
+        npmi: np.ndarray,
+    ):
+        self.messages = messages
+        self.observations = observations
+        self.message_counts = message_counts
+        self.observation_counts = observation_counts
+        self.joint_counts = joint_counts
+        self.npmi = npmi
+        # Column-major order of the stored pairs, only built when querying by observation
+        self.__by_observation = None
+
+    @classmethod
+    def from_counts(
+        cls,
+        msgs: np.ndarray,
+        obs: np.ndarray,
+        msg_counts: np.ndarray,
+        obs_counts: np.ndarray,
+        rows: np.ndarray,
+        columns: np.ndarray,
+        joint_occurrences: np.ndarray,
+    ) -> "NPMIMatrix":
+        """
+        Create the matrix from the counts of the pairs that occur, computing their NPMI.
+
+        Parameters
+        ----------
+        msgs : np.ndarray
+            Array of shape (U_m, ...) with the unique messages.
+        obs : np.ndarray
+            Array of shape (U_o, ...) with the unique observations.
+        msg_counts : np.ndarray
+            Array of shape (U_m,) with the number of occurrences of each message.
+        obs_counts : np.ndarray
+            Array of shape (U_o,) with the number of occurrences of each observation.
+        rows : np.ndarray
+            The message index of each pair, sorted.
+        columns : np.ndarray
+            The observation index of each pair, sorted within each row.
+        joint_occurrences : np.ndarray
+            The number of co-occurrences of each pair.
+
+        Returns
+        -------
+        npmi_matrix : NPMIMatrix
+            The NPMI matrix of the pairs.
+        """
+        total_messages = msg_counts.sum()
+        total_observations = obs_counts.sum()
+
+        msg_prob = msg_counts[rows] / total_messages
+        prob_obs = obs_counts[columns] / total_observations
+        joint_prob = joint_occurrences / total_observations
+        joint_self_inf = -np.log2(joint_prob)
+        # A pair that makes up all samples has no self-information, giving nan like before
+        with np.errstate(divide="ignore", invalid="ignore"):
+            npmi = np.log2(joint_prob / (msg_prob * prob_obs)) / joint_self_inf
+
+        return cls(
+            messages=msgs,
+            observations=obs,
+            message_counts=msg_counts,
+            observation_counts=obs_counts,
+            joint_counts=sparse.csr_matrix(
+                (
+                    joint_occurrences,
+                    columns,
+                    np.searchsorted(rows, np.arange(len(msgs) + 1)),
+                ),
+                shape=(len(msgs), len(obs)),
+            ),
+            npmi=npmi,
+        )
+
+    @property
+    def shape(self) -> tuple:
+        """The number of unique messages and unique observations."""
+        return self.joint_counts.shape
+
+    @property
+    def nnz(self) -> int:
+        """The number of stored pairs."""
+        return len(self.npmi)
+
+    @property
+    def nbytes(self) -> int:
+        """Memory used by the arrays of the matrix, in bytes."""
+        return (
+            self.messages.nbytes
+            + self.observations.nbytes
+            + self.message_counts.nbytes
+            + self.observation_counts.nbytes
+            + self.joint_counts.data.nbytes
+            + self.joint_counts.indices.nbytes
+            + self.joint_counts.indptr.nbytes
+            + self.npmi.nbytes
+        )
+
+    def to_sparse(self) -> sparse.csr_matrix:
+        """
+        Return the NPMI values as a sparse matrix.
+
+        Pairs that never occur together are not stored, and an NPMI of exactly 0 is
+        kept as an explicit entry, so the structure is the same as `joint_counts`.
+        """
+        return sparse.csr_matrix(
+            (self.npmi, self.joint_counts.indices, self.joint_counts.indptr),
+            shape=self.shape,
+        )
+
+    def message_index(self, message) -> int:
+        """Return the row of a message, raising a KeyError if it does not occur."""
+        return self.__find(self.messages, message)
+
+    def observation_index(self, observation) -> int:
+        """Return the column of an observation, raising a KeyError if it does not occur."""
+        return self.__find(self.observations, observation)
+
+    @staticmethod
+    def __find(rows: np.ndarray, row) -> int:
+        """Find the index of a row among the unique rows."""
+        row = np.asarray(row, dtype=rows.dtype)
+        matches = np.flatnonzero(
+            np.all(rows.reshape(len(rows), -1) == row.reshape(-1), axis=1)
+        )
+        if len(matches) == 0:
+            raise KeyError(f"{row}")
+        return int(matches[0])
+
+    def top_observations(self, message, k: int = 5) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Find the observations with the highest NPMI with a message.
+
+        Parameters
+        ----------
+        message : array_like
+            The message to query.
+        k : int, default=5
+            Number of observations to return.
+
+        Returns
+        -------
+        observations : np.ndarray
+            Up to `k` observations that occur with the message, by decreasing NPMI.
+        npmi : np.ndarray
+            Their NPMI with the message.
+        """
+        row = self.message_index(message)
+        start, stop = self.joint_counts.indptr[row : row + 2]
+        top = self.__top_k(self.npmi[start:stop], k)
+        return self.observations[self.joint_counts.indices[start:stop][top]], (
+            self.npmi[start:stop][top]
+        )
+
+    def top_messages(self, observation, k: int = 5) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Find the messages with the highest NPMI with an observation.
+
+        Parameters
+        ----------
+        observation : array_like
+            The observation to query.
+        k : int, default=5
+            Number of messages to return.
+
+        Returns
+        -------
+        messages : np.ndarray
+            Up to `k` messages that occur with the observation, by decreasing NPMI.
+        npmi : np.ndarray
+            Their NPMI with the observation.
+        """
+        if self.__by_observation is None:
+            rows = np.repeat(
+                np.arange(self.shape[0]), np.diff(self.joint_counts.indptr)
+            )
+            order = np.lexsort((rows, self.joint_counts.indices))
+            indptr = np.searchsorted(
+                self.joint_counts.indices[order], np.arange(self.shape[1] + 1)
+            )
+            self.__by_observation = (indptr, rows[order], self.npmi[order])
+
+        indptr, rows, npmi = self.__by_observation
+        column = self.observation_index(observation)
+        start, stop = indptr[column : column + 2]
+        top = self.__top_k(npmi[start:stop], k)
+        return self.messages[rows[start:stop][top]], npmi[start:stop][top]
+
+    @staticmethod
+    def __top_k(values: np.ndarray, k: int) -> np.ndarray:
+        """Return the indices of the `k` largest values, in decreasing order, with nan last."""
+        if k < len(values):
+            candidates = np.argpartition(-values, k)[:k]
+        else:
+            candidates = np.arange(len(values))
+        return candidates[np.argsort(-values[candidates], kind="stable")]
+
+    def pairs_above(
+        self, threshold: float
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Find all message and observation pairs with an NPMI above a threshold.
+
+        Parameters
+        ----------
+        threshold : float
+            The NPMI threshold.
+
+        Returns
+        -------
+        messages : np.ndarray
+            The message of each pair, by decreasing NPMI.
+        observations : np.ndarray
+            The observation of each pair.
+        npmi : np.ndarray
+            The NPMI of each pair.
+        """
+        selected = np.flatnonzero(self.npmi > threshold)
+        selected = selected[np.argsort(-self.npmi[selected], kind="stable")]
+        rows = np.searchsorted(self.joint_counts.indptr, selected, side="right") - 1
+        return (
+            self.messages[rows],
+            self.observations[self.joint_counts.indices[selected]],
+            self.npmi[selected],
+        )
+
+    def to_dict(self) -> dict:
+        """
+        Convert the matrix into the dictionary returned by `compute_nc_npmi`.
+
+        Pairs that never occur together get an NPMI of nan, like the dictionary
+        computed for all pairs. This needs memory for all U_m x U_o pairs.
+        """
+        dense = np.full(self.shape, np.nan)
+        dense[self.joint_counts.nonzero()] = self.npmi
+        obs_keys = [f"{observation}" for observation in self.observations]
+        non_compositional_npmi_dict = defaultdict(dict)
+        for msg, row in zip(self.messages, dense):
+            non_compositional_npmi_dict[f"{msg}"] = dict(zip(obs_keys, row))
+        return non_compositional_npmi_dict
+
+
+def compute_nc_npmi(
+    messages: np.ndarray, observations: np.ndarray, return_sparse: bool = False
+):
     """
     Calculate the non-compositional NPMI.
 
@@ -13,49 +291,44 @@ def compute_nc_npmi(messages: np.ndarray, observations: np.ndarray) -> dict:
 
     Parameters
     ----------
-    messages: np.ndarray
+    messages: np.ndarray or RowEncoding
         The array of messages.
-    observations: np.ndarray
+    observations: np.ndarray or RowEncoding
         The array of observations.
+    return_sparse: bool, default=False
+        If True, return an `NPMIMatrix` holding only the pairs that occur together,
+        instead of a dictionary of all pairs.
 
     Returns
     -------
-    non_compositional_npmi_dict: dict
+    non_compositional_npmi_dict: dict or NPMIMatrix
         Dictionary of non-compositional messages, observations, and their respective NPMI values.
         The format is non_compositional_npmi_dict[msg][obs] = npmi_value.
+        Pairs that never occur together have an NPMI of nan.
 
     """
-    msgs, _, msg_counts = np.unique(
-        messages, return_counts=True, return_inverse=True, axis=0
+    messages = as_encoding(messages)
+    observations = as_encoding(observations)
+    msgs, msg_codes, msg_counts = messages.unique, messages.codes, messages.counts
+    obs, obs_codes, obs_counts = (
+        observations.unique,
+        observations.codes,
+        observations.counts,
     )
-    msg_counts_dict = {f"{msg}": msg_counts[idx] for idx, msg in enumerate(msgs)}
 
-    obs, _, obs_counts = np.unique(
-        observations, return_counts=True, return_inverse=True, axis=0
+    # Count the co-occurrences of the observed pairs only, sorted by message then observation
+    pairs, joint_occurrences = np.unique(
+        msg_codes.astype(np.int64) * len(obs) + obs_codes, return_counts=True
     )
-    obs_counts_dict = {
-        f"{observation}": obs_counts[idx] for idx, observation in enumerate(obs)
-    }
-
-    joint_occurences_msg_obs = defaultdict(lambda: defaultdict(int))
-
-    for msg, obs in zip(messages, observations):
-        joint_occurences_msg_obs[f"{msg}"][f"{obs}"] += 1
-
-    total_messages = messages.shape[0]
-    total_observations = observations.shape[0]
-
-    non_compositional_npmi_dict = defaultdict(dict)
-
-    for msg in msg_counts_dict:
-        msg_occurrences = msg_counts_dict[msg]
-        msg_prob = msg_occurrences / total_messages
-        for obs in obs_counts_dict:
-            prob_obs = obs_counts_dict[obs] / total_observations
-            joint_occurrences = joint_occurences_msg_obs[msg][obs]
-            joint_prob = joint_occurrences / total_observations
-            joint_self_inf = -np.log2(joint_prob)
-            npmi = np.log2(joint_prob / (msg_prob * prob_obs)) / joint_self_inf
-            non_compositional_npmi_dict[msg][obs] = npmi
-
-    return non_compositional_npmi_dict
+    npmi_matrix = NPMIMatrix.from_counts(
+        msgs,
+        obs,
+        msg_counts,
+        obs_counts,
+        pairs // len(obs),
+        pairs % len(obs),
+        joint_occurrences,
+    )
+    if return_sparse:
+        return npmi_matrix
+    return npmi_matrix.to_dict()
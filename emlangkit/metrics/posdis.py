@@ -6,8 +6,8 @@ Adapted from https://proceedings.neurips.cc/paper/2021/hash/c2839bed26321da8b466
 
 import numpy as np
 
-from emlangkit.metrics.entropy import compute_entropy
-from emlangkit.metrics.mutual_information import compute_mutual_information
+from emlangkit.utils.encoding import as_encoding
+from emlangkit.utils.kernels import disentanglement
 
 
 def compute_posdis(messages: np.ndarray, observations: np.ndarray) -> float:
@@ -16,9 +16,9 @@ def compute_posdis(messages: np.ndarray, observations: np.ndarray) -> float:
 
     Parameters
     ----------
-    messages : np.ndarray
+    messages : np.ndarray or RowEncoding
         Messages to calculate positional disentanglement for.
-    observations : np.ndarray
+    observations : np.ndarray or RowEncoding
         Observations to calculate positional disentanglement for.
 
     Returns
@@ -26,28 +26,11 @@ def compute_posdis(messages: np.ndarray, observations: np.ndarray) -> float:
     posdis : float
         Positional disentanglement score.
     """
-    disentanglement_scores = []
-    non_constant_positions = 0
-
-    for j in range(len(messages[0])):
-        symbols_j = [message[j] for message in messages]
-        symbol_mutual_info = []
-        symbol_entropy = compute_entropy(np.array(symbols_j))
-        for i in range(len(observations[0])):
-            concepts_i = [observation[i] for observation in observations]
-            mutual_info = compute_mutual_information(
-                np.array([concepts_i]).T, np.array([symbols_j]).T
-            )
-            symbol_mutual_info.append(mutual_info)
-        symbol_mutual_info.sort(reverse=True)
-
-        if symbol_entropy > 0:
-            disentanglement_score = (
-                symbol_mutual_info[0] - symbol_mutual_info[1]
-            ) / symbol_entropy
-            disentanglement_scores.append(disentanglement_score)
-            non_constant_positions += 1
-    if non_constant_positions > 0:
-        return sum(disentanglement_scores) / non_constant_positions
-    else:
-        return float("nan")
+    messages = as_encoding(messages)
+    observations = as_encoding(observations)
+    return disentanglement(
+        messages.column_codes,
+        messages.column_cardinalities,
+        observations.column_codes,
+        observations.column_cardinalities,
+    )
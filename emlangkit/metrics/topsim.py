@@ -1,10 +1,21 @@
 """Calculate topographic similarity for a given language."""
+import warnings
 from typing import Tuple
 
-import editdistance
 import numpy as np
 from scipy.spatial import distance
-from scipy.stats import spearmanr
+from scipy.stats import ConstantInputWarning, rankdata, spearmanr
+from scipy.stats import t as student_t
+
+from emlangkit.utils.encoding import RowEncoding
+from emlangkit.utils.pairwise import (
+    condensed_pair_indices,
+    editdistance_block,
+    map_row_blocks,
+    paired_distances,
+    pdist_block,
+    pdist_editdistance,
+)
 
 
 def compute_topographic_similarity(
@@ -12,6 +23,10 @@ def compute_topographic_similarity(
     observations: np.ndarray,
     observations_dist_metric: str = "hamming",
     message_dist_metric: str = "editdistance",
+    block_size: int = 2**14,
+    deduplicate: bool = False,
+    streaming: bool = False,
+    n_jobs: int = 1,
 ) -> Tuple[float, float]:
     """
     Calculate the topographic similarity between the given messages and observations.
@@ -26,27 +41,436 @@ def compute_topographic_similarity(
         Metric to use to calculate the distances between observations.
     message_dist_metric: Literal["editdistance", "cosine", "hamming", "jaccard", "euclidean"]
         Metric to use to calculate the distances between messages.
+    block_size : int, default=2**14
+        Maximum number of message pairs for which the edit distance is computed at once.
+    deduplicate : bool, default=False
+        If True, distances are only computed between unique messages and unique observations,
+        and each distinct (message, observation) pair is weighted by its multiplicity.
+        The result is the same as without deduplication, but much faster for languages
+        with few unique messages.
+    streaming : bool, default=False
+        If True, the distances are computed one block of rows at a time and only a histogram
+        of the distinct distance pairs is kept, from which the rank correlation is computed.
+        The memory use then no longer grows with the number of pairs.
+        Only supported for the discrete "hamming" and "editdistance" metrics.
+    n_jobs : int, default=1
+        Number of threads the pairwise distances are computed with, one block of rows
+        at a time. -1 uses all available cores. The result does not depend on `n_jobs`.
 
     Returns
     -------
     topsim_value : np.ndarray
         Topographic similarity score.
     """
-    if message_dist_metric == "editdistance":
+    if deduplicate:
+        return _deduplicated_topographic_similarity(
+            np.asarray(messages),
+            np.asarray(observations),
+            observations_dist_metric,
+            message_dist_metric,
+            block_size,
+            n_jobs,
+        )
+    if streaming:
+        return _streaming_topographic_similarity(
+            np.asarray(messages),
+            np.asarray(observations),
+            observations_dist_metric,
+            message_dist_metric,
+            block_size,
+            n_jobs,
+        )
 
-        def msg_metric(x, y):
-            return editdistance.eval(x, y) / ((len(x) + len(y)) / 2)
+    observations_dist = _pdist(
+        observations, observations_dist_metric, block_size, n_jobs
+    )
+    messages_dist = _pdist(messages, message_dist_metric, block_size, n_jobs)
+    # noinspection PyTypeChecker
+    topsim, pvalue = spearmanr(observations_dist, messages_dist, nan_policy="raise")
+    return topsim, pvalue
 
-    else:
-        msg_metric = message_dist_metric
 
-    # noinspection PyTypeChecker
-    observations_dist = distance.pdist(observations, observations_dist_metric)
-    # Even though they are ints treat as text
-    messages_dist = distance.pdist(
-        messages,
-        msg_metric,
+def _pdist(x: np.ndarray, metric: str, block_size: int, n_jobs: int) -> np.ndarray:
+    """Compute the condensed pairwise distances, with edit distance support."""
+    if metric == "editdistance":
+        # Even though they are ints treat as text
+        return pdist_editdistance(np.asarray(x), block_size=block_size, n_jobs=n_jobs)
+    if n_jobs == 1:
+        # noinspection PyTypeChecker
+        return distance.pdist(x, metric)
+
+    x = np.asarray(x)
+    distances = np.empty(len(x) * (len(x) - 1) // 2, dtype=np.float64)
+    offset = 0
+    for block in map_row_blocks(
+        lambda start, stop: pdist_block(x, start, stop, metric),
+        len(x),
+        block_size,
+        n_jobs,
+    ):
+        distances[offset : offset + len(block)] = block
+        offset += len(block)
+    return distances
+
+
+def _deduplicated_topographic_similarity(
+    messages: np.ndarray,
+    observations: np.ndarray,
+    observations_dist_metric: str,
+    message_dist_metric: str,
+    block_size: int,
+    n_jobs: int,
+) -> Tuple[float, float]:
+    """Calculate the topographic similarity over unique messages and observations."""
+    messages = RowEncoding(messages)
+    observations = RowEncoding(observations)
+    unique_msgs, msg_inverse = messages.unique, messages.codes
+    unique_obs, obs_inverse = observations.unique, observations.codes
+
+    # Distinct (message, observation) combinations and how often each occurs
+    combinations, counts = np.unique(
+        msg_inverse * len(unique_obs) + obs_inverse, return_counts=True
+    )
+    combo_msgs = combinations // len(unique_obs)
+    combo_obs = combinations % len(unique_obs)
+
+    msgs_dist = _pdist(unique_msgs, message_dist_metric, block_size, n_jobs)
+    obs_dist = _pdist(unique_obs, observations_dist_metric, block_size, n_jobs)
+
+    # Pairs of distinct combinations occur count_k * count_l times
+    first, second = np.triu_indices(len(combinations), k=1)
+    weights = counts[first] * counts[second]
+    messages_dist = _lookup_condensed(
+        msgs_dist, len(unique_msgs), combo_msgs[first], combo_msgs[second]
+    )
+    observations_dist = _lookup_condensed(
+        obs_dist, len(unique_obs), combo_obs[first], combo_obs[second]
+    )
+
+    # Pairs within a combination are at distance zero in both spaces
+    within = counts * (counts - 1) // 2
+    within = within[within > 0]
+    weights = np.concatenate((weights, within))
+    messages_dist = np.concatenate((messages_dist, np.zeros(len(within))))
+    observations_dist = np.concatenate((observations_dist, np.zeros(len(within))))
+
+    return _weighted_spearman(observations_dist, messages_dist, weights)
+
+
+def _streaming_topographic_similarity(
+    messages: np.ndarray,
+    observations: np.ndarray,
+    observations_dist_metric: str,
+    message_dist_metric: str,
+    block_size: int,
+    n_jobs: int,
+) -> Tuple[float, float]:
+    """Calculate the topographic similarity from a histogram of the pairwise distances."""
+    for metric in (observations_dist_metric, message_dist_metric):
+        if metric not in ("hamming", "editdistance"):
+            raise ValueError(
+                f"Streaming topographic similarity requires a discrete metric, got {metric}!"
+            )
+
+    observations = _prepare_discrete(observations, observations_dist_metric)
+    messages = _prepare_discrete(messages, message_dist_metric)
+    msg_levels = messages.shape[1] + 1
+    n_cells = (observations.shape[1] + 1) * msg_levels
+
+    def block_histogram(start: int, stop: int) -> np.ndarray:
+        obs_dist = _discrete_block(observations, observations_dist_metric, start, stop)
+        msg_dist = _discrete_block(messages, message_dist_metric, start, stop)
+        return np.bincount(obs_dist * msg_levels + msg_dist, minlength=n_cells)
+
+    histogram = np.zeros(n_cells, dtype=np.int64)
+    for block in map_row_blocks(block_histogram, len(messages), block_size, n_jobs):
+        histogram += block
+
+    # The levels are ordered like the distances, so they can be ranked instead
+    cells = np.flatnonzero(histogram)
+    return _weighted_spearman(
+        cells // msg_levels, cells % msg_levels, histogram[cells].astype(np.float64)
+    )
+
+
+def _prepare_discrete(x: np.ndarray, metric: str) -> np.ndarray:
+    """Convert the input to the representation used by `_discrete_block`."""
+    if metric == "editdistance":
+        return RowEncoding(x).symbol_codes
+    return x
+
+
+def _discrete_block(x: np.ndarray, metric: str, start: int, stop: int) -> np.ndarray:
+    """Compute a block of distances as integer levels, from 0 to the vector length."""
+    if metric == "editdistance":
+        return editdistance_block(x, start, stop).astype(np.int64)
+    return np.rint(pdist_block(x, start, stop, metric) * x.shape[1]).astype(np.int64)
+
+
+def _lookup_condensed(
+    condensed: np.ndarray, n: int, i: np.ndarray, j: np.ndarray
+) -> np.ndarray:
+    """Look up the distances between elements i and j in a condensed distance vector."""
+    low = np.minimum(i, j)
+    high = np.maximum(i, j)
+    # Identical elements are not part of the condensed vector, and at distance zero
+    distinct = low != high
+    low, high = low[distinct], high[distinct]
+    distances = np.zeros(len(distinct))
+    distances[distinct] = condensed[n * low - low * (low + 1) // 2 + high - low - 1]
+    return distances
+
+
+def _weighted_ranks(x: np.ndarray, weights: np.ndarray) -> np.ndarray:
+    """Rank values that occur with the given multiplicities, assigning ties their mean rank."""
+    values, inverse = np.unique(x, return_inverse=True)
+    totals = np.bincount(inverse.reshape(-1), weights=weights, minlength=len(values))
+    below = np.cumsum(totals) - totals
+    return (below + (totals + 1) / 2)[inverse.reshape(-1)]
+
+
+def _weighted_spearman(
+    x: np.ndarray, y: np.ndarray, weights: np.ndarray
+) -> Tuple[float, float]:
+    """
+    Calculate the Spearman correlation of values that occur with the given multiplicities.
+
+    The result is the same as `scipy.stats.spearmanr` applied to the expanded vectors,
+    in which each value pair is repeated as many times as its weight.
+    """
+    if np.isnan(x).any() or np.isnan(y).any():
+        raise ValueError("The input contains nan values")
+
+    weights = np.asarray(weights, dtype=np.float64)
+    if len(np.unique(x)) == 1 or len(np.unique(y)) == 1:
+        warnings.warn(
+            ConstantInputWarning(
+                "An input array is constant; the correlation coefficient is not defined."
+            ),
+            stacklevel=3,
+        )
+        return np.nan, np.nan
+
+    n = weights.sum()
+    x_ranks = _weighted_ranks(x, weights)
+    y_ranks = _weighted_ranks(y, weights)
+    x_ranks -= np.sum(weights * x_ranks) / n
+    y_ranks -= np.sum(weights * y_ranks) / n
+    rs = np.sum(weights * x_ranks * y_ranks) / np.sqrt(
+        np.sum(weights * x_ranks**2) * np.sum(weights * y_ranks**2)
+    )
+    rs = np.clip(rs, -1.0, 1.0)
+
+    # Same significance test as scipy.stats.spearmanr
+    dof = n - 2
+    with np.errstate(divide="ignore"):
+        t = rs * np.sqrt(np.clip(dof / ((rs + 1.0) * (1.0 - rs)), 0, None))
+    pvalue = 2 * student_t.sf(np.abs(t), dof)
+    return rs, pvalue
+
+
+def compute_topographic_similarity_sampled(
+    messages: np.ndarray,
+    observations: np.ndarray,
+    n_pairs: int,
+    rng: np.random.Generator,
+    observations_dist_metric: str = "hamming",
+    message_dist_metric: str = "editdistance",
+    n_bootstrap: int = 1000,
+    confidence: float = 0.95,
+) -> Tuple[float, Tuple[float, float]]:
+    """
+    Estimate the topographic similarity from a random sample of message pairs.
+
+    Instead of all N(N-1)/2 pairs, only `n_pairs` pairs drawn uniformly at random are used,
+    so that both the memory use and the run time are bounded by `n_pairs`.
+    The confidence interval is obtained by bootstrapping the sampled pairs.
+
+    Parameters
+    ----------
+    messages : np.ndarray
+        Messages to calculate the topographic similarity for.
+    observations : np.ndarray
+        Observations to calculate the topographic similarity for.
+    n_pairs : int
+        Number of pairs to sample.
+    rng : np.random.Generator
+        The random number generator used to sample pairs and bootstrap replicates.
+    observations_dist_metric: Literal["editdistance", "cosine", "hamming", "jaccard", "euclidean"]
+        Metric to use to calculate the distances between observations.
+    message_dist_metric: Literal["editdistance", "cosine", "hamming", "jaccard", "euclidean"]
+        Metric to use to calculate the distances between messages.
+    n_bootstrap : int, default=1000
+        Number of bootstrap replicates used for the confidence interval.
+    confidence : float, default=0.95
+        Confidence level of the interval.
+
+    Returns
+    -------
+    topsim_value : float
+        Estimated topographic similarity score.
+    confidence_interval : Tuple[float, float]
+        Lower and upper bound of the percentile bootstrap confidence interval.
+    """
+    n = len(messages)
+    if n < 2:
+        raise ValueError("At least two messages are needed to sample pairs!")
+
+    # Uniformly sample pairs of distinct messages
+    first = rng.integers(0, n, size=n_pairs)
+    second = rng.integers(0, n - 1, size=n_pairs)
+    second += second >= first
+
+    observations = np.asarray(observations)
+    messages = np.asarray(messages)
+    observations_dist = paired_distances(
+        observations[first], observations[second], observations_dist_metric
+    )
+    messages_dist = paired_distances(
+        messages[first], messages[second], message_dist_metric
     )
     # noinspection PyTypeChecker
-    topsim, pvalue = spearmanr(observations_dist, messages_dist, nan_policy="raise")
+    topsim, _ = spearmanr(observations_dist, messages_dist, nan_policy="raise")
+
+    # Bootstrap in chunks, so that at most ~4M resampled distances are held at once
+    replicates = np.empty(n_bootstrap, dtype=np.float64)
+    chunk = max(1, 2**22 // n_pairs)
+    for start in range(0, n_bootstrap, chunk):
+        stop = min(start + chunk, n_bootstrap)
+        idx = rng.integers(0, n_pairs, size=(stop - start, n_pairs))
+        obs_ranks = rankdata(observations_dist[idx], axis=1)
+        msg_ranks = rankdata(messages_dist[idx], axis=1)
+        obs_ranks -= obs_ranks.mean(axis=1, keepdims=True)
+        msg_ranks -= msg_ranks.mean(axis=1, keepdims=True)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            replicates[start:stop] = np.sum(obs_ranks * msg_ranks, axis=1) / np.sqrt(
+                np.sum(obs_ranks**2, axis=1) * np.sum(msg_ranks**2, axis=1)
+            )
+
+    alpha = (1 - confidence) / 2
+    if np.all(np.isnan(replicates)):
+        return topsim, (np.nan, np.nan)
+    low, high = np.nanpercentile(replicates, [100 * alpha, 100 * (1 - alpha)])
+    return topsim, (low, high)
+
+
+def compute_topographic_similarity_batch(
+    messages: np.ndarray,
+    observations: np.ndarray,
+    observations_dist_metric: str = "hamming",
+    message_dist_metric: str = "editdistance",
+    block_size: int = 2**22,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Calculate the topographic similarity of a batch of languages of the same size.
+
+    The distances of all pairs of all languages are computed together, and the Spearman
+    correlations of all languages are computed at once on the ranked distances.
+
+    Parameters
+    ----------
+    messages : np.ndarray
+        Array of shape (B, N, L) with the messages of each language.
+    observations : np.ndarray
+        Array of shape (B, N, ...) with the observations of each language.
+    observations_dist_metric: Literal["editdistance", "cosine", "hamming", "jaccard", "euclidean"]
+        Metric to use to calculate the distances between observations.
+    message_dist_metric: Literal["editdistance", "cosine", "hamming", "jaccard", "euclidean"]
+        Metric to use to calculate the distances between messages.
+    block_size : int, default=2**22
+        Maximum number of pairs processed at once, over all languages. Bounds the memory use.
+        Languages with more pairs than this are processed one at a time, in blocks of rows.
+
+    Returns
+    -------
+    topsim_value : np.ndarray
+        Array of shape (B,) with the topographic similarity score of each language.
+        Languages with fewer than two messages get nan.
+    pvalue : np.ndarray
+        Array of shape (B,) with the p-value of each score.
+    """
+    messages = np.asarray(messages)
+    observations = np.asarray(observations)
+    n_batches, n = messages.shape[:2]
+    messages = messages.reshape(n_batches, n, -1)
+    observations = observations.reshape(n_batches, n, -1)
+    topsim = np.full(n_batches, np.nan)
+    pvalue = np.full(n_batches, np.nan)
+    n_pairs = n * (n - 1) // 2
+    if n_pairs == 0:
+        # There are no pairs to correlate
+        return topsim, pvalue
+    if n_pairs > block_size:
+        # The pairs of a single language do not fit in a block, so compute the distances
+        # of each language one block of rows at a time
+        for batch in range(n_batches):
+            observations_dist = _pdist(
+                observations[batch], observations_dist_metric, block_size, 1
+            )
+            messages_dist = _pdist(messages[batch], message_dist_metric, block_size, 1)
+            (topsim[batch],), (pvalue[batch],) = _batched_spearman(
+                observations_dist[np.newaxis], messages_dist[np.newaxis]
+            )
+        return topsim, pvalue
+
+    first, second = condensed_pair_indices(n, 0, n - 1)
+    chunk = max(1, block_size // n_pairs)
+    for start in range(0, n_batches, chunk):
+        stop = min(start + chunk, n_batches)
+        observations_dist = _batched_paired_distances(
+            observations[start:stop], first, second, observations_dist_metric
+        )
+        messages_dist = _batched_paired_distances(
+            messages[start:stop], first, second, message_dist_metric
+        )
+        topsim[start:stop], pvalue[start:stop] = _batched_spearman(
+            observations_dist, messages_dist
+        )
     return topsim, pvalue
+
+
+def _batched_paired_distances(
+    x: np.ndarray, first: np.ndarray, second: np.ndarray, metric: str
+) -> np.ndarray:
+    """Compute the distances of the given pairs in every language of a batch, as (B, P)."""
+    n_batches, _, width = x.shape
+    return paired_distances(
+        x[:, first].reshape(-1, width), x[:, second].reshape(-1, width), metric
+    ).reshape(n_batches, len(first))
+
+
+def _batched_spearman(x: np.ndarray, y: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Calculate the Spearman correlation of every row of `x` with the same row of `y`.
+
+    Computes the same coefficients and p-values as `scipy.stats.spearmanr` on each row.
+    Rows with a constant input get nan.
+    """
+    if np.isnan(x).any() or np.isnan(y).any():
+        raise ValueError("The input contains nan values")
+
+    x_ranks = rankdata(x, axis=1)
+    y_ranks = rankdata(y, axis=1)
+    x_ranks -= x_ranks.mean(axis=1, keepdims=True)
+    y_ranks -= y_ranks.mean(axis=1, keepdims=True)
+    constant = (np.ptp(x, axis=1) == 0) | (np.ptp(y, axis=1) == 0)
+    if constant.any():
+        warnings.warn(
+            ConstantInputWarning(
+                "An input array is constant; the correlation coefficient is not defined."
+            ),
+            stacklevel=3,
+        )
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rs = np.sum(x_ranks * y_ranks, axis=1) / np.sqrt(
+            np.sum(x_ranks**2, axis=1) * np.sum(y_ranks**2, axis=1)
+        )
+    rs = np.where(constant, np.nan, np.clip(rs, -1.0, 1.0))
+
+    # Same significance test as scipy.stats.spearmanr
+    dof = x.shape[1] - 2
+    with np.errstate(divide="ignore", invalid="ignore"):
+        t = rs * np.sqrt(np.clip(dof / ((rs + 1.0) * (1.0 - rs)), 0, None))
+    pvalue = 2 * student_t.sf(np.abs(t), dof)
+    return rs, pvalue
@@ -35,7 +35,7 @@ def zla(words: np.ndarray) -> Tuple[list, list]:
     freq_to_lens = defaultdict(list)
     for word, freq in Counter(itertools.chain.from_iterable(words)).most_common():
         frequencies.append(freq)
-        freq_to_lens[freq].append(len(words))
+        freq_to_lens[freq].append(len(word))
     zla_stats = [np.mean(freq_to_lens[freq]) for freq in frequencies]
 
     return zla_stats, frequencies
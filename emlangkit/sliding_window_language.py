@@ -0,0 +1,108 @@
+"""Language over a sliding window of the latest messages of a stream."""
+from typing import Optional
+
+import numpy as np
+
+from emlangkit.streaming_language import StreamingLanguage
+
+
+class SlidingWindowLanguage(StreamingLanguage):
+    """
+    An emergent language made of the last `window_size` messages of a stream, e.g. to detect drift.
+
+    Every incoming message is added to the count tables of the messages, observations and their
+    pairs, and the message that leaves the window is retired from them. Each table keeps a
+    running sum of `c * log2(c)` over its counts, which changes by two terms per message, so the
+    entropy and mutual information of the window are known after every step without counting
+    the window again.
+
+    Parameters
+    ----------
+    window_size : int
+        The number of latest messages in the window.
+
+    Examples
+    --------
+    Monitor the mutual information over the last 1000 messages:
+    >>> lang = SlidingWindowLanguage(window_size=1000)
+    >>> for messages, observations in batches:
+    ...     steps = lang.update(messages, observations)
+    ...     print(steps["mutual_information"])
+    """
+
+    def __init__(self, window_size: int):
+        if window_size < 1:
+            raise ValueError("The window must hold at least one message!")
+        super().__init__()
+        self.window_size = window_size
+
+        # Ring buffer of the message, observation and pair IDs in the window, -1 if empty
+        self.__window = np.full((window_size, 3), -1, dtype=np.int64)
+        self.__head = 0
+        self.__size = 0
+
+    def __len__(self) -> int:
+        """Return the number of messages in the window."""
+        return self.__size
+
+    def update(
+        self, messages: np.ndarray, observations: Optional[np.ndarray] = None
+    ) -> dict:
+        """
+        Slide the window over a batch of messages, one message per step.
+
+        Parameters
+        ----------
+        messages : numpy.ndarray
+            Numpy array of shape (n, ...) containing the incoming messages, in order.
+        observations : numpy.ndarray, optional
+            Numpy array of shape (n, ...) containing the observations of the incoming messages.
+            Required if, and only if, the first batch had observations.
+
+        Returns
+        -------
+        dict
+            Arrays of shape (n,) with the metrics of the window after each step, under the keys
+            "language_entropy" and, with observations, "observation_entropy" and "mutual_information".
+
+        Raises
+        ------
+        ValueError
+            If the batch is empty, or its shapes do not match the previous batches.
+        """
+        self._check_batch(messages, observations)
+
+        n = len(messages)
+        added = np.full((n, 3), -1, dtype=np.int64)
+        added[:, 0] = self._message_counts.identify(messages)
+        if observations is not None:
+            added[:, 1] = self._observation_counts.identify(observations)
+            added[:, 2] = self._joint_counts.identify(added[:, :2])
+
+        # The message retired at each step was added window_size steps before,
+        # either before this batch, and still in the ring buffer, or earlier in the batch
+        steps = np.arange(n)
+        positions = (self.__head + steps) % self.window_size
+        retired = np.where(
+            (steps < self.window_size)[:, None],
+            self.__window[positions],
+            added[np.maximum(steps - self.window_size, 0)],
+        )
+        kept = min(n, self.window_size)
+        self.__window[positions[n - kept :]] = added[n - kept :]
+        self.__head = (self.__head + n) % self.window_size
+        self.__size = min(self.__size + n, self.window_size)
+
+        metrics = {
+            "language_entropy": self._message_counts.slide(added[:, 0], retired[:, 0])
+        }
+        if observations is not None:
+            metrics["observation_entropy"] = self._observation_counts.slide(
+                added[:, 1], retired[:, 1]
+            )
+            metrics["mutual_information"] = (
+                metrics["language_entropy"]
+                + metrics["observation_entropy"]
+                - self._joint_counts.slide(added[:, 2], retired[:, 2])
+            )
+        return metrics
@@ -0,0 +1,136 @@
+"""Base class of the languages that are updated with batches of messages."""
+from typing import Optional
+
+import numpy as np
+
+from emlangkit.metrics.nc_npmi import NPMIMatrix
+from emlangkit.utils.running_counts import RunningCounts, npmi_counts
+
+
+class StreamingLanguage:
+    """
+    An emergent language updated with batches of messages, queried from running count tables.
+
+    Keeps the counts of the unique messages, observations and their pairs, from which the
+    entropies, the mutual information and the NPMI are computed at any time. Subclasses
+    decide which messages are counted, e.g. all of them or only the latest ones, and check
+    every batch with `_check_batch` before counting it.
+    """
+
+    def __init__(self):
+        self._message_shape = None
+        self._observation_shape = None
+        self._message_counts = RunningCounts()
+        self._observation_counts = RunningCounts()
+        self._joint_counts = RunningCounts()
+
+    def _check_batch(self, messages: np.ndarray, observations: Optional[np.ndarray]):
+        """Raise a ValueError if a batch is empty, or does not match the previous batches."""
+        name = type(self).__name__
+        if not isinstance(messages, np.ndarray):
+            raise ValueError(f"{name} only accepts numpy arrays!")
+        if np.size(messages) == 0:
+            raise ValueError("Empty messages passed!")
+        if self._message_shape is None:
+            self._message_shape = messages.shape[1:]
+            if observations is not None:
+                self._observation_shape = np.shape(observations)[1:]
+        if messages.shape[1:] != self._message_shape:
+            raise ValueError("Messages must have the same shape in every batch!")
+        if (observations is None) != (self._observation_shape is None):
+            raise ValueError("Observations must be passed with every batch, or never!")
+        if observations is not None:
+            if not isinstance(observations, np.ndarray):
+                raise ValueError(f"{name} only accepts numpy arrays!")
+            if observations.shape != (len(messages),) + self._observation_shape:
+                raise ValueError(
+                    "Observations must have the same shape in every batch, and one row per message!"
+                )
+
+    def _require_observations(self, metric: str):
+        """Raise a ValueError if no observations were added."""
+        if self._observation_shape is None:
+            raise ValueError(f"Observations are needed to calculate {metric}.")
+
+    def _require_messages(self):
+        """Raise a ValueError if no messages were added."""
+        if self._message_shape is None:
+            raise ValueError("No messages added yet!")
+
+    def language_entropy(self) -> float:
+        """
+        Calculate the entropy of the counted messages.
+
+        Returns
+        -------
+            float: The entropy of the messages.
+        """
+        self._require_messages()
+        return self._message_counts.entropy()
+
+    def observation_entropy(self) -> float:
+        """
+        Calculate the entropy of the counted observations.
+
+        Returns
+        -------
+            float: The entropy of the observations.
+
+        Raises
+        ------
+            ValueError: If observations are not set.
+        """
+        self._require_observations("observation entropy")
+        return self._observation_counts.entropy()
+
+    def mutual_information(self) -> float:
+        """
+        Calculate the mutual information between the counted messages and observations.
+
+        Returns
+        -------
+            float: The mutual information.
+
+        Raises
+        ------
+            ValueError: If observations are not set.
+        """
+        self._require_observations("mutual information")
+        return (
+            self._observation_counts.entropy()
+            + self._message_counts.entropy()
+            - self._joint_counts.entropy()
+        )
+
+    def nc_npmi_matrix(self) -> NPMIMatrix:
+        """
+        Calculate the non-compositional NPMI of the counted messages, from the count tables.
+
+        Returns
+        -------
+            NPMIMatrix: The NPMI of all message and observation pairs that occur together.
+
+        Raises
+        ------
+            ValueError: If observations are not set.
+        """
+        self._require_observations("non-compositional NPMI")
+        return NPMIMatrix.from_counts(
+            *npmi_counts(
+                self._message_counts, self._observation_counts, self._joint_counts
+            )
+        )
+
+    def nc_npmi(self) -> dict:
+        """
+        Calculate the non-compositional NPMI of the counted messages, as a dictionary.
+
+        Returns
+        -------
+            dict: The NPMI of all message and observation pairs, as returned by `compute_nc_npmi`.
+
+        Raises
+        ------
+            ValueError: If observations are not set.
+        """
+        return self.nc_npmi_matrix().to_dict()
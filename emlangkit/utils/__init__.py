@@ -1,4 +1,58 @@
 """Root __init__ of the utils."""
-from emlangkit.utils.array_ops import pad_jagged
+from emlangkit.utils.array_ops import load_array, pad_jagged, row_chunks
+from emlangkit.utils.encoding import (
+    RowEncoding,
+    as_encoding,
+    encode_columns,
+    encode_rows,
+)
+from emlangkit.utils.kernels import (
+    bag_of_words,
+    batched_disentanglement,
+    count_repeats,
+    disentanglement,
+    disentanglement_from_entropies,
+    prev_use_percentage,
+)
+from emlangkit.utils.ngram_index import NGramIndex
+from emlangkit.utils.pairwise import (
+    condensed_pair_indices,
+    condensed_row_blocks,
+    editdistance_block,
+    map_row_blocks,
+    paired_distances,
+    paired_editdistance,
+    pdist_block,
+    pdist_editdistance,
+)
+from emlangkit.utils.running_counts import RunningCounts, npmi_counts
+from emlangkit.utils.segmentation import Segmentation, merge_vocabularies
 
-__all__ = ["pad_jagged"]
+__all__ = [
+    "pad_jagged",
+    "load_array",
+    "row_chunks",
+    "encode_rows",
+    "encode_columns",
+    "RowEncoding",
+    "as_encoding",
+    "bag_of_words",
+    "batched_disentanglement",
+    "count_repeats",
+    "disentanglement",
+    "disentanglement_from_entropies",
+    "prev_use_percentage",
+    "NGramIndex",
+    "condensed_row_blocks",
+    "condensed_pair_indices",
+    "editdistance_block",
+    "map_row_blocks",
+    "pdist_block",
+    "paired_distances",
+    "paired_editdistance",
+    "pdist_editdistance",
+    "RunningCounts",
+    "npmi_counts",
+    "Segmentation",
+    "merge_vocabularies",
+]
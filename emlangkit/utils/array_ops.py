@@ -1,8 +1,14 @@
 """Utilities for array operations."""
 # Adapted from https://stackoverflow.com/questions/37676539/numpy-padding-matrix-of-different-row-size
 
+import os
+from typing import Iterator, Tuple, Union
+
 import numpy as np
 
+# Number of elements processed at once when an array is read in chunks
+CHUNK_SIZE = 2**22
+
 
 def pad_jagged(array: np.ndarray, fill: int = 0) -> np.ndarray:
     """
@@ -26,3 +32,59 @@ def pad_jagged(array: np.ndarray, fill: int = 0) -> np.ndarray:
     for enu, row in enumerate(array):
         padded[enu, : len(row)] += row
     return padded
+
+
+def load_array(array: Union[np.ndarray, str, os.PathLike]) -> np.ndarray:
+    """
+    Open an array saved with `np.save` as a read-only memory map, or return a given array as it is.
+
+    A memory-mapped array is only read from disk when, and where, it is accessed,
+    so arrays larger than the available memory can be used.
+
+    Parameters
+    ----------
+    array : np.ndarray, str or os.PathLike
+        An array, or the path of a `.npy` file.
+
+    Returns
+    -------
+    array : np.ndarray
+        The given array, or a `np.memmap` of the file.
+
+    Raises
+    ------
+    ValueError
+        If the file does not contain a single array.
+    """
+    if not isinstance(array, (str, os.PathLike)):
+        return array
+    loaded = np.load(array, mmap_mode="r")
+    if not isinstance(loaded, np.ndarray):
+        loaded.close()
+        raise ValueError(f"{os.fspath(array)} does not contain a single numpy array!")
+    return loaded
+
+
+def row_chunks(
+    n_rows: int, row_size: int, chunk_size: int = CHUNK_SIZE
+) -> Iterator[Tuple[int, int]]:
+    """
+    Split rows into chunks of bounded size, to process large or memory-mapped arrays piece by piece.
+
+    Parameters
+    ----------
+    n_rows : int
+        Number of rows.
+    row_size : int
+        Number of elements in a row, or created per row.
+    chunk_size : int, optional
+        Maximum number of elements in a chunk. A chunk always contains at least one row.
+
+    Yields
+    ------
+    start, stop : int, int
+        The (half-open) range of rows in the chunk.
+    """
+    step = max(chunk_size // max(row_size, 1), 1)
+    for start in range(0, n_rows, step):
+        yield start, min(start + step, n_rows)
@@ -0,0 +1,221 @@
+"""Utilities for encoding rows of arrays as compact integer codes."""
+from typing import Tuple
+
+import numpy as np
+
+from emlangkit.utils.array_ops import row_chunks
+
+
+def encode_rows(x: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Encode each row of an array as a dense integer code.
+
+    Integer rows are packed into a single int64 key per row, as a mixed-radix number over
+    the value range of each column, and the keys are made dense with a counting pass or
+    `np.unique`. Rows that cannot be packed, e.g. with a too wide range of values or of
+    another dtype, are sorted as a whole with `np.unique` along the first axis.
+    For one-dimensional input, each element is treated as a row.
+
+    Parameters
+    ----------
+    x : np.ndarray
+        Array of shape (N, ...) to encode.
+
+    Returns
+    -------
+    codes : np.ndarray
+        Integer array of shape (N,) with the code of each row, between 0 and U - 1
+        for U unique rows. Codes follow the lexicographic order of the rows, except for
+        object arrays, which are coded in the order of first occurrence.
+    counts : np.ndarray
+        Integer array of shape (U,) with the number of occurrences of each unique row.
+    """
+    x = np.asarray(x)
+    n = len(x)
+    rows = x.reshape(n, int(np.prod(x.shape[1:])))
+
+    if x.dtype == object:
+        # Opaque objects cannot be packed, fall back on hashing them
+        ids = {}
+        codes = np.array(
+            [ids.setdefault(tuple(row), len(ids)) for row in rows], dtype=np.int64
+        )
+        return codes, np.bincount(codes, minlength=len(ids))
+
+    keys = _pack_rows(rows)
+    if keys is None:
+        # Byte views of the rows do not follow their order, compare them column by column
+        _, codes, counts = np.unique(
+            rows, return_inverse=True, return_counts=True, axis=0
+        )
+        return codes.reshape(n), counts
+    if n > 0 and keys.max() < 4 * n:
+        # Small key space, a counting pass is cheaper than sorting
+        counts = np.bincount(keys)
+        present = counts > 0
+        return np.cumsum(present)[keys] - 1, counts[present]
+
+    _, codes, counts = np.unique(keys, return_inverse=True, return_counts=True)
+    return codes.reshape(n), counts
+
+
+def _pack_rows(rows: np.ndarray):
+    """Pack integer rows into int64 keys, or return None if they do not fit."""
+    if not (np.issubdtype(rows.dtype, np.integer) or rows.dtype == bool):
+        return None
+    if rows.size == 0:
+        return np.zeros(len(rows), dtype=np.int64)
+
+    mins = rows.min(axis=0)
+    spans = [int(high) - int(low) + 1 for low, high in zip(mins, rows.max(axis=0))]
+    if np.prod(spans, dtype=object) > np.iinfo(np.int64).max:
+        return None
+
+    # Differences within a column are exact even if casting to int64 wraps around.
+    # Columns are cast one at a time, so narrow or memory-mapped rows are never copied whole.
+    mins = mins.astype(np.int64)
+    keys = np.zeros(len(rows), dtype=np.int64)
+    for column, (low, span) in enumerate(zip(mins, spans)):
+        keys *= span
+        keys += rows[:, column].astype(np.int64)
+        keys -= low
+    return keys
+
+
+def _code_dtype(n_codes: int) -> np.dtype:
+    """Return the smallest of int32 and int64 that holds codes from 0 to `n_codes`."""
+    return np.dtype(np.int32 if n_codes <= np.iinfo(np.int32).max else np.int64)
+
+
+def encode_columns(x: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Encode the values in each column of an array as dense integer codes.
+
+    Parameters
+    ----------
+    x : np.ndarray
+        Array of shape (N, C) to encode.
+
+    Returns
+    -------
+    codes : np.ndarray
+        Integer array of shape (N, C), where the values of column `c` are coded
+        between 0 and `cardinalities[c] - 1`.
+    cardinalities : np.ndarray
+        Integer array of shape (C,) with the number of unique values in each column.
+    """
+    x = np.asarray(x)
+    columns = x.reshape(len(x), -1)
+    codes = np.empty(columns.shape, dtype=_code_dtype(len(columns)))
+    cardinalities = np.empty(columns.shape[1], dtype=np.int64)
+    for column in range(columns.shape[1]):
+        codes[:, column], counts = encode_rows(columns[:, column])
+        cardinalities[column] = len(counts)
+    return codes, cardinalities
+
+
+class RowEncoding:
+    """
+    Integer encodings of an array, computed lazily and shared between metrics.
+
+    Each encoding is computed the first time it is needed, and cached afterwards.
+    Metrics accept an instance in place of the array it encodes, so that computing several
+    metrics for the same messages or observations only encodes them once.
+
+    Parameters
+    ----------
+    x : np.ndarray
+        Array of shape (N, ...) to encode, e.g. messages or observations.
+    """
+
+    def __init__(self, x: np.ndarray):
+        self.x = np.asarray(x)
+        self.__codes = None
+        self.__counts = None
+        self.__unique = None
+        self.__column_codes = None
+        self.__column_cardinalities = None
+        self.__symbols = None
+        self.__symbol_codes = None
+
+    def __len__(self) -> int:
+        """Return the number of rows."""
+        return len(self.x)
+
+    @property
+    def shape(self) -> tuple:
+        """The shape of the encoded array."""
+        return self.x.shape
+
+    @property
+    def codes(self) -> np.ndarray:
+        """The code of each row, as returned by `encode_rows`, i.e. the inverse of `unique`."""
+        if self.__codes is None:
+            self.__codes, self.__counts = encode_rows(self.x)
+        return self.__codes
+
+    @property
+    def counts(self) -> np.ndarray:
+        """The number of occurrences of each unique row."""
+        if self.__counts is None:
+            _ = self.codes
+        return self.__counts
+
+    @property
+    def unique(self) -> np.ndarray:
+        """The unique rows, in the order of their codes."""
+        if self.__unique is None:
+            _, first = np.unique(self.codes, return_index=True)
+            self.__unique = self.x[first]
+        return self.__unique
+
+    @property
+    def column_codes(self) -> np.ndarray:
+        """The codes of the values in each column, as returned by `encode_columns`."""
+        if self.__column_codes is None:
+            self.__column_codes, self.__column_cardinalities = encode_columns(self.x)
+        return self.__column_codes
+
+    @property
+    def column_cardinalities(self) -> np.ndarray:
+        """The number of unique values in each column."""
+        if self.__column_cardinalities is None:
+            _ = self.column_codes
+        return self.__column_cardinalities
+
+    @property
+    def symbols(self) -> np.ndarray:
+        """The sorted unique values of all elements."""
+        if self.__symbols is None:
+            if np.issubdtype(self.x.dtype, np.integer) or self.x.dtype == bool:
+                # Find the symbols chunk by chunk, then look them up, without sorting a copy
+                chunks = list(row_chunks(len(self.x), self.x[:1].size))
+                self.__symbols = np.unique(
+                    np.concatenate(
+                        [self.x[:0].ravel()]
+                        + [np.unique(self.x[start:stop]) for start, stop in chunks]
+                    )
+                )
+                self.__symbol_codes = np.empty(
+                    self.x.shape, dtype=_code_dtype(len(self.__symbols))
+                )
+                for start, stop in chunks:
+                    self.__symbol_codes[start:stop] = np.searchsorted(
+                        self.__symbols, self.x[start:stop]
+                    )
+            else:
+                self.__symbols, symbol_codes = np.unique(self.x, return_inverse=True)
+                self.__symbol_codes = symbol_codes.reshape(self.x.shape)
+        return self.__symbols
+
+    @property
+    def symbol_codes(self) -> np.ndarray:
+        """The index of each element into `symbols`, with the shape of the array."""
+        if self.__symbol_codes is None:
+            _ = self.symbols
+        return self.__symbol_codes
+
+
+def as_encoding(x) -> RowEncoding:
+    """Return `x` if it is already a `RowEncoding`, or a new encoding of the array `x`."""
+    return x if isinstance(x, RowEncoding) else RowEncoding(x)
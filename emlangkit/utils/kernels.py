@@ -0,0 +1,210 @@
+"""Array kernels shared by the metrics and the language containers."""
+import numpy as np
+
+from emlangkit.utils.array_ops import row_chunks
+
+
+def bag_of_words(symbols: np.ndarray, num_symbols: int) -> np.ndarray:
+    """Count how often each symbol of the vocabulary occurs in each message, chunk by chunk."""
+    # A symbol occurs at most once per position, so narrow counts suffice
+    bow = np.empty(
+        (len(symbols), num_symbols), dtype=np.min_scalar_type(symbols.shape[1])
+    )
+    for start, stop in row_chunks(len(symbols), max(symbols.shape[1], num_symbols)):
+        rows = np.arange(stop - start)[:, None] * num_symbols
+        bow[start:stop] = np.bincount(
+            (rows + symbols[start:stop]).ravel(),
+            minlength=(stop - start) * num_symbols,
+        ).reshape(stop - start, num_symbols)
+    return bow
+
+
+def prev_use_percentage(
+    same_as_previous_obj: np.ndarray, counts: np.ndarray
+) -> np.ndarray:
+    """Compute the percentage of uses of each message that refer to a previous observation."""
+    prev_use_percentage = np.zeros(same_as_previous_obj.shape, dtype=np.float32)
+    # Only cells with repeats need rounding, done like the scalar version to match exactly
+    rows, horizons = np.nonzero(same_as_previous_obj)
+    prev_use_percentage[rows, horizons] = [
+        round(same / count, 3) * 100
+        for same, count in zip(
+            same_as_previous_obj[rows, horizons].tolist(), counts[rows].tolist()
+        )
+    ]
+    return prev_use_percentage
+
+
+def count_repeats(
+    observation_codes: np.ndarray,
+    message_codes: np.ndarray,
+    n_messages: int,
+    prev_horizon: int,
+) -> np.ndarray:
+    """
+    Count, for each message and horizon, how often the observation repeated after that horizon.
+
+    Each observation is compared to the observations up to `prev_horizon` steps later,
+    with one shifted comparison per horizon. Only the earliest repeat counts, and is
+    attributed to the message sent at the repeated observation.
+
+    Returns
+    -------
+    same_as_previous_obj : np.ndarray
+        Integer array of shape (n_messages, prev_horizon + 1), indexed by message code and horizon.
+    """
+    n = len(observation_codes)
+    repeats = np.zeros((n, prev_horizon), dtype=bool)
+    for horizon in range(1, min(prev_horizon, n - 1) + 1):
+        repeats[: n - horizon, horizon - 1] = (
+            observation_codes[: n - horizon] == observation_codes[horizon:]
+        )
+
+    # The first True of each row is the earliest repeat
+    starts = np.flatnonzero(repeats.any(axis=1))
+    horizons = repeats[starts].argmax(axis=1) + 1
+    cells = message_codes[starts + horizons] * (prev_horizon + 1) + horizons
+    return (
+        np.bincount(cells, minlength=n_messages * (prev_horizon + 1))
+        .reshape(n_messages, prev_horizon + 1)
+        .astype(np.int32)
+    )
+
+
+def disentanglement(
+    message_codes: np.ndarray,
+    message_cardinalities: np.ndarray,
+    observation_codes: np.ndarray,
+    observation_cardinalities: np.ndarray,
+) -> float:
+    """Compute the disentanglement between the columns of the coded messages and observations."""
+    return float(
+        batched_disentanglement(
+            message_codes[None],
+            message_cardinalities,
+            observation_codes[None],
+            observation_cardinalities,
+        )[0]
+    )
+
+
+def batched_disentanglement(
+    message_codes: np.ndarray,
+    message_cardinalities: np.ndarray,
+    observation_codes: np.ndarray,
+    observation_cardinalities: np.ndarray,
+) -> np.ndarray:
+    """
+    Compute the disentanglement of a batch of languages, given their coded columns.
+
+    The contingency tables of all (language, message column, observation column) triples
+    are laid out next to each other in one flat histogram, filled with `np.bincount` over
+    chunks of samples. All entropies and mutual information values are then computed from it at once.
+    The codes of a column are shared by all languages, so each table has the same size.
+
+    Parameters
+    ----------
+    message_codes : np.ndarray
+        Array of shape (B, N, C) with the message column codes of each language.
+    message_cardinalities : np.ndarray
+        Array of shape (C,) with the number of codes of each message column.
+    observation_codes : np.ndarray
+        Array of shape (B, N, A) with the observation column codes of each language.
+    observation_cardinalities : np.ndarray
+        Array of shape (A,) with the number of codes of each observation column.
+
+    Returns
+    -------
+    disentanglement : np.ndarray
+        Array of shape (B,) with the score of each language, nan if all positions are constant.
+    """
+    n_batches = len(message_codes)
+    # Offset of the contingency table of each (language, position, attribute) triple
+    sizes = np.outer(message_cardinalities, observation_cardinalities)
+    offsets = (np.cumsum(sizes) - sizes.ravel()).reshape(sizes.shape)
+    batch_offsets = np.arange(n_batches)[:, None, None, None] * sizes.sum()
+    joint = np.zeros(n_batches * sizes.sum(), dtype=np.int64)
+    for start, stop in row_chunks(message_codes.shape[1], n_batches * sizes.size):
+        joint += np.bincount(
+            (
+                batch_offsets
+                + offsets[None, None, :, :]
+                + message_codes[:, start:stop, :, None]
+                * observation_cardinalities[None, None, None, :]
+                + observation_codes[:, start:stop, None, :]
+            ).ravel(),
+            minlength=len(joint),
+        )
+    joint_entropy = _grouped_entropy(joint, np.tile(sizes.ravel(), n_batches))
+    joint_entropy = joint_entropy.reshape((n_batches,) + sizes.shape)
+
+    return disentanglement_from_entropies(
+        _column_entropy(message_codes, message_cardinalities),
+        _column_entropy(observation_codes, observation_cardinalities),
+        joint_entropy,
+    )
+
+
+def disentanglement_from_entropies(
+    symbol_entropy: np.ndarray, concept_entropy: np.ndarray, joint_entropy: np.ndarray
+) -> np.ndarray:
+    """
+    Compute the disentanglement of a batch of languages, given the entropies of their columns.
+
+    Parameters
+    ----------
+    symbol_entropy : np.ndarray
+        Array of shape (B, C) with the entropy of each message column.
+    concept_entropy : np.ndarray
+        Array of shape (B, A) with the entropy of each observation column.
+    joint_entropy : np.ndarray
+        Array of shape (B, C, A) with the joint entropy of each pair of columns.
+
+    Returns
+    -------
+    disentanglement : np.ndarray
+        Array of shape (B,) with the score of each language, nan if all positions are constant.
+    """
+    mutual_info = (
+        symbol_entropy[:, :, None] + concept_entropy[:, None, :] - joint_entropy
+    )
+
+    # The gap between the two attributes each position is most informative about
+    symbol_mutual_info = -np.sort(-mutual_info, axis=2)
+    non_constant = symbol_entropy > 0
+    with np.errstate(divide="ignore", invalid="ignore"):
+        disentanglement_scores = np.where(
+            non_constant,
+            (symbol_mutual_info[:, :, 0] - symbol_mutual_info[:, :, 1])
+            / symbol_entropy,
+            0.0,
+        )
+        return disentanglement_scores.sum(axis=1) / np.count_nonzero(
+            non_constant, axis=1
+        )
+
+
+def _column_entropy(codes: np.ndarray, cardinalities: np.ndarray) -> np.ndarray:
+    """Compute the entropy of every column of a coded array of shape (B, N, C)."""
+    n_batches = len(codes)
+    offsets = np.cumsum(cardinalities) - cardinalities
+    batch_offsets = np.arange(n_batches)[:, None, None] * cardinalities.sum()
+    counts = np.zeros(n_batches * cardinalities.sum(), dtype=np.int64)
+    for start, stop in row_chunks(codes.shape[1], n_batches * len(cardinalities)):
+        counts += np.bincount(
+            (codes[:, start:stop] + offsets + batch_offsets).ravel(),
+            minlength=len(counts),
+        )
+    return _grouped_entropy(counts, np.tile(cardinalities, n_batches)).reshape(
+        n_batches, -1
+    )
+
+
+def _grouped_entropy(counts: np.ndarray, sizes: np.ndarray) -> np.ndarray:
+    """Compute the entropy in bits of consecutive groups of counts with the given sizes."""
+    groups = np.repeat(np.arange(len(sizes)), sizes)
+    totals = np.bincount(groups, weights=counts, minlength=len(sizes))
+    p = counts / np.maximum(totals[groups], 1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        plogp = np.where(counts > 0, p * np.log(p), 0.0)
+    return -np.bincount(groups, weights=plogp, minlength=len(sizes)) / np.log(2)
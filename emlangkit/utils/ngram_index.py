@@ -0,0 +1,312 @@
+"""An array-backed index of all subsequences of a set of messages."""
+from collections import Counter
+from collections.abc import Mapping
+from typing import Iterator, Optional, Tuple
+
+import numpy as np
+from scipy import sparse
+
+
+class NGramIndex(Mapping):
+    """
+    A trie of all contiguous subsequences (n-grams) of fixed-length messages.
+
+    Every node of the trie is a subsequence, identified by an integer ID. Node 0 is the
+    empty sequence. The nodes are stored in flat arrays, with IDs assigned by increasing
+    length, then by parent, then by symbol. The children of a node therefore have
+    consecutive IDs, and `parent * len(alphabet) + symbol` is sorted by ID, so that
+    children can be looked up with a binary search.
+
+    The index can be used like the `Counter` returned by `has_init`, mapping subsequence
+    tuples to their frequencies, but does not need to create any tuples to be queried.
+
+    Parameters
+    ----------
+    alphabet : np.ndarray
+        The sorted unique symbols of the messages.
+    parent : np.ndarray
+        The parent node of each node, -1 for the root.
+    symbol : np.ndarray
+        The code of the last symbol of each node, -1 for the root.
+    depth : np.ndarray
+        The length of the subsequence of each node.
+    count : np.ndarray
+        The frequency of the subsequence of each node. The frequency of the root is the
+        total number of symbols in the messages.
+    suffix_nodes : np.ndarray
+        Array of shape (N, L), where `suffix_nodes[n, i]` is the node of the suffix
+        `messages[n, i:]`. The nodes of all windows starting at `i` are its ancestors,
+        so all windows of a message are found from its L suffixes, see `window_nodes`.
+    """
+
+    def __init__(
+        self,
+        alphabet: np.ndarray,
+        parent: np.ndarray,
+        symbol: np.ndarray,
+        depth: np.ndarray,
+        count: np.ndarray,
+        suffix_nodes: np.ndarray,
+    ):
+        self.alphabet = alphabet
+        self.parent = parent
+        self.symbol = symbol
+        self.depth = depth
+        self.count = count
+        self.suffix_nodes = suffix_nodes
+        self.__child_keys = parent[1:].astype(np.int64) * len(alphabet) + symbol[1:]
+
+    @classmethod
+    def from_messages(cls, messages: np.ndarray) -> "NGramIndex":
+        """
+        Build the index of all subsequences of the given messages.
+
+        The trie is built one level at a time: the nodes of length `d` are found for all
+        windows of all messages at once, from the nodes of length `d - 1`.
+
+        Parameters
+        ----------
+        messages : np.ndarray
+            Array of shape (N, L) containing the messages.
+
+        Returns
+        -------
+        index : NGramIndex
+            The index of all subsequences.
+        """
+        messages = np.asarray(messages)
+        if messages.ndim != 2:
+            raise ValueError("The n-gram index requires a 2D array of messages!")
+        n, length = messages.shape
+        alphabet, codes = np.unique(messages, return_inverse=True)
+        codes = codes.reshape(messages.shape).astype(np.int64)
+        n_symbols = len(alphabet)
+
+        # Nodes of the windows of the previous width, for every start
+        nodes = np.zeros((n, length), dtype=np.int64)
+        suffix_nodes = np.empty((n, length), dtype=np.int32)
+        parents = [np.array([-1], dtype=np.int64)]
+        symbols = [np.array([-1], dtype=np.int64)]
+        depths = [np.array([0], dtype=np.int64)]
+        counts = [np.array([n * length], dtype=np.int64)]
+        next_id = 1
+        for width in range(1, length + 1):
+            # Extend every window of the previous width by its next symbol
+            starts = length - width + 1
+            keys = nodes[:, :starts] * n_symbols + codes[:, width - 1 :]
+            level_keys, inverse, level_counts = np.unique(
+                keys, return_inverse=True, return_counts=True
+            )
+            nodes = next_id + inverse.reshape(n, starts)
+            # The last window of this width is the suffix of the message
+            suffix_nodes[:, starts - 1] = nodes[:, starts - 1]
+            parents.append(level_keys // n_symbols)
+            symbols.append(level_keys % n_symbols)
+            depths.append(np.full(len(level_keys), width, dtype=np.int64))
+            counts.append(level_counts)
+            next_id += len(level_keys)
+
+        return cls(
+            alphabet=alphabet,
+            parent=np.concatenate(parents).astype(np.int32),
+            symbol=np.concatenate(symbols).astype(np.int32),
+            depth=np.concatenate(depths).astype(np.int32),
+            count=np.concatenate(counts),
+            suffix_nodes=suffix_nodes,
+        )
+
+    @property
+    def n_nodes(self) -> int:
+        """Number of nodes, i.e. distinct subsequences including the empty one."""
+        return len(self.parent)
+
+    @property
+    def nbytes(self) -> int:
+        """Memory used by the arrays of the index, in bytes."""
+        return (
+            self.alphabet.nbytes
+            + self.parent.nbytes
+            + self.symbol.nbytes
+            + self.depth.nbytes
+            + self.count.nbytes
+            + self.suffix_nodes.nbytes
+            + self.__child_keys.nbytes
+        )
+
+    def window_nodes(self, start: int = 0, stop: Optional[int] = None) -> np.ndarray:
+        """
+        Find the nodes of all windows of a range of messages.
+
+        The windows starting at each position are found by walking up from the node
+        of the suffix at that position, so the table is only built for the messages
+        in the range.
+
+        Parameters
+        ----------
+        start : int, optional
+            The first message of the range. Default is 0.
+        stop : int, optional
+            The end of the range, excluded. Default is the number of messages.
+
+        Returns
+        -------
+        window_nodes : np.ndarray
+            Array of shape (stop - start, L, L + 1), where `window_nodes[n, i, w]` is the
+            node of the subsequence `messages[start + n, i : i + w]`, or -1 if `i + w > L`.
+        """
+        nodes = self.suffix_nodes[start:stop]
+        n, length = nodes.shape
+        window_nodes = np.full((n, length, length + 1), -1, dtype=np.int32)
+        positions = np.arange(length)
+        for steps in range(length + 1):
+            # After `steps` steps up, the window starting at `i` has width L - i - steps
+            starts = positions[: length - steps + 1]
+            window_nodes[:, starts, length - starts - steps] = nodes[:, starts]
+            nodes = self.parent[nodes[:, : length - steps]]
+        return window_nodes
+
+    def find_window_nodes(self, messages: np.ndarray) -> np.ndarray:
+        """
+        Find the nodes of all windows of any messages, e.g. messages that were not indexed.
+
+        The windows of each width are found from the windows one symbol shorter, walking
+        the trie from the root with `child`.
+
+        Parameters
+        ----------
+        messages : np.ndarray
+            Array of shape (N, L) containing the messages.
+
+        Returns
+        -------
+        window_nodes : np.ndarray
+            Array of shape (N, L, L + 1), where `window_nodes[n, i, w]` is the node of the
+            subsequence `messages[n, i : i + w]`, or -1 if `i + w > L` or if the subsequence
+            does not occur in the indexed messages.
+        """
+        messages = np.asarray(messages)
+        n, length = messages.shape
+        codes = np.searchsorted(self.alphabet, messages)
+        known = codes < len(self.alphabet)
+        known[known] = self.alphabet[codes[known]] == messages[known]
+
+        window_nodes = np.full((n, length, length + 1), -1, dtype=np.int32)
+        window_nodes[:, :, 0] = 0
+        for width in range(1, length + 1):
+            starts = length - width + 1
+            window_nodes[:, :starts, width] = np.where(
+                known[:, width - 1 :],
+                self.child(window_nodes[:, :starts, width - 1], codes[:, width - 1 :]),
+                -1,
+            )
+        return window_nodes
+
+    def child(self, nodes, symbols) -> np.ndarray:
+        """
+        Find the children of the given nodes, extended by the given symbol codes.
+
+        Parameters
+        ----------
+        nodes : array_like
+            Node IDs.
+        symbols : array_like
+            Symbol codes, i.e. indices into the alphabet.
+
+        Returns
+        -------
+        children : np.ndarray
+            The node ID of each child, or -1 if it does not occur in the messages.
+        """
+        keys = np.asarray(nodes, dtype=np.int64) * len(self.alphabet) + symbols
+        if len(self.__child_keys) == 0:
+            return np.full(keys.shape, -1)
+        found = np.minimum(
+            np.searchsorted(self.__child_keys, keys), len(self.__child_keys) - 1
+        )
+        return np.where(
+            (self.__child_keys[found] == keys) & (np.asarray(nodes) >= 0), found + 1, -1
+        )
+
+    def children(self, node: int) -> np.ndarray:
+        """Return the IDs of all children of a node."""
+        start, stop = np.searchsorted(self.parent[1:], [node, node + 1]) + 1
+        return np.arange(start, stop)
+
+    def successor_counts(self) -> sparse.csr_matrix:
+        """
+        Build the matrix of successor frequencies of every context.
+
+        Returns
+        -------
+        counts : scipy.sparse.csr_matrix
+            Sparse matrix of shape (n_nodes, len(alphabet)), where `counts[c, a]` is the
+            frequency of context `c` followed by the symbol with code `a`.
+        """
+        # Children are sorted by parent then symbol, so they already form the CSR layout
+        indptr = np.searchsorted(self.parent[1:], np.arange(self.n_nodes + 1))
+        return sparse.csr_matrix(
+            (self.count[1:], self.symbol[1:], indptr),
+            shape=(self.n_nodes, len(self.alphabet)),
+        )
+
+    def lookup(self, sequence) -> int:
+        """
+        Find the node of a subsequence.
+
+        Parameters
+        ----------
+        sequence : array_like
+            The subsequence of symbols.
+
+        Returns
+        -------
+        node : int
+            The node ID, or -1 if the subsequence does not occur in the messages.
+        """
+        node = 0
+        for value in sequence:
+            code = np.searchsorted(self.alphabet, value)
+            if code == len(self.alphabet) or self.alphabet[code] != value:
+                return -1
+            node = int(self.child(node, code))
+            if node < 0:
+                return -1
+        return node
+
+    def sequence(self, node: int) -> tuple:
+        """Return the subsequence of a node as a tuple of symbols."""
+        codes = []
+        while node > 0:
+            codes.append(self.symbol[node])
+            node = self.parent[node]
+        return tuple(self.alphabet[codes[::-1]])
+
+    def sequences(self) -> list:
+        """Return the subsequences of all nodes as tuples of symbols, in node order."""
+        sequences = [()]
+        for node in range(1, self.n_nodes):
+            sequences.append(
+                sequences[self.parent[node]] + (self.alphabet[self.symbol[node]],)
+            )
+        return sequences
+
+    def to_counter(self) -> Counter:
+        """Convert the index into a Counter of subsequence tuples, as built by `has_init`."""
+        return Counter(dict(zip(self.sequences(), self.count.tolist())))
+
+    def __getitem__(self, sequence) -> int:
+        """Return the frequency of a subsequence, 0 if it does not occur, like a Counter."""
+        node = self.lookup(sequence)
+        return 0 if node < 0 else int(self.count[node])
+
+    def __contains__(self, sequence) -> bool:
+        """Check whether a subsequence occurs in the messages."""
+        return self.lookup(sequence) >= 0
+
+    def __iter__(self) -> Iterator[Tuple]:
+        """Iterate over all subsequences, in node order."""
+        return iter(self.sequences())
+
+    def __len__(self) -> int:
+        """Return the number of distinct subsequences, including the empty one."""
+        return self.n_nodes
@@ -0,0 +1,348 @@
+"""Utilities for computing pairwise distances between messages."""
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterator, Tuple, TypeVar
+
+import numpy as np
+from scipy.spatial import distance
+
+# Longest message for which a column of the edit distance table fits in one machine word
+_MAX_BITPARALLEL_LENGTH = 64
+
+T = TypeVar("T")
+
+
+def condensed_row_blocks(n: int, block_size: int) -> Iterator[Tuple[int, int]]:
+    """
+    Split the rows of a condensed distance matrix into blocks of bounded size.
+
+    Row `i` of the condensed matrix holds the pairs `(i, j)` for all `j > i`,
+    in the same order as used by `scipy.spatial.distance.pdist`.
+
+    Parameters
+    ----------
+    n : int
+        Number of observations the condensed matrix is computed over.
+    block_size : int
+        Maximum number of pairs in a block. A block always contains at least one row.
+
+    Yields
+    ------
+    start, stop : int, int
+        The (half-open) range of rows in the block.
+    """
+    if n < 2:
+        return
+    pairs_per_row = np.arange(n - 1, 0, -1, dtype=np.int64)
+    ends = np.cumsum(pairs_per_row)
+    start = 0
+    offset = 0
+    while start < n - 1:
+        stop = int(np.searchsorted(ends, offset + block_size, side="right"))
+        stop = max(stop, start + 1)
+        yield start, stop
+        offset = ends[stop - 1]
+        start = stop
+
+
+def map_row_blocks(
+    func: Callable[[int, int], T], n: int, block_size: int, n_jobs: int = 1
+) -> Iterator[T]:
+    """
+    Apply a function to every row block of a condensed distance matrix.
+
+    With more than one job the blocks are processed by a thread pool. The NumPy and SciPy
+    kernels used for the distances release the GIL, so the blocks are computed in parallel.
+    The results are always returned in block order, so merging them is deterministic.
+
+    Parameters
+    ----------
+    func : Callable[[int, int], T]
+        Function called with the start and stop row of each block.
+    n : int
+        Number of observations the condensed matrix is computed over.
+    block_size : int
+        Maximum number of pairs in a block.
+    n_jobs : int, default=1
+        Number of threads to use. -1 uses all available cores.
+
+    Yields
+    ------
+    result : T
+        The result of `func` for each block, in order.
+    """
+    blocks = condensed_row_blocks(n, block_size)
+    if n_jobs == -1:
+        n_jobs = os.cpu_count() or 1
+    if n_jobs == 1:
+        for start, stop in blocks:
+            yield func(start, stop)
+        return
+    with ThreadPoolExecutor(max_workers=n_jobs) as executor:
+        yield from executor.map(lambda block: func(*block), blocks)
+
+
+def condensed_pair_indices(
+    n: int, start: int, stop: int
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Get the indices of all pairs in the given rows of a condensed distance matrix.
+
+    Parameters
+    ----------
+    n : int
+        Number of observations the condensed matrix is computed over.
+    start : int
+        First row of the block.
+    stop : int
+        Row after the last row of the block.
+
+    Returns
+    -------
+    i, j : np.ndarray, np.ndarray
+        Indices of the first and second element of each pair, in condensed order.
+    """
+    rows = np.arange(start, stop, dtype=np.int64)
+    counts = n - 1 - rows
+    row_starts = np.cumsum(counts) - counts
+    i = np.repeat(rows, counts)
+    j = np.arange(counts.sum(), dtype=np.int64) - np.repeat(row_starts, counts) + i + 1
+    return i, j
+
+
+def _bitparallel_editdistance(peq: np.ndarray, length: int) -> np.ndarray:
+    """
+    Compute edit distances with the bit-vector algorithm of Myers, as formulated by Hyyrö.
+
+    Each column of the dynamic programming table is stored as vertical deltas packed
+    into a single 64-bit word, so one pass over the second message fills the whole table.
+
+    Parameters
+    ----------
+    peq : np.ndarray
+        Array of shape (L2, P) where bit `k` of `peq[t, p]` is set if symbol `k` of
+        the first message in pair `p` equals symbol `t` of the second message.
+    length : int
+        Length of the first message of each pair. At most 64.
+
+    Returns
+    -------
+    distances : np.ndarray
+        Integer array of shape (P,) with the edit distance of each pair.
+    """
+    n_pairs = peq.shape[1]
+    one = np.uint64(1)
+    mask = np.uint64((1 << length) - 1)
+    high = np.uint64(1 << (length - 1))
+    pv = np.full(n_pairs, mask, dtype=np.uint64)
+    mv = np.zeros(n_pairs, dtype=np.uint64)
+    score = np.full(n_pairs, length, dtype=np.int32)
+    for eq in peq:
+        xv = eq | mv
+        xh = (((eq & pv) + pv) ^ pv) | eq
+        ph = mv | ~(xh | pv)
+        mh = pv & xh
+        score += (ph & high) != 0
+        score -= (mh & high) != 0
+        # Shifting in a one accounts for the first row of the table, D[0, t] = t
+        ph = (ph << one) | one
+        mh = mh << one
+        pv = (mh | ~(xv | ph)) & mask
+        mv = ph & xv
+    return score
+
+
+def paired_editdistance(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """
+    Compute the Levenshtein distance between each row of `a` and the matching row of `b`.
+
+    All pairs are processed at once. Messages of up to 64 symbols use the bit-parallel
+    formulation of the dynamic program, longer ones fill the table one row at a time.
+
+    Parameters
+    ----------
+    a : np.ndarray
+        Array of shape (P, L1) with the first message of each pair.
+    b : np.ndarray
+        Array of shape (P, L2) with the second message of each pair.
+
+    Returns
+    -------
+    distances : np.ndarray
+        Integer array of shape (P,) with the edit distance of each pair.
+    """
+    n_pairs, len_a = a.shape
+    len_b = b.shape[1]
+    if len_a == 0 or len_b == 0:
+        return np.full(n_pairs, max(len_a, len_b), dtype=np.int32)
+
+    if len_a <= _MAX_BITPARALLEL_LENGTH:
+        peq = np.zeros((len_b, n_pairs), dtype=np.uint64)
+        for k in range(len_a):
+            peq |= (a[:, k] == b.T).astype(np.uint64) << np.uint64(k)
+        return _bitparallel_editdistance(peq, len_a)
+
+    offsets = np.arange(len_b + 1, dtype=np.int32)
+    prev = np.broadcast_to(offsets, (n_pairs, len_b + 1))
+    for i in range(1, len_a + 1):
+        # Substitution (or match) and deletion
+        cost = np.minimum(prev[:, :-1] + (a[:, i - 1 : i] != b), prev[:, 1:] + 1)
+        # Insertion: cur[j] = min_k (cost[k] + j - k), i.e. a cumulative minimum
+        cur = np.empty((n_pairs, len_b + 1), dtype=np.int32)
+        cur[:, 0] = i
+        cur[:, 1:] = cost - offsets[1:]
+        np.minimum.accumulate(cur, axis=1, out=cur)
+        cur += offsets
+        prev = cur
+    return np.array(prev[:, -1])
+
+
+def editdistance_block(codes: np.ndarray, start: int, stop: int) -> np.ndarray:
+    """
+    Compute the edit distances for the given rows of a condensed distance matrix.
+
+    Parameters
+    ----------
+    codes : np.ndarray
+        Array of shape (N, L) containing the messages as non-negative integer symbol codes,
+        e.g. the inverse returned by `np.unique`.
+    start : int
+        First row of the block.
+    stop : int
+        Row after the last row of the block.
+
+    Returns
+    -------
+    distances : np.ndarray
+        Integer edit distances of all pairs in the block, in condensed order.
+    """
+    n, length = codes.shape
+    i, j = condensed_pair_indices(n, start, stop)
+    if length == 0 or length > _MAX_BITPARALLEL_LENGTH:
+        return paired_editdistance(codes[i], codes[j])
+
+    # For each first message in the block, the positions at which each symbol occurs.
+    # The extra last column is used for all symbols that do not occur in the block.
+    n_symbols = codes[start:stop].max() + 1
+    rows = np.arange(stop - start)
+    symbol_masks = np.zeros((stop - start, n_symbols + 1), dtype=np.uint64)
+    for k in range(length):
+        symbol_masks[rows, codes[start:stop, k]] |= np.uint64(1) << np.uint64(k)
+    peq = symbol_masks[i - start, np.minimum(codes[j], n_symbols).T]
+    return _bitparallel_editdistance(peq, length)
+
+
+def pdist_block(x: np.ndarray, start: int, stop: int, metric: str) -> np.ndarray:
+    """
+    Compute the distances for the given rows of a condensed distance matrix.
+
+    Parameters
+    ----------
+    x : np.ndarray
+        Array of shape (N, L) containing the observations.
+    start : int
+        First row of the block.
+    stop : int
+        Row after the last row of the block.
+    metric : str
+        Any metric supported by `scipy.spatial.distance.cdist`.
+
+    Returns
+    -------
+    distances : np.ndarray
+        Distances of all pairs in the block, in condensed order.
+    """
+    # noinspection PyTypeChecker
+    block = distance.cdist(x[start:stop], x[start + 1 :], metric)
+    # Row i of the block holds the pairs (start + i, start + 1 + c), so keep c >= i
+    return block[np.triu(np.ones(block.shape, dtype=bool))]
+
+
+def pdist_editdistance(
+    x: np.ndarray, block_size: int = 2**14, n_jobs: int = 1
+) -> np.ndarray:
+    """
+    Compute the normalised pairwise edit distances between all rows of `x`.
+
+    The distance between two messages is their edit distance divided by their mean length,
+    which for fixed-length messages is the message length.
+
+    Parameters
+    ----------
+    x : np.ndarray
+        Array of shape (N, L) containing the messages.
+    block_size : int, default=2**14
+        Maximum number of pairs processed at once. Bounds the memory use.
+    n_jobs : int, default=1
+        Number of threads to use. -1 uses all available cores.
+
+    Returns
+    -------
+    distances : np.ndarray
+        Condensed distance vector, in the same order as `scipy.spatial.distance.pdist`.
+    """
+    n, length = x.shape
+    # Symbols are only compared for equality, so work on compact integer codes
+    _, codes = np.unique(x, return_inverse=True)
+    codes = codes.reshape(x.shape)
+
+    distances = np.empty(n * (n - 1) // 2, dtype=np.float64)
+    offset = 0
+    for block in map_row_blocks(
+        lambda start, stop: editdistance_block(codes, start, stop),
+        n,
+        block_size,
+        n_jobs,
+    ):
+        distances[offset : offset + len(block)] = block
+        offset += len(block)
+    return distances / ((length + length) / 2)
+
+
+def paired_distances(a: np.ndarray, b: np.ndarray, metric: str) -> np.ndarray:
+    """
+    Compute the distance between each row of `a` and the matching row of `b`.
+
+    The most commonly used metrics are computed for all pairs at once, any other metric
+    supported by `scipy.spatial.distance.cdist` is evaluated one pair at a time.
+
+    Parameters
+    ----------
+    a : np.ndarray
+        Array of shape (P, L) with the first element of each pair.
+    b : np.ndarray
+        Array of shape (P, L) with the second element of each pair.
+    metric : str
+        Name of the metric. "editdistance" is the edit distance normalised by the mean
+        message length, all other names follow `scipy.spatial.distance`.
+
+    Returns
+    -------
+    distances : np.ndarray
+        Array of shape (P,) with the distance of each pair.
+    """
+    if metric == "editdistance":
+        return paired_editdistance(a, b) / ((a.shape[1] + b.shape[1]) / 2)
+    if metric == "hamming":
+        return np.mean(a != b, axis=1)
+    if metric == "jaccard":
+        # Like scipy, treat the vectors as boolean
+        a = np.asarray(a) != 0
+        b = np.asarray(b) != 0
+        differ = np.sum(a != b, axis=1)
+        total = np.sum(a | b, axis=1)
+        return np.where(total > 0, differ / np.maximum(total, 1), 0.0)
+    a = np.asarray(a, dtype=np.float64)
+    b = np.asarray(b, dtype=np.float64)
+    if metric == "euclidean":
+        return np.sqrt(np.sum((a - b) ** 2, axis=1))
+    if metric == "cityblock":
+        return np.sum(np.abs(a - b), axis=1)
+    if metric == "cosine":
+        norms = np.sqrt(np.sum(a**2, axis=1) * np.sum(b**2, axis=1))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return 1.0 - np.sum(a * b, axis=1) / norms
+
+    return np.array(
+        [distance.cdist(x[None], y[None], metric)[0, 0] for x, y in zip(a, b)]
+    )
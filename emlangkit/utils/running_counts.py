@@ -0,0 +1,212 @@
+"""Running counts of unique rows, updated with batches of rows."""
+from typing import Optional, Tuple
+
+import numpy as np
+
+from emlangkit.utils.encoding import RowEncoding, encode_rows
+
+
+class RunningCounts:
+    """
+    The counts of the unique rows seen so far, with a running sum of `c * log2(c)`.
+
+    Rows are only forgotten by `slide`, which frees the IDs of the rows it counts down to zero,
+    to be reused by new rows. Freed IDs keep a count of zero, so the counts stay indexed by ID.
+    """
+
+    def __init__(self):
+        self.ids = {}
+        self.rows = []
+        self.total = 0
+        self.__counts = np.zeros(0, dtype=np.int64)
+        self.__clogc = 0.0
+        self.__free = []
+
+    def __len__(self) -> int:
+        """Return the number of IDs, including the freed ones."""
+        return len(self.rows)
+
+    @property
+    def counts(self) -> np.ndarray:
+        """The count of each unique row, by ID."""
+        return self.__counts[: len(self.rows)]
+
+    def unique(self, ids: Optional[np.ndarray] = None) -> np.ndarray:
+        """Return the unique rows with the given IDs, or all of them."""
+        if ids is None:
+            return np.stack(self.rows)
+        return np.stack([self.rows[i] for i in ids.tolist()])
+
+    def order(self, ids: Optional[np.ndarray] = None) -> np.ndarray:
+        """Sort the given IDs, or all of them, in the order of their rows used by the batch metrics."""
+        if ids is None:
+            ids = np.arange(len(self.rows))
+        return ids[np.argsort(RowEncoding(self.unique(ids)).codes, kind="stable")]
+
+    def update(self, x: np.ndarray) -> np.ndarray:
+        """Count the rows of an array, returning the ID of each row."""
+        codes, counts = encode_rows(x)
+        return self.add(x[_first_occurrences(codes, len(counts))], counts)[codes]
+
+    def identify(self, x: np.ndarray) -> np.ndarray:
+        """Return the ID of each row of an array, without counting the rows."""
+        codes, counts = encode_rows(x)
+        return self.add(
+            x[_first_occurrences(codes, len(counts))], np.zeros_like(counts)
+        )[codes]
+
+    def add(self, rows: np.ndarray, counts: np.ndarray) -> np.ndarray:
+        """Add the counts of distinct rows, returning their IDs."""
+        keys = rows.reshape(len(rows), -1).tolist()
+        ids = np.empty(len(keys), dtype=np.int64)
+        for i, key in enumerate(map(tuple, keys)):
+            if key not in self.ids:
+                if self.__free:
+                    self.ids[key] = self.__free.pop()
+                    self.rows[self.ids[key]] = rows[i]
+                else:
+                    self.ids[key] = len(self.rows)
+                    self.rows.append(rows[i])
+            ids[i] = self.ids[key]
+        self.__counts = grow(self.__counts, len(self.rows))
+
+        previous = self.__counts[ids]
+        self.__counts[ids] += counts
+        self.__clogc += (xlogx(self.__counts[ids]) - xlogx(previous)).sum()
+        self.total += int(np.sum(counts))
+        return ids
+
+    def slide(self, added: np.ndarray, removed: np.ndarray) -> np.ndarray:
+        """
+        Add one row and remove one row at every step, returning the entropy after each step.
+
+        The count of a row before each of its changes is found with a cumulative sum over the
+        changes of that row, so the running sum of `c * log2(c)` is updated for all steps at once.
+        The IDs of the rows counted down to zero are freed, so the number of IDs stays bounded
+        by the rows counted at once, plus the new rows of a batch.
+
+        Parameters
+        ----------
+        added : np.ndarray
+            The ID of the row added at each step.
+        removed : np.ndarray
+            The ID of the row removed at each step, or -1 if none is.
+
+        Returns
+        -------
+        entropy : np.ndarray
+            The entropy in bits of the counts after each step.
+        """
+        # Changes in time order, the addition of each step before its removal
+        steps = np.repeat(np.arange(len(added)), 2)
+        ids = np.stack((added, removed), axis=1).ravel()
+        deltas = np.tile(np.array([1, -1]), len(added))
+        valid = ids >= 0
+        steps, ids, deltas = steps[valid], ids[valid], deltas[valid]
+
+        # Group the changes by row, keeping the time order within each group
+        order = np.argsort(ids, kind="stable")
+        sorted_ids = ids[order]
+        cumulative = np.cumsum(deltas[order])
+        starts = np.flatnonzero(np.diff(sorted_ids, prepend=-1))
+        group = np.cumsum(np.diff(sorted_ids, prepend=-1) != 0) - 1
+        before_group = (cumulative - deltas[order])[starts][group]
+        after = self.__counts[sorted_ids] + cumulative - before_group
+        changes = np.empty(len(ids), dtype=np.float64)
+        changes[order] = xlogx(after) - xlogx(after - deltas[order])
+
+        clogc = self.__clogc + np.cumsum(
+            np.bincount(steps, weights=changes, minlength=len(added))
+        )
+        totals = self.total + np.cumsum(
+            np.bincount(steps, weights=deltas, minlength=len(added))
+        )
+        np.add.at(self.__counts, ids, deltas)
+        self.__clogc = float(clogc[-1])
+        self.total = int(totals[-1])
+
+        # Forget the rows counted down to zero, and reuse their IDs for new rows
+        changed = sorted_ids[starts]
+        for i in changed[self.__counts[changed] == 0].tolist():
+            del self.ids[tuple(np.reshape(self.rows[i], -1).tolist())]
+            self.__free.append(i)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.maximum(np.log2(totals) - clogc / totals, 0.0)
+
+    def entropy(self) -> float:
+        """Compute the entropy in bits of the counts."""
+        if len(self.ids) <= 1 or self.total == 0:
+            return 0.0
+        return max(np.log2(self.total) - self.__clogc / self.total, 0.0)
+
+
+def npmi_counts(
+    message_counts: RunningCounts,
+    observation_counts: RunningCounts,
+    joint_counts: RunningCounts,
+) -> Tuple[np.ndarray, ...]:
+    """
+    Collect the counts of the rows with a non-zero count, sorted like `compute_nc_npmi`.
+
+    Parameters
+    ----------
+    message_counts : RunningCounts
+        The counts of the messages.
+    observation_counts : RunningCounts
+        The counts of the observations.
+    joint_counts : RunningCounts
+        The counts of the (message ID, observation ID) pairs.
+
+    Returns
+    -------
+    counts : Tuple[np.ndarray, ...]
+        The arguments of `NPMIMatrix.from_counts`: the unique messages and observations,
+        their counts, and the row, column and count of every pair that occurs.
+    """
+    message_order = message_counts.order(np.flatnonzero(message_counts.counts))
+    observation_order = observation_counts.order(
+        np.flatnonzero(observation_counts.counts)
+    )
+    # Rank of each unique row among the counted rows
+    message_rank = np.full(len(message_counts), -1)
+    message_rank[message_order] = np.arange(len(message_order))
+    observation_rank = np.full(len(observation_counts), -1)
+    observation_rank[observation_order] = np.arange(len(observation_order))
+
+    pair_ids = np.flatnonzero(joint_counts.counts)
+    pairs = joint_counts.unique(pair_ids).reshape(len(pair_ids), 2)
+    rows = message_rank[pairs[:, 0]]
+    columns = observation_rank[pairs[:, 1]]
+    order = np.lexsort((columns, rows))
+    return (
+        message_counts.unique(message_order),
+        observation_counts.unique(observation_order),
+        message_counts.counts[message_order],
+        observation_counts.counts[observation_order],
+        rows[order],
+        columns[order],
+        joint_counts.counts[pair_ids][order],
+    )
+
+
+def _first_occurrences(codes: np.ndarray, n_codes: int) -> np.ndarray:
+    """Find the index of the first occurrence of each code."""
+    first = np.empty(n_codes, dtype=np.int64)
+    first[codes[::-1]] = np.arange(len(codes) - 1, -1, -1)
+    return first
+
+
+def grow(array: np.ndarray, size: int) -> np.ndarray:
+    """Grow an array along its first axis to hold at least `size` rows, filled with zeros."""
+    if size <= len(array):
+        return array
+    grown = np.zeros((max(size, 2 * len(array)),) + array.shape[1:], dtype=array.dtype)
+    grown[: len(array)] = array
+    return grown
+
+
+def xlogx(x: np.ndarray) -> np.ndarray:
+    """Compute `x * log2(x)` elementwise, with `0 * log2(0) = 0`."""
+    x = np.asarray(x, dtype=np.float64)
+    return x * np.log2(np.maximum(x, 1))
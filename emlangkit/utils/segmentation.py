@@ -0,0 +1,292 @@
+"""An array-backed representation of segmented messages."""
+from typing import List, Tuple
+
+import numpy as np
+
+from emlangkit.utils.encoding import encode_rows
+
+
+class Segmentation:
+    """
+    The segments of a set of fixed-length messages, stored in compressed sparse row form.
+
+    All symbols of the messages are kept in one flat array. The segments are ranges of that
+    array, and the messages are ranges of segments. Every distinct segment has an integer ID,
+    starting from 1 so that 0 can be used for padding. IDs follow the lexicographic order of
+    the segments, shorter segments first if one is a prefix of the other.
+
+    Parameters
+    ----------
+    symbols : np.ndarray
+        Array of shape (N * L,) with the symbols of all messages, one message after another.
+    segment_offsets : np.ndarray
+        Array of shape (S + 1,), where segment `s` is the range of symbols
+        from `segment_offsets[s]` to `segment_offsets[s + 1]`.
+    message_offsets : np.ndarray
+        Array of shape (N + 1,), where the segments of message `n` are
+        `message_offsets[n]` to `message_offsets[n + 1] - 1`.
+    segment_ids : np.ndarray
+        Array of shape (S,) with the ID of each segment.
+    counts : np.ndarray
+        Array of shape (V,) with the number of occurrences of the segment with ID `i + 1`.
+    """
+
+    def __init__(
+        self,
+        symbols: np.ndarray,
+        segment_offsets: np.ndarray,
+        message_offsets: np.ndarray,
+        segment_ids: np.ndarray,
+        counts: np.ndarray,
+    ):
+        self.symbols = symbols
+        self.segment_offsets = segment_offsets
+        self.message_offsets = message_offsets
+        self.segment_ids = segment_ids
+        self.counts = counts
+
+    @classmethod
+    def from_mask(cls, messages: np.ndarray, mask: np.ndarray) -> "Segmentation":
+        """
+        Split messages at the positions of a boundary mask.
+
+        Each message is split like `messages[n, bot:top]` for consecutive positions of
+        the sorted boundaries and the message length. Boundaries past the end of a message
+        therefore add an empty segment.
+
+        Parameters
+        ----------
+        messages : np.ndarray
+            Array of shape (N, L) containing the messages.
+        mask : np.ndarray
+            Boolean array of shape (N, P), where `mask[n, p]` is True if message `n`
+            has a boundary at position `p`.
+
+        Returns
+        -------
+        segmentation : Segmentation
+            The segments of the messages.
+        """
+        messages = np.asarray(messages)
+        if messages.ndim != 2:
+            raise ValueError("Segmentation requires a 2D array of messages!")
+        n, length = messages.shape
+
+        # The end of the message is always the end of a segment
+        ends_mask = np.zeros((n, max(mask.shape[1], length + 1)), dtype=bool)
+        ends_mask[:, : mask.shape[1]] = mask
+        ends_mask[:, length] = True
+        rows, positions = np.nonzero(ends_mask)
+        # Ends are increasing over all messages, so each segment starts at the previous end
+        ends = rows.astype(np.int64) * length + np.minimum(positions, length)
+        segment_offsets = np.concatenate(([0], ends))
+        message_offsets = np.concatenate(([0], np.cumsum(ends_mask.sum(axis=1))))
+
+        # Pad all segments with a code below all symbols, so the codes of encode_rows
+        # follow the lexicographic order of the segments, whatever their length
+        _, codes = np.unique(messages, return_inverse=True)
+        lengths = np.diff(segment_offsets)
+        segment_of_symbol = np.repeat(np.arange(len(lengths)), lengths)
+        padded = np.full((len(lengths), lengths.max(initial=0)), -1, dtype=np.int64)
+        padded[
+            segment_of_symbol,
+            np.arange(n * length) - segment_offsets[segment_of_symbol],
+        ] = codes.ravel()
+        segment_ids, counts = encode_rows(padded)
+
+        return cls(
+            symbols=messages.ravel(),
+            segment_offsets=segment_offsets,
+            message_offsets=message_offsets,
+            segment_ids=(segment_ids + 1).astype(np.int32),
+            counts=counts,
+        )
+
+    @property
+    def n_messages(self) -> int:
+        """Number of segmented messages."""
+        return len(self.message_offsets) - 1
+
+    @property
+    def n_segments(self) -> int:
+        """Number of segments over all messages."""
+        return len(self.segment_ids)
+
+    @property
+    def vocab_size(self) -> int:
+        """Number of distinct segments."""
+        return len(self.counts)
+
+    @property
+    def nbytes(self) -> int:
+        """Memory used by the arrays of the segmentation, in bytes."""
+        return (
+            self.symbols.nbytes
+            + self.segment_offsets.nbytes
+            + self.message_offsets.nbytes
+            + self.segment_ids.nbytes
+            + self.counts.nbytes
+        )
+
+    def segment_lengths(self) -> np.ndarray:
+        """Return the length of every segment."""
+        return np.diff(self.segment_offsets)
+
+    def segments_per_message(self) -> np.ndarray:
+        """Return the number of segments of every message."""
+        return np.diff(self.message_offsets)
+
+    def vocabulary(self) -> List[Tuple]:
+        """Return the distinct segments as tuples of symbols, in ID order."""
+        _, first = np.unique(self.segment_ids, return_index=True)
+        symbols = self.symbols.tolist()
+        return [
+            tuple(symbols[self.segment_offsets[s] : self.segment_offsets[s + 1]])
+            for s in first
+        ]
+
+    def padded_ids(self, fill: int = 0) -> np.ndarray:
+        """
+        Arrange the segment IDs of each message in a padded matrix.
+
+        Parameters
+        ----------
+        fill : int, default=0
+            Value used after the last segment of each message.
+
+        Returns
+        -------
+        padded : np.ndarray
+            Array of shape (N, max segments per message) with the segment IDs of each message.
+        """
+        per_message = self.segments_per_message()
+        padded = np.full(
+            (self.n_messages, per_message.max(initial=0)), fill, dtype=np.int32
+        )
+        rows = np.repeat(np.arange(self.n_messages), per_message)
+        columns = np.arange(self.n_segments) - self.message_offsets[rows]
+        padded[rows, columns] = self.segment_ids
+        return padded
+
+    def zla(self) -> Tuple[list, list]:
+        """
+        Compute Zipf's Law of Abbreviation statistics of the segments.
+
+        Returns
+        -------
+        tuple : (list, list)
+            The same statistics as `emlangkit.metrics.zla` on the segments: the mean length
+            of the segments sharing each frequency, and the frequency of each distinct segment,
+            from most to least frequent.
+        """
+        _, first = np.unique(self.segment_ids, return_index=True)
+        lengths = self.segment_lengths()[first]
+        # Most frequent first, ties in order of first occurrence like Counter.most_common
+        order = np.lexsort((first, -self.counts))
+        frequencies = self.counts[order]
+        _, inverse = np.unique(frequencies, return_inverse=True)
+        mean_lengths = np.bincount(inverse, weights=lengths[order]) / np.bincount(
+            inverse
+        )
+        return mean_lengths[inverse].tolist(), frequencies.tolist()
+
+    @classmethod
+    def concatenate(cls, segmentations: List["Segmentation"]) -> "Segmentation":
+        """
+        Join the segmentations of several shards of messages, in order.
+
+        The vocabularies of the shards are merged with `merge_vocabularies` and the segment
+        IDs are remapped, so the result has the same IDs as segmenting all messages at once.
+
+        Parameters
+        ----------
+        segmentations : List[Segmentation]
+            The segmentations of each shard.
+
+        Returns
+        -------
+        segmentation : Segmentation
+            The segmentation of all messages.
+        """
+        vocabulary, remaps = merge_vocabularies([s.vocabulary() for s in segmentations])
+        segment_ids = np.concatenate(
+            [remap[s.segment_ids] for s, remap in zip(segmentations, remaps)]
+        ).astype(np.int32)
+
+        # Shift the offsets of each shard by the sizes of the previous shards
+        symbol_shifts = np.cumsum([0] + [len(s.symbols) for s in segmentations])
+        segment_shifts = np.cumsum([0] + [s.n_segments for s in segmentations])
+        segment_offsets = np.concatenate(
+            [[0]]
+            + [
+                s.segment_offsets[1:] + shift
+                for s, shift in zip(segmentations, symbol_shifts)
+            ]
+        )
+        message_offsets = np.concatenate(
+            [[0]]
+            + [
+                s.message_offsets[1:] + shift
+                for s, shift in zip(segmentations, segment_shifts)
+            ]
+        )
+        return cls(
+            symbols=np.concatenate([s.symbols for s in segmentations]),
+            segment_offsets=segment_offsets,
+            message_offsets=message_offsets,
+            segment_ids=segment_ids,
+            counts=np.bincount(segment_ids, minlength=len(vocabulary) + 1)[1:],
+        )
+
+    def to_tuples(self) -> Tuple[list, dict, list]:
+        """
+        Convert the segmentation into the tuples returned by `compute_segments`.
+
+        Returns
+        -------
+        segments : list
+            For each message, a tuple of its segments as tuples of symbols.
+        segment_ids : dict
+            Dictionary mapping each distinct segment to its ID, in ID order.
+        hashed_segments : list
+            For each message, a tuple of the IDs of its segments.
+        """
+        symbols = self.symbols.tolist()
+        offsets = self.segment_offsets.tolist()
+        words = [tuple(symbols[a:b]) for a, b in zip(offsets[:-1], offsets[1:])]
+        ids = self.segment_ids.tolist()
+        bounds = self.message_offsets.tolist()
+        segments = [tuple(words[a:b]) for a, b in zip(bounds[:-1], bounds[1:])]
+        hashed_segments = [tuple(ids[a:b]) for a, b in zip(bounds[:-1], bounds[1:])]
+        segment_ids = dict(zip(self.vocabulary(), range(1, self.vocab_size + 1)))
+        return segments, segment_ids, hashed_segments
+
+
+def merge_vocabularies(
+    vocabularies: List[List[Tuple]],
+) -> Tuple[list, List[np.ndarray]]:
+    """
+    Merge the segment vocabularies of several shards into one global vocabulary.
+
+    The global vocabulary is sorted, which is the order in which segment IDs are assigned,
+    so merging is independent of the number and order of the shards.
+
+    Parameters
+    ----------
+    vocabularies : List[List[Tuple]]
+        The distinct segments of each shard, where the segment with ID `i` is at index `i - 1`.
+
+    Returns
+    -------
+    vocabulary : list
+        The sorted distinct segments of all shards. The global ID of a segment is its index plus one.
+    remaps : List[np.ndarray]
+        For each shard, an array mapping its segment IDs to the global IDs. The padding ID 0 maps to 0.
+    """
+    vocabulary = sorted(set().union(*vocabularies))
+    global_ids = {segment: i + 1 for i, segment in enumerate(vocabulary)}
+    remaps = [
+        np.array([0] + [global_ids[segment] for segment in shard], dtype=np.int32)
+        for shard in vocabularies
+    ]
+    return vocabulary, remaps
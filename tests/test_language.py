@@ -6,7 +6,14 @@ Contains a suite of tests to evaluate the main Language class.
 import numpy as np
 import pytest
 
-from emlangkit import Language
+from emlangkit import (
+    IncrementalLanguage,
+    Language,
+    LanguageBatch,
+    SlidingWindowLanguage,
+    evaluate_many,
+)
+from emlangkit.utils import RunningCounts
 
 
 def test_instantiations():
@@ -58,6 +65,8 @@ def test_language_metrics():
     # Test no observation language
     with pytest.raises(ValueError):
         lang_no_obs.topsim()
+    with pytest.raises(ValueError):
+        lang_no_obs.topsim_estimate()
     with pytest.raises(ValueError):
         lang_no_obs.mutual_information()
     with pytest.raises(ValueError):
@@ -71,6 +80,7 @@ def test_language_metrics():
 
     # Test language with observations provided
     lang.topsim()
+    lang.topsim_estimate(n_pairs=100, n_bootstrap=10)
     lang.mutual_information()
     lang.posdis()
     lang.bosdis()
@@ -82,6 +92,7 @@ def test_language_metrics():
 
     # NPMI
     lang.nc_npmi()
+    lang.nc_npmi_matrix().top_observations(test_msgs[0], k=2)
 
     # HAS
     lang.branching_entropy()
@@ -91,7 +102,182 @@ def test_language_metrics():
     lang.segments(return_ids=True, return_hashed_segments=True)
     lang.random_segments(return_ids=True, return_hashed_segments=True)
     lang.has_stats(compute_topsim=True)
+    lang_replicates = Language(
+        messages=test_msgs, observations=test_obs, random_replicates=5
+    )
+    stats = lang_replicates.has_stats()
+    assert stats["random_vocab_size_std"] >= 0
+    assert len(stats["random_zla"]) == len(stats["random_zla_std"])
+    sweep = lang.has_sweep([lang.has_threshold, 10.0])
+    assert sweep[0]["vocab_size"] == lang.has_stats()["vocab_size"]
+    assert sweep[1]["mean_boundaries"] <= sweep[0]["mean_boundaries"]
 
     # Test recomputing random stats
     lang.random_boundaries(recompute=True)
     lang.random_segments(recompute=True)
+
+
+def test_language_batch():
+    rng = np.random.default_rng(42)
+    test_msgs = rng.integers(0, 4, size=(3, 30, 5))
+    test_obs = rng.integers(0, 3, size=(3, 30, 2))
+
+    # Check error for mismatched observations
+    with pytest.raises(ValueError, match=r".* dimensions .*"):
+        LanguageBatch(messages=test_msgs, observations=test_obs[:2])
+
+    results = LanguageBatch(messages=test_msgs, observations=test_obs).results()
+    assert len(results) == 3
+    for b in range(3):
+        lang = Language(messages=test_msgs[b], observations=test_obs[b])
+        assert np.isclose(results["language_entropy"][b], lang.language_entropy())
+        assert np.isclose(results["mutual_information"][b], lang.mutual_information())
+        assert np.isclose(results["posdis"][b], lang.posdis())
+        assert np.isclose(results["bosdis"][b], lang.bosdis())
+        assert np.isclose(results["topsim"][b], lang.topsim()[0])
+        assert np.allclose(results["mpn"][b], lang.mpn())
+
+
+def test_evaluate_many():
+    rng = np.random.default_rng(42)
+    languages = [
+        Language(
+            messages=rng.integers(0, 4, size=(30, 5)),
+            observations=rng.integers(0, 3, size=(30, 2)),
+            seed=seed,
+        )
+        for seed in range(4)
+    ]
+    metric_names = ["posdis", "mpn", "random_boundaries"]
+
+    # Check error for unknown metrics
+    with pytest.raises(ValueError, match=r".* metric.*"):
+        next(evaluate_many(languages, metrics=["messages"]))
+
+    serial = dict(evaluate_many(languages, metrics=metric_names, n_workers=1))
+    parallel = dict(evaluate_many(languages, metrics=metric_names, n_workers=2))
+    assert sorted(parallel) == list(range(4))
+    for index, language in enumerate(languages):
+        assert parallel[index]["posdis"] == language.posdis()
+        assert np.array_equal(parallel[index]["mpn"], serial[index]["mpn"])
+        assert parallel[index]["random_boundaries"] == language.random_boundaries()
+
+
+def test_memory_mapped_language(tmp_path):
+    rng = np.random.default_rng(42)
+    test_msgs = rng.integers(0, 4, size=(30, 5)).astype(np.int8)
+    test_obs = rng.integers(0, 3, size=(30, 2)).astype(np.int8)
+    np.save(tmp_path / "messages.npy", test_msgs)
+    np.save(tmp_path / "observations.npy", test_obs)
+
+    lang = Language(messages=test_msgs, observations=test_obs)
+    mapped = Language(
+        messages=tmp_path / "messages.npy",
+        observations=str(tmp_path / "observations.npy"),
+    )
+    assert isinstance(mapped.messages, np.memmap)
+    assert mapped.posdis() == lang.posdis()
+    assert mapped.bosdis() == lang.bosdis()
+    assert mapped.mutual_information() == lang.mutual_information()
+    assert mapped.topsim() == lang.topsim()
+    assert mapped.has_stats() == lang.has_stats()
+
+    # Check error for archives of several arrays
+    np.savez(tmp_path / "messages.npz", messages=test_msgs)
+    with pytest.raises(ValueError, match=r".* numpy array.*"):
+        Language(messages=tmp_path / "messages.npz")
+
+
+def test_incremental_language():
+    rng = np.random.default_rng(42)
+    test_msgs = rng.integers(0, 4, size=(60, 5))
+    test_obs = rng.integers(0, 3, size=(60, 2))
+
+    inc = IncrementalLanguage(prev_horizon=4)
+    # Check error for queries before any update
+    with pytest.raises(ValueError, match=r".* messages .*"):
+        inc.language_entropy()
+
+    for start in range(0, 60, 20):
+        inc.update(test_msgs[start : start + 20], test_obs[start : start + 20])
+        lang = Language(
+            messages=test_msgs[: start + 20],
+            observations=test_obs[: start + 20],
+            prev_horizon=4,
+        )
+        assert len(inc) == start + 20
+        assert np.isclose(inc.language_entropy(), lang.language_entropy())
+        assert np.isclose(inc.mutual_information(), lang.mutual_information())
+        assert np.isclose(inc.posdis(), lang.posdis())
+        assert np.isclose(inc.bosdis(), lang.bosdis())
+        assert np.allclose(inc.mpn(), lang.mpn())
+        assert np.allclose(inc.nc_npmi_matrix().npmi, lang.nc_npmi_matrix().npmi)
+        conditional_entropy = lang.conditional_entropy()
+        for length, value in inc.conditional_entropy().items():
+            assert np.isclose(value, conditional_entropy[length])
+        # The running n-grams are laid out in the node order of the Language index
+        branching_entropy = lang.branching_entropy()
+        assert list(inc.branching_entropy()) == list(branching_entropy)
+        assert np.allclose(inc.branching_entropy().entropy, branching_entropy.entropy)
+        assert inc.has_stats() == lang.has_stats()
+
+    # Check error for batches without observations
+    with pytest.raises(ValueError, match=r".* every batch.*"):
+        inc.update(test_msgs)
+
+
+def test_sliding_window_language():
+    rng = np.random.default_rng(42)
+    test_msgs = rng.integers(0, 3, size=(50, 2))
+    test_obs = rng.integers(0, 3, size=(50, 2))
+
+    # Check error for empty windows
+    with pytest.raises(ValueError, match=r".* window .*"):
+        SlidingWindowLanguage(window_size=0)
+
+    window = SlidingWindowLanguage(window_size=20)
+    steps = window.update(test_msgs[:30], test_obs[:30])
+    steps_after = window.update(test_msgs[30:], test_obs[30:])
+    for key in steps:
+        steps[key] = np.concatenate((steps[key], steps_after[key]))
+
+    for step in range(50):
+        lang = Language(
+            messages=test_msgs[max(step - 19, 0) : step + 1],
+            observations=test_obs[max(step - 19, 0) : step + 1],
+        )
+        assert np.isclose(steps["language_entropy"][step], lang.language_entropy())
+        assert np.isclose(steps["mutual_information"][step], lang.mutual_information())
+    assert len(window) == 20
+    assert np.isclose(window.mutual_information(), lang.mutual_information())
+    assert np.allclose(window.nc_npmi_matrix().npmi, lang.nc_npmi_matrix().npmi)
+
+
+def test_sliding_window_forgets_retired_messages():
+    rng = np.random.default_rng(42)
+    test_msgs = rng.integers(0, 1000, size=(2000, 4))
+    test_obs = rng.integers(0, 1000, size=(2000, 2))
+
+    window = SlidingWindowLanguage(window_size=20)
+    for start in range(0, 2000, 50):
+        steps = window.update(
+            test_msgs[start : start + 50], test_obs[start : start + 50]
+        )
+    lang = Language(messages=test_msgs[-20:], observations=test_obs[-20:])
+    assert np.isclose(steps["mutual_information"][-1], lang.mutual_information())
+    assert np.allclose(window.nc_npmi_matrix().npmi, lang.nc_npmi_matrix().npmi)
+
+    # The IDs of the rows counted down to zero are reused by the next new rows
+    counts = RunningCounts()
+    retired = counts.identify(test_msgs[:20])
+    counts.slide(retired, np.full(20, -1))
+    for start in range(20, 1970, 50):
+        added = counts.identify(test_msgs[start : start + 50])
+        removed = np.concatenate((retired, added[:-20]))
+        counts.slide(added, removed)
+        retired = added[-20:]
+        assert len(counts.ids) == 20
+        assert len(counts) <= 20 + 50
+        np.testing.assert_array_equal(
+            counts.unique(retired), test_msgs[start + 30 : start + 50]
+        )
@@ -4,8 +4,31 @@ Metrics tests.
 Contains a suite of tests to evaluate the correctness of the calculations done in metrics.py.
 """
 import numpy as np
+import pytest
+from scipy.spatial import distance
+from scipy.stats import ConstantInputWarning
 
-from emlangkit import metrics
+from emlangkit import metrics, utils
+from emlangkit.metrics.mpn import MPNStats
+
+
+def test_encode_rows():
+    """Tests to see if rows are encoded in the lexicographic order, like by np.unique."""
+    rng = np.random.default_rng(seed=42)
+    for x in [
+        rng.integers(0, 3, size=(100, 4)),
+        rng.integers(-(2**40), 2**40, size=(100, 3)),
+        # Too wide to be packed into int64 keys
+        rng.integers(-300, 300, size=(100, 8)),
+        rng.integers(0, 3, size=100),
+        rng.integers(0, 3, size=(100, 2)).astype(str),
+    ]:
+        codes, counts = utils.encode_rows(x)
+        _, expected_codes, expected_counts = np.unique(
+            x, axis=0, return_inverse=True, return_counts=True
+        )
+        np.testing.assert_array_equal(codes, expected_codes.reshape(-1))
+        np.testing.assert_array_equal(counts, expected_counts)
 
 
 def test_entropy():
@@ -208,6 +231,161 @@ def test_topsim():
     )
 
 
+def test_topsim_deduplicated():
+    """Tests to see if the deduplicated topographic similarity matches the full computation."""
+    rng = np.random.default_rng(seed=42)
+    observations = rng.integers(0, 3, size=(200, 2))
+    messages = np.concatenate(
+        (observations[:, :1], rng.integers(0, 2, size=(200, 2))), axis=1
+    )
+
+    for metric in ["editdistance", "hamming"]:
+        np.testing.assert_allclose(
+            metrics.compute_topographic_similarity(
+                messages, observations, message_dist_metric=metric, deduplicate=True
+            ),
+            metrics.compute_topographic_similarity(
+                messages, observations, message_dist_metric=metric
+            ),
+            rtol=1e-10,
+        )
+
+    # A constant language has no rank correlation, like without deduplication
+    for constant_messages, constant_observations in (
+        (np.zeros((10, 3), dtype=int), observations[:10]),
+        (messages[:10], np.zeros((10, 2), dtype=int)),
+    ):
+        with pytest.warns(ConstantInputWarning):
+            result = metrics.compute_topographic_similarity(
+                constant_messages, constant_observations, deduplicate=True
+            )
+        assert np.isnan(result).all()
+
+
+def test_topsim_streaming():
+    """Tests to see if the streaming topographic similarity matches the full computation."""
+    rng = np.random.default_rng(seed=42)
+    observations = rng.integers(0, 3, size=(200, 2))
+    messages = np.concatenate(
+        (observations[:, :1], rng.integers(0, 2, size=(200, 2))), axis=1
+    )
+
+    for metric in ["editdistance", "hamming"]:
+        np.testing.assert_allclose(
+            metrics.compute_topographic_similarity(
+                messages,
+                observations,
+                message_dist_metric=metric,
+                streaming=True,
+                block_size=500,
+            ),
+            metrics.compute_topographic_similarity(
+                messages, observations, message_dist_metric=metric
+            ),
+            rtol=1e-10,
+        )
+
+    with pytest.raises(ValueError):
+        metrics.compute_topographic_similarity(
+            messages, observations, message_dist_metric="euclidean", streaming=True
+        )
+
+
+def test_topsim_parallel():
+    """Tests to see if the multi-threaded topographic similarity matches the single-threaded one."""
+    rng = np.random.default_rng(seed=42)
+    observations = rng.integers(0, 3, size=(200, 2))
+    messages = np.concatenate(
+        (observations[:, :1], rng.integers(0, 2, size=(200, 2))), axis=1
+    )
+
+    for kwargs in [{}, {"deduplicate": True}, {"streaming": True}]:
+        for metric in ["editdistance", "hamming"]:
+            assert metrics.compute_topographic_similarity(
+                messages, observations, message_dist_metric=metric, **kwargs
+            ) == metrics.compute_topographic_similarity(
+                messages,
+                observations,
+                message_dist_metric=metric,
+                block_size=500,
+                n_jobs=4,
+                **kwargs,
+            )
+
+
+def test_topsim_sampled():
+    """Tests to see if the sampled topographic similarity estimates the full value."""
+    rng = np.random.default_rng(seed=42)
+    observations = rng.integers(0, 4, size=(300, 3))
+    messages = np.concatenate((observations, rng.integers(0, 4, size=(300, 2))), axis=1)
+
+    full, _ = metrics.compute_topographic_similarity(messages, observations)
+    estimate, (low, high) = metrics.compute_topographic_similarity_sampled(
+        messages, observations, n_pairs=20000, rng=rng, n_bootstrap=200
+    )
+
+    assert low <= estimate <= high
+    np.testing.assert_almost_equal(estimate, full, 1)
+
+
+def test_topsim_batch():
+    """Tests to see if the batched topographic similarity matches each language."""
+    rng = np.random.default_rng(seed=42)
+    observations = rng.integers(0, 3, size=(4, 50, 2))
+    messages = np.concatenate(
+        (observations, rng.integers(0, 3, size=(4, 50, 2))), axis=2
+    )
+    expected = np.array(
+        [
+            metrics.compute_topographic_similarity(msgs, obs)
+            for msgs, obs in zip(messages, observations)
+        ]
+    )
+
+    # Several languages per block, and each language in blocks of rows
+    for block_size in [2**22, 100]:
+        topsim, pvalue = metrics.compute_topographic_similarity_batch(
+            messages, observations, block_size=block_size
+        )
+        np.testing.assert_allclose(topsim, expected[:, 0], rtol=1e-10)
+        np.testing.assert_allclose(pvalue, expected[:, 1], rtol=1e-6)
+
+    # A single message has no pairs
+    topsim, pvalue = metrics.compute_topographic_similarity_batch(
+        messages[:, :1], observations[:, :1]
+    )
+    assert np.isnan(topsim).all() and np.isnan(pvalue).all()
+
+
+def test_pairwise_editdistance():
+    """Tests to see if the vectorised edit distances match the dynamic programming definition."""
+
+    def levenshtein(a, b):
+        prev = list(range(len(b) + 1))
+        for i, x in enumerate(a, start=1):
+            cur = [i]
+            for j, y in enumerate(b, start=1):
+                cur.append(min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (x != y)))
+            prev = cur
+        return prev[-1]
+
+    rng = np.random.default_rng(seed=42)
+    for length in [1, 3, 10, 70]:
+        messages = rng.integers(0, 4, size=(30, length))
+        expected = distance.pdist(
+            messages, lambda x, y: levenshtein(x, y) / ((len(x) + len(y)) / 2)
+        )
+        np.testing.assert_array_equal(
+            utils.pdist_editdistance(messages, block_size=50), expected
+        )
+
+        other = rng.integers(0, 4, size=(30, max(length - 2, 1)))
+        np.testing.assert_array_equal(
+            utils.paired_editdistance(messages, other),
+            [levenshtein(x, y) for x, y in zip(messages, other)],
+        )
+
+
 def test_mi():
     """Tests to see if mutual information is calculated correctly."""
     test_obs = np.array([[x, y] for x in range(4) for y in range(4)])
@@ -416,6 +594,34 @@ def test_posdis():
     )
 
 
+def test_posdis_matches_mutual_information():
+    """Tests to see if the batched positional disentanglement matches per-pair mutual information."""
+    rng = np.random.default_rng(seed=42)
+    observations = rng.integers(0, 4, size=(300, 3))
+    messages = np.concatenate(
+        (observations[:, :2], rng.integers(0, 3, size=(300, 2))), axis=1
+    )
+
+    scores = []
+    for j in range(messages.shape[1]):
+        mutual_info = sorted(
+            (
+                metrics.compute_mutual_information(
+                    observations[:, i : i + 1], messages[:, j : j + 1]
+                )
+                for i in range(observations.shape[1])
+            ),
+            reverse=True,
+        )
+        scores.append(
+            (mutual_info[0] - mutual_info[1]) / metrics.compute_entropy(messages[:, j])
+        )
+
+    np.testing.assert_almost_equal(
+        metrics.compute_posdis(messages, observations), np.mean(scores), 10
+    )
+
+
 def test_bosdis():
     """Tests to see if bag-of-words disentanglement is calculated correctly."""
     test_obs = np.array([[x, y] for x in range(4) for y in range(4)])
@@ -503,6 +709,20 @@ def test_bosdis():
     )
 
 
+def test_bosdis_matches_posdis_on_counts():
+    """Tests to see if bag-of-words disentanglement is posdis over the symbol counts."""
+    rng = np.random.default_rng(seed=42)
+    observations = rng.integers(0, 4, size=(300, 3))
+    messages = rng.integers(0, 5, size=(300, 4))
+
+    counts = np.array([[list(m).count(s) for s in range(5)] for m in messages])
+    np.testing.assert_almost_equal(
+        metrics.compute_bosdis(messages, observations),
+        metrics.compute_posdis(counts, observations),
+        10,
+    )
+
+
 def test_mpn():
     """Tests to see if M_previous^n is calculated correctly."""
     test_obs = np.array([[x, y] for x in range(4) for y in range(4)])
@@ -621,6 +841,16 @@ def test_mpn():
         2,
     )
 
+    # A repeat at the last horizon is counted too
+    mpn, msg_stats = metrics.compute_mpn(
+        messages=np.array([[1], [2], [2], [2]]),
+        observations=np.array([[4], [4], [4], [4]]),
+        prev_horizon=1,
+        return_stats=True,
+    )
+    np.testing.assert_almost_equal(mpn, [0, 100], 2)
+    np.testing.assert_array_equal(msg_stats["[2]"]["same_as_previous_obj"], [0, 3])
+
     # noinspection PyTypeChecker
     np.testing.assert_almost_equal(
         metrics.compute_mpn(
@@ -870,3 +1100,451 @@ def test_has():
     random_boundaries = metrics.compute_random_boundaries(messages, boundaries, rng)
 
     metrics.compute_segments(messages, random_boundaries)
+
+
+def test_ngram_index():
+    """Tests to see if the n-gram index holds the same frequencies as the HAS Counter."""
+    rng = np.random.default_rng(seed=42)
+    messages = rng.integers(0, 4, size=(100, 5))
+
+    alpha, freq = metrics.has_init(messages)
+    index_alpha, index = metrics.has_init(messages, use_index=True)
+
+    assert alpha == index_alpha
+    assert index.to_counter() == freq
+    assert len(index) == len(freq)
+    assert index[tuple(messages[0, 1:4])] == freq[tuple(messages[0, 1:4])]
+    assert index[(7, 7)] == 0
+    assert index.lookup(index.sequence(42)) == 42
+    assert index.nbytes > 0
+
+    assert index.suffix_nodes.shape == messages.shape
+    window_nodes = index.window_nodes(10, 20)
+    assert window_nodes.shape == (10, 5, 6)
+    for n, message in enumerate(messages[10:20]):
+        for start in range(5):
+            for width in range(6):
+                expected = index.lookup(message[start : start + width])
+                if start + width > 5:
+                    expected = -1
+                assert window_nodes[n, start, width] == expected
+
+    be = metrics.compute_branching_entropy(alpha, freq)
+    index_be = metrics.compute_branching_entropy(alpha, index)
+    assert be.keys() == index_be.keys()
+    for context in be:
+        np.testing.assert_almost_equal(index_be[context], be[context], 10)
+
+    ce = metrics.compute_conditional_entropy(be, freq)
+    index_ce = metrics.compute_conditional_entropy(index_be, index)
+    for length in ce:
+        np.testing.assert_almost_equal(index_ce[length], ce[length], 10)
+
+
+def test_branching_entropy_array():
+    """Tests the array-backed branching entropy and the boundaries computed from it."""
+    rng = np.random.default_rng(seed=42)
+    messages = rng.integers(0, 4, size=(100, 6))
+
+    alpha, freq = metrics.has_init(messages)
+    _, index = metrics.has_init(messages, use_index=True)
+    be = metrics.compute_branching_entropy(alpha, freq)
+    index_be = metrics.compute_branching_entropy(alpha, index)
+
+    assert index_be.entropy.shape == (index.n_nodes,)
+    np.testing.assert_array_equal(
+        np.asarray(index.successor_counts()[0].todense()).ravel(),
+        [freq[(a,)] for a in sorted(alpha)],
+    )
+    with pytest.raises(KeyError):
+        index_be[(7, 7)]
+
+    assert metrics.compute_boundaries(
+        messages, index_be, threshold=0.5
+    ) == metrics.compute_boundaries(messages, be, threshold=0.5)
+
+
+def test_boundary_mask():
+    """Tests to see if the batched boundaries match the reference implementation."""
+    rng = np.random.default_rng(seed=42)
+    for length in (1, 2, 3, 8):
+        messages = rng.integers(0, 3, size=(200, length))
+        alpha, freq = metrics.has_init(messages)
+        _, index = metrics.has_init(messages, use_index=True)
+        be = metrics.compute_branching_entropy(alpha, freq)
+        index_be = metrics.compute_branching_entropy(alpha, index)
+
+        for threshold in (0.0, 0.5, 1.0):
+            expected = metrics.compute_boundaries(messages, be, threshold)
+            mask = metrics.compute_boundaries(
+                messages, index_be, threshold, return_mask=True
+            )
+            assert mask.shape == (200, length + 2)
+            assert metrics.boundaries_from_mask(mask) == expected
+            np.testing.assert_array_equal(
+                metrics.compute_boundaries(messages, be, threshold, return_mask=True),
+                mask,
+            )
+
+        # Blocks of a few messages each, but never less than one
+        np.testing.assert_array_equal(
+            metrics.compute_boundary_scores(index_be, block_size=3 * length * length),
+            metrics.compute_boundary_scores(index_be),
+        )
+
+
+def test_boundaries_of_other_messages():
+    """Tests to see if the boundaries are computed for the given messages, not the indexed ones."""
+    rng = np.random.default_rng(seed=42)
+    messages = rng.integers(0, 3, size=(100, 6))
+    alpha, freq = metrics.has_init(messages)
+    _, index = metrics.has_init(messages, use_index=True)
+    be = metrics.compute_branching_entropy(alpha, freq)
+    index_be = metrics.compute_branching_entropy(alpha, index)
+
+    for subset in (messages[:3], messages[::-1], messages[10:15, 1:5]):
+        boundaries = metrics.compute_boundaries(subset, index_be, 1.0)
+        assert len(boundaries) == len(subset)
+        assert boundaries == metrics.compute_boundaries(subset, be, 1.0)
+
+    with pytest.raises(ValueError):
+        metrics.compute_boundaries(np.full((2, 6), 7), index_be, 1.0)
+
+
+def test_threshold_sweep():
+    """Tests to see if a threshold sweep matches segmenting at each threshold."""
+    rng = np.random.default_rng(seed=42)
+    messages = rng.integers(0, 3, size=(200, 6))
+    alpha, index = metrics.has_init(messages, use_index=True)
+    be = metrics.compute_branching_entropy(alpha, index)
+
+    thresholds = [0.0, 0.5, 1.0]
+    sweep = metrics.compute_threshold_sweep(messages, be, thresholds)
+    assert [result["threshold"] for result in sweep] == thresholds
+    for result, threshold in zip(sweep, thresholds):
+        boundaries = metrics.compute_boundaries(messages, be, threshold)
+        segments, segment_ids, _ = metrics.compute_segments(messages, boundaries)
+        assert metrics.boundaries_from_mask(result["boundaries"]) == boundaries
+        assert result["segmentation"].to_tuples()[0] == segments
+        assert result["vocab_size"] == len(segment_ids)
+
+    # Other messages are segmented with their own boundaries
+    subset = messages[:5, 1:]
+    (result,) = metrics.compute_threshold_sweep(subset, be, [0.5])
+    boundaries = metrics.compute_boundaries(subset, be, 0.5)
+    assert metrics.boundaries_from_mask(result["boundaries"]) == boundaries
+    assert result["segmentation"].to_tuples()[0] == (
+        metrics.compute_segments(subset, boundaries)[0]
+    )
+    with pytest.raises(ValueError):
+        metrics.compute_threshold_sweep(
+            subset, be, [0.5], scores=metrics.compute_boundary_scores(be)
+        )
+
+
+def test_zla():
+    """Tests to see if ZLA averages the lengths of the words sharing a frequency."""
+    words = [((1,), (2, 3)), ((1,), (4, 5, 6)), ((2, 3),)]
+    zla_stats, frequencies = metrics.zla(words)
+
+    assert frequencies == [2, 2, 1]
+    assert zla_stats == [1.5, 1.5, 3.0]
+
+    # The same statistics from the arrays of a segmentation
+    messages = np.array([[1, 2, 3], [1, 4, 4]])
+    mask = np.array([[False, True, False], [False, True, False]])
+    segmentation = metrics.compute_segmentation(messages, mask)
+    assert segmentation.zla() == ([1.0, 2.0, 2.0], [2, 1, 1])
+
+
+def test_segmentation():
+    """Tests to see if the array-backed segmentation matches the segment tuples."""
+    rng = np.random.default_rng(seed=42)
+    messages = rng.integers(0, 3, size=(200, 6))
+    alpha, index = metrics.has_init(messages, use_index=True)
+    be = metrics.compute_branching_entropy(alpha, index)
+    boundaries = metrics.compute_boundaries(messages, be, threshold=0.5)
+
+    segments, segment_ids, hashed_segments = metrics.compute_segments(
+        messages, boundaries
+    )
+    segmentation = metrics.compute_segmentation(messages, boundaries)
+    assert segmentation.n_messages == len(messages)
+    assert segmentation.vocab_size == len(segment_ids)
+
+    seg_segments, seg_ids, seg_hashed = segmentation.to_tuples()
+    assert seg_segments == segments
+    assert seg_ids == segment_ids
+    assert seg_hashed == hashed_segments
+    assert sorted(seg_ids, key=seg_ids.get) == segmentation.vocabulary()
+    np.testing.assert_array_equal(
+        segmentation.padded_ids(), utils.pad_jagged(seg_hashed)
+    )
+    assert segmentation.zla() == metrics.zla(segments)
+
+
+def test_segmentation_long_segments():
+    """Tests to see if segments too long for packed keys keep the IDs of compute_segments."""
+    rng = np.random.default_rng(seed=42)
+    for length, vocab in ((20, 10), (30, 4)):
+        messages = rng.integers(0, vocab, size=(300, length))
+        mask = rng.random((300, length)) < 0.1
+        # Leave half of the messages whole, as single segments of full length
+        mask[::2] = False
+        mask[:, 0] = False
+
+        segmentation = metrics.compute_segmentation(messages, mask)
+        segments, segment_ids, hashed_segments = metrics.compute_segments(
+            messages, metrics.boundaries_from_mask(mask)
+        )
+        seg_segments, seg_ids, seg_hashed = segmentation.to_tuples()
+        assert seg_segments == segments
+        assert list(seg_ids.items()) == list(segment_ids.items())
+        assert seg_hashed == hashed_segments
+        assert segmentation.vocabulary() == list(segment_ids)
+
+
+def test_merge_segment_ids():
+    """Tests to see if segment IDs merged over shards match segmenting all messages."""
+    rng = np.random.default_rng(seed=42)
+    messages = rng.integers(0, 3, size=(300, 6))
+    alpha, index = metrics.has_init(messages, use_index=True)
+    be = metrics.compute_branching_entropy(alpha, index)
+    boundaries = metrics.compute_boundaries(messages, be, threshold=0.5)
+
+    _, segment_ids, hashed_segments = metrics.compute_segments(messages, boundaries)
+    assert list(segment_ids) == sorted(segment_ids)
+
+    shards = [slice(0, 100), slice(100, 300)]
+    results = [
+        metrics.compute_segments(messages[shard], boundaries[shard]) for shard in shards
+    ]
+    merged_ids, remaps = metrics.merge_segment_ids([ids for _, ids, _ in results])
+    assert merged_ids == segment_ids
+    remapped = [
+        tuple(remap[list(hashed)].tolist())
+        for (_, _, shard_hashed), remap in zip(results, remaps)
+        for hashed in shard_hashed
+    ]
+    assert remapped == hashed_segments
+
+    segmentation = utils.Segmentation.concatenate(
+        [metrics.compute_segmentation(messages[s], boundaries[s]) for s in shards]
+    )
+    full = metrics.compute_segmentation(messages, boundaries)
+    np.testing.assert_array_equal(segmentation.segment_ids, full.segment_ids)
+    np.testing.assert_array_equal(segmentation.segment_offsets, full.segment_offsets)
+    np.testing.assert_array_equal(segmentation.message_offsets, full.message_offsets)
+    np.testing.assert_array_equal(segmentation.counts, full.counts)
+
+
+def test_concatenate_long_segments():
+    """Tests to see if shards with segments too long for packed keys merge like the full segmentation."""
+    rng = np.random.default_rng(seed=42)
+    for length, vocab in ((20, 10), (30, 4)):
+        messages = rng.integers(0, vocab, size=(300, length))
+        mask = rng.random((300, length)) < 0.1
+        mask[::2] = False
+        mask[:, 0] = False
+
+        shards = [slice(0, 100), slice(100, 300)]
+        segmentation = utils.Segmentation.concatenate(
+            [metrics.compute_segmentation(messages[s], mask[s]) for s in shards]
+        )
+        full = metrics.compute_segmentation(messages, mask)
+        np.testing.assert_array_equal(segmentation.segment_ids, full.segment_ids)
+        np.testing.assert_array_equal(segmentation.counts, full.counts)
+        assert segmentation.to_tuples() == full.to_tuples()
+        assert list(segmentation.to_tuples()[1]) == list(full.to_tuples()[1])
+
+
+def test_random_boundary_replicates():
+    """Tests to see if random boundary replicates keep the number of boundaries."""
+    rng = np.random.default_rng(seed=42)
+    messages = rng.integers(0, 3, size=(200, 6))
+    alpha, index = metrics.has_init(messages, use_index=True)
+    be = metrics.compute_branching_entropy(alpha, index)
+    mask = metrics.compute_boundaries(messages, be, threshold=0.5, return_mask=True)
+
+    masks = metrics.compute_random_boundaries(
+        messages, mask, rng, n_replicates=4, return_mask=True
+    )
+    assert masks.shape == (4,) + mask.shape
+    expected = np.minimum(mask.sum(axis=1), messages.shape[1] - 1)
+    for replicate in masks:
+        np.testing.assert_array_equal(replicate.sum(axis=1), expected)
+        assert not replicate[:, [0, 6, 7]].any()
+
+    boundaries = metrics.compute_random_boundaries(
+        messages, metrics.boundaries_from_mask(mask), rng
+    )
+    assert [len(b) for b in boundaries] == expected.tolist()
+
+    stats = metrics.compute_replicate_stats(messages, masks)
+    vocab_sizes = [metrics.compute_segmentation(messages, m).vocab_size for m in masks]
+    np.testing.assert_almost_equal(stats["vocab_size"], np.mean(vocab_sizes))
+    np.testing.assert_almost_equal(stats["vocab_size_std"], np.std(vocab_sizes))
+
+    # A single replicate keeps the integer counts of its segmentation
+    single = metrics.compute_replicate_stats(messages, masks[:1])
+    segmentation = metrics.compute_segmentation(messages, masks[0])
+    zla, frequencies = segmentation.zla()
+    assert single["vocab_size"] == segmentation.vocab_size
+    assert isinstance(single["vocab_size"], int)
+    assert single["zla"] == zla
+    assert single["zipf"] == frequencies
+    assert all(isinstance(f, int) for f in single["zipf"])
+    assert single["vocab_size_std"] == 0.0
+
+
+def test_mpn_stats():
+    """Tests the array-based M_previous^n statistics."""
+    rng = np.random.default_rng(seed=42)
+    messages = rng.integers(0, 3, size=(500, 2))
+    observations = rng.integers(0, 5, size=(500, 1))
+
+    mpn, stats = metrics.compute_mpn(
+        messages, observations, prev_horizon=4, return_stats=True, stats_format="array"
+    )
+    _, msg_stats = metrics.compute_mpn(
+        messages, observations, prev_horizon=4, return_stats=True
+    )
+    np.testing.assert_array_equal(stats.mpn(), mpn)
+    assert stats.to_dict().keys() == msg_stats.keys()
+    assert stats.same_as_previous_obj.shape == (len(stats), 5)
+
+    frequent = stats.filter(stats.counts >= 60)
+    assert np.all(frequent.counts >= 60)
+    top = stats.top_k(3, horizon=1)
+    assert len(top) == 3
+    assert top.prev_use_percentage[0, 1] == stats.prev_use_percentage[:, 1].max()
+
+    first = metrics.compute_mpn(
+        messages[:250], observations[:250], 4, return_stats=True, stats_format="array"
+    )[1]
+    second = metrics.compute_mpn(
+        messages[250:], observations[250:], 4, return_stats=True, stats_format="array"
+    )[1]
+    merged = MPNStats.merge([first, second])
+    np.testing.assert_array_equal(merged.messages, stats.messages)
+    np.testing.assert_array_equal(merged.counts, stats.counts)
+    # Only the repeats across the split are lost
+    assert np.all(merged.same_as_previous_obj <= stats.same_as_previous_obj)
+    assert stats.same_as_previous_obj.sum() - merged.same_as_previous_obj.sum() <= 4
+
+
+def test_nc_npmi_sparse():
+    """Tests to see if the sparse NPMI matrix holds the NPMI of all observed pairs."""
+    rng = np.random.default_rng(seed=42)
+    messages = rng.integers(0, 4, size=(300, 2))
+    observations = rng.integers(0, 4, size=(300, 2))
+
+    npmi_dict = metrics.compute_nc_npmi(messages, observations)
+    npmi_matrix = metrics.compute_nc_npmi(messages, observations, return_sparse=True)
+    assert npmi_matrix.shape == (len(npmi_dict), len(next(iter(npmi_dict.values()))))
+    assert npmi_matrix.joint_counts.sum() == len(messages)
+
+    sparse_npmi = npmi_matrix.to_sparse()
+    for row, msg in enumerate(npmi_matrix.messages):
+        for column, observation in enumerate(npmi_matrix.observations):
+            value = npmi_dict[f"{msg}"][f"{observation}"]
+            if npmi_matrix.joint_counts[row, column] > 0:
+                np.testing.assert_almost_equal(sparse_npmi[row, column], value, 10)
+            else:
+                assert np.isnan(value)
+
+
+def test_nc_npmi_queries():
+    """Tests the top-k and threshold queries of the sparse NPMI matrix."""
+    rng = np.random.default_rng(seed=42)
+    messages = rng.integers(0, 4, size=(300, 2))
+    observations = rng.integers(0, 4, size=(300, 2))
+    npmi_dict = metrics.compute_nc_npmi(messages, observations)
+    npmi_matrix = metrics.compute_nc_npmi(messages, observations, return_sparse=True)
+
+    message = messages[0]
+    values = npmi_dict[f"{message}"]
+    expected = sorted((v for v in values.values() if not np.isnan(v)), reverse=True)
+    top, top_npmi = npmi_matrix.top_observations(message, k=3)
+    np.testing.assert_almost_equal(top_npmi, expected[:3], 10)
+    for observation, value in zip(top, top_npmi):
+        np.testing.assert_almost_equal(values[f"{observation}"], value, 10)
+
+    observation = observations[0]
+    column = [v[f"{observation}"] for v in npmi_dict.values()]
+    expected = sorted((v for v in column if not np.isnan(v)), reverse=True)
+    _, top_npmi = npmi_matrix.top_messages(observation, k=100)
+    np.testing.assert_almost_equal(top_npmi, expected, 10)
+
+    pair_messages, pair_observations, pair_npmi = npmi_matrix.pairs_above(0.1)
+    assert np.all(np.diff(pair_npmi) <= 0)
+    assert len(pair_npmi) == sum(
+        v > 0.1 for row in npmi_dict.values() for v in row.values()
+    )
+    for msg, obs, value in zip(pair_messages, pair_observations, pair_npmi):
+        np.testing.assert_almost_equal(npmi_dict[f"{msg}"][f"{obs}"], value, 10)
+
+    with pytest.raises(KeyError):
+        npmi_matrix.top_observations([9, 9])
+
+
+def test_row_encoding():
+    """Tests to see if metrics give the same results from a shared encoding."""
+    rng = np.random.default_rng(seed=42)
+    messages = rng.integers(-2, 3, size=(200, 3))
+    observations = rng.integers(0, 4, size=(200, 2))
+    message_encoding = utils.RowEncoding(messages)
+    observation_encoding = utils.RowEncoding(observations)
+
+    unique, inverse, counts = np.unique(
+        messages, return_inverse=True, return_counts=True, axis=0
+    )
+    np.testing.assert_array_equal(message_encoding.unique, unique)
+    np.testing.assert_array_equal(message_encoding.codes, inverse.reshape(-1))
+    np.testing.assert_array_equal(message_encoding.counts, counts)
+    float_encoding = utils.RowEncoding(messages / 2)
+    np.testing.assert_array_equal(float_encoding.unique, unique / 2)
+
+    assert metrics.compute_entropy(message_encoding) == metrics.compute_entropy(
+        messages
+    )
+    for metric in (
+        metrics.compute_mutual_information,
+        metrics.compute_posdis,
+        metrics.compute_bosdis,
+    ):
+        assert metric(message_encoding, observation_encoding) == metric(
+            messages, observations
+        )
+    np.testing.assert_array_equal(
+        metrics.compute_mpn(message_encoding, observation_encoding, 4),
+        metrics.compute_mpn(messages, observations, 4),
+    )
+
+
+def test_row_encoding_wide_rows():
+    """Tests to see if rows too wide for packed keys are still kept in sorted order."""
+    rng = np.random.default_rng(seed=42)
+    messages = rng.integers(-300, 300, size=(400, 8))
+    messages[200:] = messages[rng.integers(0, 200, size=200)]
+    observations = rng.integers(0, 3, size=(400, 2))
+    unique = np.unique(messages, axis=0)
+
+    np.testing.assert_array_equal(utils.RowEncoding(messages).unique, unique)
+
+    _, stats = metrics.compute_mpn(
+        messages, observations, 4, return_stats=True, stats_format="array"
+    )
+    np.testing.assert_array_equal(stats.messages, unique)
+    first = metrics.compute_mpn(
+        messages[:200], observations[:200], 4, return_stats=True, stats_format="array"
+    )[1]
+    second = metrics.compute_mpn(
+        messages[200:], observations[200:], 4, return_stats=True, stats_format="array"
+    )[1]
+    merged = MPNStats.merge([first, second])
+    np.testing.assert_array_equal(merged.messages, stats.messages)
+    np.testing.assert_array_equal(merged.counts, stats.counts)
+
+    npmi_dict = metrics.compute_nc_npmi(messages, observations)
+    assert list(npmi_dict) == [f"{msg}" for msg in unique]